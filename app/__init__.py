@@ -1,4 +1,5 @@
 from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
 from sqlalchemy import select
 from sqlalchemy.orm import joinedload
 
@@ -8,6 +9,12 @@ from .extensions import initialize_extensions, login_manager
 from .models import AppUser, UserRole, create_db_defaults
 from .utils.date_time import timezone
 from .utils.hooks import register_hooks
+from .utils.scan import scan_cache, shared_scan_store, qr_id_filter, scan_events
+from .utils.qr_images import render_pool
+from .utils.outbox import outbox_worker
+from .utils.helpers.render_cache import qr_render_cache
+from .utils.helpers.qr_engines import qr_engines
+from .utils.storage import storage
 from .utils.helpers.loggers import console_log
 from .extensions import db
 
@@ -26,9 +33,21 @@ def create_app(config_name=Config.ENV, create_defaults=Config.CREATE_DEFAULTS):
     
     app.config.from_object(config_by_name[config_name])
     app.context_processor(app_context_Processor)
+    if app.config.get("TRUSTED_PROXY_HOPS"):
+        # request.remote_addr becomes the client address as seen by the outermost trusted proxy
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(app.config["TRUSTED_PROXY_HOPS"]))
     
     # Initialize Flask extensions
     initialize_extensions(app=app)
+    scan_cache.init_app(app)
+    shared_scan_store.init_app(app)
+    qr_id_filter.init_app(app)
+    scan_events.init_app(app)
+    outbox_worker.init_app(app)
+    render_pool.init_app(app)
+    qr_render_cache.init_app(app)
+    qr_engines.init_app(app)
+    storage.init_app(app)
     
     @login_manager.user_loader
     def load_user(user_id):
@@ -44,6 +63,10 @@ def create_app(config_name=Config.ENV, create_defaults=Config.CREATE_DEFAULTS):
     # Register before and after request hooks
     register_hooks(app=app)
     
+    # Register CLI commands
+    from .commands import register_commands
+    register_commands(app)
+    
     # Configure logging
     configure_logging(app)
     
@@ -0,0 +1,25 @@
+"""
+This package contains the `flask` CLI commands for the application.
+
+@author: Emmanuel Olowu
+@link: https://github.com/zeddyemy
+"""
+from flask import Flask
+
+from .scan import scan_store_cli
+from .qrcode import qrcode_cli
+from .scan_stats import scan_stats_cli
+from .outbox import outbox_cli
+
+
+def register_commands(app: Flask) -> None:
+    """
+    Function to register all CLI command groups.
+    
+    Args:
+        app (Flask): The Flask application instance.
+    """
+    app.cli.add_command(scan_store_cli)
+    app.cli.add_command(qrcode_cli)
+    app.cli.add_command(scan_stats_cli)
+    app.cli.add_command(outbox_cli)
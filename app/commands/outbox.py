@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+import click
+from flask.cli import AppGroup
+
+from ..extensions import db
+from ..enums.outbox import OutboxStatus
+from ..models.outbox import OutboxMessage
+from ..utils.date_time import DateTimeUtils
+from ..utils.outbox import outbox_worker
+
+outbox_cli = AppGroup("outbox", help="Inspect and drain the transactional outbox.")
+
+
+@outbox_cli.command("drain")
+def drain():
+    """Run every due outbox message now, in this process."""
+    total = 0
+    while True:
+        claimed = outbox_worker.drain_once()
+        total += claimed
+        if claimed < outbox_worker.batch_size:
+            break
+    click.echo(f"Processed {total} outbox messages ({outbox_worker.succeeded} succeeded, {outbox_worker.retried} to retry, {outbox_worker.failed} failed).")
+
+
+@outbox_cli.command("retry-failed")
+@click.option("--topic", default=None, help="Only retry messages of this topic.")
+def retry_failed(topic: str):
+    """Reset failed messages to pending with a fresh attempt count."""
+    stmt = db.update(OutboxMessage).where(OutboxMessage.status == str(OutboxStatus.FAILED))
+    if topic:
+        stmt = stmt.where(OutboxMessage.topic == topic)
+    result = db.session.execute(stmt.values(
+        status=str(OutboxStatus.PENDING), attempts=0, available_at=DateTimeUtils.aware_utcnow(), processed_at=None,
+    ))
+    db.session.commit()
+    click.echo(f"Reset {result.rowcount} failed outbox messages.")
+
+
+@outbox_cli.command("purge")
+@click.option("--older-than-days", default=7, show_default=True, help="Keep processed messages newer than this many days.")
+def purge(older_than_days: int):
+    """Delete processed (done) messages older than N days."""
+    cutoff = DateTimeUtils.aware_utcnow() - timedelta(days=older_than_days)
+    result = db.session.execute(
+        db.delete(OutboxMessage).where(OutboxMessage.status == str(OutboxStatus.DONE), OutboxMessage.processed_at < cutoff)
+    )
+    db.session.commit()
+    click.echo(f"Deleted {result.rowcount} processed outbox messages older than {older_than_days} days.")
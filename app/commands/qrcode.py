@@ -0,0 +1,104 @@
+from datetime import timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from ..extensions import db
+from ..enums.qrcode import QRImageStatus
+from ..models.qrcode import QRCode
+from ..utils.date_time import DateTimeUtils
+from ..utils.helpers.loggers import log_exception
+from ..utils.helpers.qr_generator import encode_qr_code
+from ..utils.helpers.qr_engines import render_matrix
+from ..utils.helpers.qr_tuner import encode_with_params
+from ..utils.helpers.qr_raster import unpack_matrix
+from ..utils.helpers.short_ids import generate_short_id
+from ..utils.scan import backfill_scan_responses
+from ..utils.qr_images import render_and_upload_image
+
+qrcode_cli = AppGroup("qrcodes", help="QR code maintenance tasks.")
+
+
+@qrcode_cli.command("backfill-scan-response")
+@click.option("--batch-size", default=500, show_default=True, help="Rows updated per transaction.")
+def backfill_scan_response(batch_size: int):
+    """Precompute the scan response body for QR codes created before it was stored."""
+    total = backfill_scan_responses(batch_size=batch_size)
+    click.echo(f"Backfilled scan_response for {total} QR codes.")
+
+
+@qrcode_cli.command("backfill-matrix")
+@click.option("--batch-size", default=500, show_default=True, help="Rows updated per transaction.")
+def backfill_matrix(batch_size: int):
+    """Store the bit-packed module matrix for QR codes that don't have one yet."""
+    total, last_id = 0, None
+    while True:
+        stmt = db.select(QRCode).where(QRCode.module_matrix.is_(None)).order_by(QRCode.id).limit(batch_size)
+        if last_id is not None:
+            stmt = stmt.where(QRCode.id > last_id)
+        batch = db.session.scalars(stmt).all()
+        if not batch:
+            break
+        # updated_at is written back unchanged, so the stored scan responses stay valid
+        db.session.execute(
+            db.update(QRCode),
+            [{"id": qr.id, "module_matrix": encode_with_params(qr.public_scan_url, qr.render_params), "updated_at": qr.updated_at} for qr in batch],
+        )
+        db.session.commit()
+        total += len(batch)
+        last_id = batch[-1].id
+    click.echo(f"Stored module matrices for {total} QR codes.")
+
+
+@qrcode_cli.command("render-images")
+@click.option("--include-failed", is_flag=True, help="Also retry images already marked failed.")
+@click.option("--older-than-minutes", default=10, show_default=True, help="Skip pending images newer than this (their outbox job may still be running).")
+def render_images(include_failed: bool, older_than_minutes: int):
+    """Render and upload images left pending or failed, one at a time in this process."""
+    statuses = [str(QRImageStatus.PENDING)] + ([str(QRImageStatus.FAILED)] if include_failed else [])
+    cutoff = DateTimeUtils.aware_utcnow() - timedelta(minutes=older_than_minutes)
+    ids = db.session.scalars(
+        db.select(QRCode.id).where(QRCode.image_status.in_(statuses), QRCode.updated_at < cutoff)
+    ).all()
+    
+    rendered = failed = 0
+    for qr_code_id in ids:
+        try:
+            rendered += render_and_upload_image(qr_code_id)
+        except Exception as e:
+            db.session.rollback()
+            failed += 1
+            log_exception(f"Rendering the image for QR code {qr_code_id} failed", e)
+    click.echo(f"Rendered {rendered} of {len(ids)} QR code images ({failed} failed).")
+
+
+@qrcode_cli.command("short-id-report")
+@click.option("--sample", default=500, show_default=True, help="Number of random existing QR codes to compare.")
+@click.option("--length", default=None, type=int, help="Short id length (defaults to QR_SHORT_ID_LENGTH).")
+def short_id_report(sample: int, length: int):
+    """Compare QR version and PNG size of existing scan URLs against the same URLs with a short id."""
+    length = length or current_app.config.get("QR_SHORT_ID_LENGTH", 10)
+    qrs = db.session.scalars(db.select(QRCode).order_by(db.func.random()).limit(sample)).all()
+    if not qrs:
+        click.echo("No QR codes to sample.")
+        return
+    
+    def measure(url: str):
+        packed = encode_qr_code(url)
+        return (packed[0] - 17) // 4, len(render_matrix(unpack_matrix(packed))) # version, PNG bytes at 10px modules
+    
+    rows = []
+    for qr in qrs:
+        long_url = QRCode.build_public_scan_url(qr.owner.short_code, qr.template.type, qr.id)
+        short_url = QRCode.build_public_scan_url(qr.owner.short_code, qr.template.type, generate_short_id(length))
+        rows.append((len(long_url), len(short_url), *measure(long_url), *measure(short_url)))
+    
+    n = len(rows)
+    url_long, url_short, version_long, png_long, version_short, png_short = (sum(column) / n for column in zip(*rows))
+    versions_long = sorted({row[2] for row in rows})
+    versions_short = sorted({row[4] for row in rows})
+    click.echo(f"Sampled {n} QR codes, short ids of {length} characters:")
+    click.echo(f"  URL length   {url_long:8.1f} -> {url_short:8.1f} chars")
+    click.echo(f"  QR version   {version_long:8.2f} -> {version_short:8.2f}  (versions {versions_long} -> {versions_short})")
+    click.echo(f"  PNG size     {png_long:8.0f} -> {png_short:8.0f} bytes ({(1 - png_short / png_long) * 100:.1f}% smaller)")
@@ -0,0 +1,28 @@
+import click
+from flask.cli import AppGroup
+
+from ..utils.scan import shared_scan_store, iter_scan_payloads
+
+scan_store_cli = AppGroup("scan-store", help="Manage the shared, memory-mapped scan lookup store.")
+
+
+@scan_store_cli.command("rebuild")
+@click.option("--batch-size", default=1000, show_default=True, help="Rows fetched from the database per round trip.")
+def rebuild(batch_size: int):
+    """Rebuild the shared scan store from the database."""
+    result = shared_scan_store.rebuild(iter_scan_payloads(batch_size=batch_size))
+    click.echo(f"Scan store rebuilt: {result['written']} entries written, {result['skipped']} skipped ({result['slots']} slots).")
+
+
+@scan_store_cli.command("compact")
+def compact():
+    """Rewrite the shared scan store without the slots left behind by deletes."""
+    result = shared_scan_store.compact()
+    click.echo(f"Scan store compacted: {result['written']} entries kept, {result['skipped']} skipped ({result['slots']} slots).")
+
+
+@scan_store_cli.command("stats")
+def stats():
+    """Show the shared scan store's size and load factor."""
+    for key, value in shared_scan_store.stats().items():
+        click.echo(f"{key}: {value}")
@@ -0,0 +1,31 @@
+import click
+from flask.cli import AppGroup
+
+from ..utils.scan import roll_up_scan_events, compact_scan_events, build_missing_day_sketches
+
+scan_stats_cli = AppGroup("scan-stats", help="Roll up and compact scan analytics.")
+
+
+@scan_stats_cli.command("rollup")
+@click.option("--batch-size", default=10_000, show_default=True, help="Scan events folded per transaction.")
+@click.option("--lag-seconds", default=None, type=float, help="Skip events newer than this (defaults to SCAN_ROLLUP_LAG_SECONDS).")
+def rollup(batch_size: int, lag_seconds: float):
+    """Fold new scan events into the hourly and daily rollups."""
+    result = roll_up_scan_events(batch_size=batch_size, lag_seconds=lag_seconds)
+    click.echo(f"Rolled up {result['events']} scan events in {result['batches']} batches (high-water mark: {result['last_event_id']}).")
+
+
+@scan_stats_cli.command("compact")
+@click.option("--older-than-days", default=90, show_default=True, help="Keep raw events newer than this many days.")
+def compact(older_than_days: int):
+    """Delete raw scan events that are older than N days and already rolled up."""
+    deleted = compact_scan_events(older_than_days)
+    click.echo(f"Deleted {deleted} rolled-up scan events older than {older_than_days} days.")
+
+
+@scan_stats_cli.command("build-sketches")
+@click.option("--batch-size", default=500, show_default=True, help="Daily buckets updated per transaction.")
+def build_sketches(batch_size: int):
+    """Build unique-visitor sketches for daily buckets rolled up before sketches existed."""
+    built = build_missing_day_sketches(batch_size=batch_size)
+    click.echo(f"Built {built} daily visitor sketches.")
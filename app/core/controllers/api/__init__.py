@@ -3,4 +3,5 @@ from .auth import AuthController
 from .qrcode import QrCodeController
 from .template import TemplateController
 from .music_request import MusicRequestController
-from .notification import NotificationController
\ No newline at end of file
+from .notification import NotificationController
+from .scan import ScanController
@@ -3,11 +3,12 @@ from ....extensions import db
 from ....models.qrcode import Notification, DJ
 from ....utils.helpers.user import get_current_user
 from ....utils.helpers.http_response import success_response, error_response
+from ....utils.helpers.pagination import paginate
 
 class NotificationController:
     @staticmethod
     def list():
-        """List notifications for the current DJ (by user)."""
+        """List notifications for the current DJ (by user), newest first, paginated like `QrCodeController.list`."""
         current_user = get_current_user()
         if not current_user:
             return error_response("Unauthorized", 401)
@@ -15,5 +16,9 @@ class NotificationController:
         dj = DJ.query.filter_by(user_id=current_user.id).first()
         if not dj:
             return error_response("No DJ profile found for user", 404)
-        notifications = Notification.query.filter_by(dj_id=dj.id).order_by(Notification.created_at.desc()).all()
-        return success_response("Notifications fetched", 200, {"notifications": [n.to_dict() for n in notifications]}) 
\ No newline at end of file
+        stmt = db.select(Notification).where(Notification.dj_id == dj.id)
+        try:
+            body = paginate(stmt, (Notification.created_at, Notification.id), Notification.to_dict, "notifications")
+        except ValueError:
+            return error_response("Invalid cursor", 400)
+        return success_response("Notifications fetched", 200, body) 
\ No newline at end of file
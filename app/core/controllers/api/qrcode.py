@@ -1,21 +1,43 @@
+import re
+from itertools import repeat
 from uuid import uuid4
-from flask import request, current_app
+from typing import List, Optional, Tuple
+from datetime import datetime, timedelta
+from flask import request, current_app, Response, stream_with_context
+from sqlalchemy.exc import IntegrityError
 
 from ....extensions import db
 from ....models.qrcode import QRCode, Template
-from ....utils.helpers.basics import generate_random_string
+from ....models.scan import ScanStat
 from ....utils.helpers.loggers import console_log, log_exception
 from ....utils.helpers.validate import validate_json_data
 from ....utils.helpers.user import get_current_user
 from ....utils.helpers.http_response import success_response, error_response
-from ....utils.helpers.qr_generator import generate_qr_code_image
-from ....utils.helpers.cloudinary_uploader import upload_qr_code_to_cloudinary, delete_qr_code_from_cloudinary
-from ....enums.qrcode import QRCodeType
+from ....utils.helpers.qr_generator import render_qr_code_matrix
+from ....utils.helpers.qr_engines import qr_engines
+from ....utils.helpers.qr_tuner import RenderParams, tune_render_params, encode_with_params, DEFAULT_PIXEL_BUDGET
+from ....utils.helpers.short_ids import short_ids_enabled, allocate_short_ids, is_short_id_conflict, SHORT_ID_ATTEMPTS
+from ....utils.helpers.pagination import paginate
+from ....utils.decorators.http_cache import make_etag, set_etag, is_not_modified
+from ....utils.scan import refresh_scan_entry, refresh_scan_entries, evict_scan_entry, qr_id_filter
+from ....utils.qr_images import render_pool, upload_many, store_qr_image, delete_qr_image, enqueue_image_render, enqueue_image_delete, enqueue_matrix_backfill, iter_export_zip
+from ....utils.qr_images.sheets import SheetLayout, PAPER_SIZES, render_sheet_page, iter_sheet_pdf, paginate_cells
+from ....utils.outbox import outbox_worker
+from ....utils.scan.rollup import as_utc, bucket_start, estimate_unique_visitors
+from ....utils.date_time import DateTimeUtils
+from ....enums.qrcode import QRCodeType, QRImageStatus
+from ....enums.scan import StatGranularity
 
 class QrCodeController:
     @staticmethod
     def create():
-        """Create a new QR code for the current user, validating data against the template schema and uploading the image to Cloudinary."""
+        """
+        Create a new QR code for the current user, validating data against the template schema and storing the image.
+        
+        With `"async": true` in the body (or `?async=true`), responds 202 straight away with
+        `image_status: pending`; the image is rendered in the background and its URL appears
+        on `GET /api/qrcodes/<id>` once `image_status` is `ready` (or `failed`).
+        """
         current_user = get_current_user()
         if not current_user:
             return error_response("Unauthorized", 401)
@@ -37,33 +59,61 @@ class QrCodeController:
                 typ_enum = QRCodeType(temp_type)
             except ValueError:
                 return error_response("Invalid QR code type", 400)
+        async_mode = str(data.get("async", request.args.get("async", ""))).lower() in ("true", "1", "yes")
         try:
             new_qr_code_uuid = str(uuid4())
-            public_scan_url = (
-                f"{current_app.config['APP_DOMAIN_NAME']}/"
-                f"{current_user.short_code}/"
-                f"{template.type}/"
-                f"{new_qr_code_uuid}"
-            )
-            qr_image_stream, mime_type = generate_qr_code_image(public_scan_url)
-            qr_code_image_url = upload_qr_code_to_cloudinary(qr_image_stream, generate_random_string(11))
-            new_qr = QRCode(
-                id=new_qr_code_uuid,
-                user_id=current_user.id,
-                template_id=template_id,
-                data_payload=payload,
-                qr_code_image_url=qr_code_image_url,
-                type=temp_type
-            )
-            db.session.add(new_qr)
-            db.session.commit()
+            for attempt in range(SHORT_ID_ATTEMPTS):
+                short_id = allocate_short_ids(1)[0] if short_ids_enabled() else None
+                public_scan_url = QRCode.build_public_scan_url(current_user.short_code, template.type, short_id or new_qr_code_uuid)
+                render_params, module_matrix = tune_render_params(public_scan_url, template.error_correction)
+                if async_mode:
+                    # The image is rendered and uploaded by the outbox worker after the row is committed
+                    qr_code_image_url = None
+                    image_status = str(QRImageStatus.PENDING)
+                else:
+                    qr_image_stream, mime_type = render_qr_code_matrix(module_matrix, render_params.box_size, render_params.border)
+                    qr_code_image_url = store_qr_image(qr_image_stream, new_qr_code_uuid)
+                    image_status = str(QRImageStatus.READY)
+                new_qr = QRCode(
+                    id=new_qr_code_uuid,
+                    short_id=short_id,
+                    user_id=current_user.id,
+                    template_id=template_id,
+                    data_payload=payload,
+                    qr_code_image_url=qr_code_image_url,
+                    image_status=image_status,
+                    module_matrix=module_matrix,
+                    type=temp_type,
+                    **render_params.as_columns()
+                )
+                new_qr.refresh_scan_response()
+                db.session.add(new_qr)
+                if async_mode:
+                    enqueue_image_render(new_qr_code_uuid)
+                try:
+                    db.session.commit()
+                    break
+                except IntegrityError as e:
+                    # another insert took the same short id since it was allocated: pick a new one
+                    db.session.rollback()
+                    if not short_id or not is_short_id_conflict(e) or attempt == SHORT_ID_ATTEMPTS - 1:
+                        raise
+                    console_log("MSG", f"Short id {short_id} was taken concurrently; retrying with a new one.", "WARNING")
+            refresh_scan_entry(new_qr_code_uuid)
+            qr_id_filter.add(new_qr_code_uuid)
+            if short_id:
+                qr_id_filter.add(short_id)
+            if async_mode:
+                outbox_worker.notify()
             current_app.logger.info(f"QR Code {new_qr_code_uuid} created for user {current_user.id}.")
             return success_response(
                 "QR code created",
-                201,
+                202 if async_mode else 201,
                 {
                     "qr_code_id": new_qr.id,
+                    "short_id": new_qr.short_id,
                     "qr_code_image_url": new_qr.qr_code_image_url,
+                    "image_status": new_qr.image_status,
                     "public_scan_url": public_scan_url
                 }
             )
@@ -72,23 +122,194 @@ class QrCodeController:
             log_exception(f"Error creating QR code for user {current_user.id}", e)
             
             if 'qr_code_image_url' in locals() and qr_code_image_url:
-                delete_qr_code_from_cloudinary(new_qr_code_uuid)
-                current_app.logger.warning(f"Cleaned up Cloudinary for failed QR code {new_qr_code_uuid}.")
+                QrCodeController._discard_images([(new_qr_code_uuid, qr_code_image_url)])
+                current_app.logger.warning(f"Queued cleanup of the image for failed QR code {new_qr_code_uuid}.")
             return error_response("Internal server error during QR code creation", 500)
 
+    @staticmethod
+    def create_batch():
+        """
+        Create up to QR_BATCH_MAX_ITEMS QR codes against one template in a single request.
+        
+        Body: `{"template_id": ..., "type": ..., "items": [{"data": {...}}, ...]}`.
+        Every item is validated up front; valid items are rendered in parallel, uploaded
+        concurrently and inserted in one transaction. Items fail individually: the response
+        lists a result per item, in order, and is 201 if all were created, 207 if some were.
+        """
+        current_user = get_current_user()
+        if not current_user:
+            return error_response("Unauthorized", 401)
+        data = request.get_json() or {}
+        template_id = data.get("template_id")
+        temp_type = data.get("type")
+        items = data.get("items")
+        if not template_id or not isinstance(items, list) or not items:
+            return error_response("Missing template_id or items", 400)
+        max_items = current_app.config.get("QR_BATCH_MAX_ITEMS", 500)
+        if len(items) > max_items:
+            return error_response(f"A batch can contain at most {max_items} items", 400)
+        template: Template = Template.query.get(template_id)
+        if not template:
+            return error_response("Template not found", 404)
+        if temp_type:
+            try:
+                QRCodeType(temp_type)
+            except ValueError:
+                return error_response("Invalid QR code type", 400)
+        
+        results = []
+        pending = [] # (result, payload) for items that passed validation
+        short_ids = allocate_short_ids(len(items)) if short_ids_enabled() else []
+        for index, item in enumerate(items):
+            payload = item.get("data") if isinstance(item, dict) else None
+            result = {"index": index, "status": "invalid", "qr_code_id": None}
+            results.append(result)
+            if not payload:
+                result["error"] = "Missing data"
+            elif not validate_json_data(payload, template.schema_definition):
+                result["error"] = "Data payload does not match template schema"
+            else:
+                qr_code_id = str(uuid4())
+                short_id = short_ids.pop() if short_ids else None
+                result.update(
+                    qr_code_id=qr_code_id,
+                    short_id=short_id,
+                    public_scan_url=QRCode.build_public_scan_url(current_user.short_code, template.type, short_id or qr_code_id),
+                )
+                pending.append((result, payload))
+        
+        renders = render_pool.render_many(
+            [result["public_scan_url"] for result, _ in pending],
+            template.error_correction or current_app.config.get("QR_DEFAULT_ERROR_CORRECTION", "L"),
+            current_app.config.get("QR_IMAGE_PIXEL_BUDGET", DEFAULT_PIXEL_BUDGET),
+        )
+        rendered = []
+        for (result, payload), (render, error) in zip(pending, renders):
+            if error:
+                result.update(status="failed", error="Image rendering failed")
+                log_exception(f"Rendering QR code {result['qr_code_id']} failed", error)
+            else:
+                rendered.append((result, payload, render))
+        
+        uploads = upload_many([(result["qr_code_id"], png) for result, _, (_, _, png) in rendered])
+        new_qrs = []
+        for (result, payload, (render_params, module_matrix, _)), (image_url, error) in zip(rendered, uploads):
+            if error:
+                result.update(status="failed", error="Image upload failed")
+                continue
+            new_qr = QRCode(
+                id=result["qr_code_id"],
+                short_id=result["short_id"],
+                user_id=current_user.id,
+                template_id=template_id,
+                data_payload=payload,
+                qr_code_image_url=image_url,
+                image_status=str(QRImageStatus.READY),
+                module_matrix=module_matrix,
+                type=temp_type,
+                **render_params.as_columns()
+            )
+            new_qr.refresh_scan_response()
+            new_qrs.append((result, new_qr))
+        
+        if new_qrs:
+            try:
+                db.session.add_all([new_qr for _, new_qr in new_qrs])
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                log_exception(f"Error saving a batch of {len(new_qrs)} QR codes for user {current_user.id}", e)
+                QrCodeController._discard_images([(new_qr.id, new_qr.qr_code_image_url) for _, new_qr in new_qrs])
+                for result, _ in new_qrs:
+                    result.update(status="failed", error="Could not save QR code")
+                new_qrs = []
+        
+        refresh_scan_entries([new_qr.id for _, new_qr in new_qrs])
+        for result, new_qr in new_qrs:
+            qr_id_filter.add(new_qr.id)
+            if new_qr.short_id:
+                qr_id_filter.add(new_qr.short_id)
+            result.update(status="created", qr_code_image_url=new_qr.qr_code_image_url)
+        for result in results:
+            if result["status"] != "created":
+                result.pop("public_scan_url", None)
+                result["qr_code_id"] = result["short_id"] = None
+        
+        created = len(new_qrs)
+        summary = {"created": created, "failed": len(results) - created, "results": results}
+        current_app.logger.info(f"Batch of {len(results)} QR codes for user {current_user.id}: {created} created.")
+        if not created:
+            return error_response("No QR codes were created", 400 if not pending else 500, summary)
+        return success_response("QR codes created", 201 if created == len(results) else 207, summary)
+
+    @staticmethod
+    def _discard_images(images: List[Tuple[str, Optional[str]]]) -> None:
+        """
+        Queue deletion of images uploaded for QR codes whose insert was rolled back.
+        
+        The outbox write is its own transaction here; if the database is what failed and
+        it can't be written either, fall back to deleting the images directly.
+        """
+        try:
+            for qr_code_id, image_url in images:
+                enqueue_image_delete(qr_code_id, image_url)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            log_exception("Could not queue image cleanup, deleting directly", e)
+            for qr_code_id, _ in images:
+                delete_qr_image(qr_code_id)
+            return
+        outbox_worker.notify()
+
     @staticmethod
     def list():
-        """List all QR codes for the current user."""
+        """
+        List the current user's QR codes, newest first, `per_page` (default 10, max 100) at a time.
+        
+        Pages are keyset-paginated: pass the `next_cursor` of a response as `cursor` to get
+        the following page (`next_cursor` is null on the last one). Every page costs the
+        same, however deep. Passing `page` instead selects offset pagination, which also
+        returns `total` and `total_pages` but slows down on deep pages.
+        """
         current_user = get_current_user()
         if not current_user:
             return error_response("Unauthorized", 401)
         
-        user_id = current_user.id
-        items = QRCode.query.filter_by(user_id=user_id).all()
-        return success_response(
-            "QR codes fetched",
-            200,
-            {"qrcodes": [qr.to_dict() for qr in items]},
+        # only the serialized columns, so the stored scan responses and matrices aren't loaded
+        stmt = db.select(
+            QRCode.id, QRCode.short_id, QRCode.type, QRCode.data_payload, QRCode.qr_code_image_url, QRCode.image_status,
+            QRCode.error_correction, QRCode.qr_version, QRCode.dj_id, QRCode.club_id, QRCode.created_at, QRCode.updated_at,
+        ).where(QRCode.user_id == current_user.id)
+        try:
+            body = paginate(stmt, (QRCode.created_at, QRCode.id), QRCode.serialize, "qrcodes")
+        except ValueError:
+            return error_response("Invalid cursor", 400)
+        return success_response("QR codes fetched", 200, body)
+
+    @staticmethod
+    def export():
+        """
+        Stream a ZIP of all the current user's QR code images, with a `manifest.csv`.
+        
+        The archive is sent with chunked transfer as entries complete (there is no
+        Content-Length); images missing from storage are re-rendered. See
+        `app.utils.qr_images.export`.
+        """
+        current_user = get_current_user()
+        if not current_user:
+            return error_response("Unauthorized", 401)
+        
+        filename = f"qrcodes-{DateTimeUtils.aware_utcnow():%Y%m%d}.zip"
+        current_app.logger.info(f"Streaming QR code export for user {current_user.id}.")
+        return Response(
+            stream_with_context(iter_export_zip(current_user.id, current_user.short_code)),
+            mimetype="application/zip",
+            headers={
+                "Content-Disposition": f'attachment; filename="{filename}"',
+                "Cache-Control": "no-store",
+                "X-Accel-Buffering": "no", # don't let nginx buffer the whole archive
+            },
         )
 
     @staticmethod
@@ -116,8 +337,12 @@ class QrCodeController:
         qr: QRCode = QRCode.query.filter_by(id=id, user_id=user_id).first()
         if not qr:
             return error_response("Not found", 404)
+        short_id = qr.short_id
         db.session.delete(qr)
+        enqueue_image_delete(qr.id, qr.qr_code_image_url)
         db.session.commit()
+        evict_scan_entry(id, short_id)
+        outbox_worker.notify()
         return success_response("QR code deleted", 200, None)
 
     @staticmethod
@@ -146,5 +371,185 @@ class QrCodeController:
                 qr.type = temp_type
             except ValueError:
                 return error_response("Invalid QR code type", 400)
+        qr.refresh_scan_response()
         db.session.commit()
+        refresh_scan_entry(qr.id)
         return success_response("QR code updated", 200, {"qrcode": qr.to_dict()})
+
+    @staticmethod
+    def image(id: str):
+        """
+        Render one of the current user's QR codes from its stored module matrix.
+        
+        Query params: `size` (approximate width in pixels, rounded to a whole number of
+        pixels per module; defaults to the recorded size of the stored image) and
+        `format` (png, svg or webp). Nothing is re-encoded or uploaded; renders are
+        cached per matrix, size and format.
+        """
+        current_user = get_current_user()
+        if not current_user:
+            return error_response("Unauthorized", 401)
+        qr: QRCode = QRCode.query.filter_by(id=id, user_id=current_user.id).first()
+        if not qr:
+            return error_response("Not found", 404)
+        
+        image_format = request.args.get("format", "png").upper()
+        if image_format not in qr_engines.formats():
+            return error_response(f"Invalid format, expected one of {', '.join(qr_engines.formats()).lower()}", 400)
+        size = request.args.get("size", type=int)
+        min_size, max_size = current_app.config.get("QR_IMAGE_MIN_SIZE", 64), current_app.config.get("QR_IMAGE_MAX_SIZE", 4096)
+        if size is not None and not min_size <= size <= max_size:
+            return error_response(f"size must be between {min_size} and {max_size}", 400)
+        
+        params = qr.render_params
+        packed_matrix = qr.module_matrix
+        if packed_matrix is None:
+            # Codes created before matrices were stored, or whose scan URL changed since:
+            # encode for this response, and leave storing the matrix to the outbox
+            packed_matrix = encode_with_params(qr.public_scan_url, params)
+            enqueue_matrix_backfill(qr.id)
+            db.session.commit()
+            outbox_worker.notify()
+        
+        border = params.border
+        box_size = max(1, round(size / (packed_matrix[0] + 2 * border))) if size else params.box_size
+        etag = make_etag(packed_matrix.hex(), box_size, border, image_format)
+        set_etag(etag)
+        if is_not_modified(etag):
+            return Response(status=304)
+        
+        image_stream, mime_type = render_qr_code_matrix(packed_matrix, box_size, border, image_format)
+        return Response(image_stream.getvalue(), mimetype=mime_type)
+
+    @staticmethod
+    def sheet():
+        """
+        Lay out the current user's QR codes for a template on printable A4/Letter pages.
+        
+        Query params: `template_id` (required), `ids` (comma-separated, default: every code
+        of the template), `paper` (a4|letter), `columns`, `rows`, `dpi`, `label` (the
+        `data_payload` field printed under each code, default `table_number`; empty for
+        none), `label_prefix` (e.g. "Table "), and `format`: `pdf` streams every page,
+        `png` returns the single page given by `page`. Codes are sorted by label.
+        """
+        current_user = get_current_user()
+        if not current_user:
+            return error_response("Unauthorized", 401)
+        args = request.args
+        template: Template = Template.query.get(args.get("template_id", ""))
+        if not template:
+            return error_response("Template not found", 404)
+        
+        paper = args.get("paper", "a4").lower()
+        image_format = args.get("format", "pdf").upper()
+        columns, rows = args.get("columns", 3, type=int), args.get("rows", 4, type=int)
+        dpi, page_number = args.get("dpi", 200, type=int), args.get("page", 1, type=int)
+        label_field, label_prefix = args.get("label", "table_number"), args.get("label_prefix", "")
+        if paper not in PAPER_SIZES:
+            return error_response(f"Invalid paper, expected one of {', '.join(PAPER_SIZES)}", 400)
+        if image_format not in ("PDF", "PNG"):
+            return error_response("Invalid format, expected pdf or png", 400)
+        if not (1 <= columns <= 10 and 1 <= rows <= 15):
+            return error_response("columns must be between 1 and 10, rows between 1 and 15", 400)
+        if not 72 <= dpi <= 600:
+            return error_response("dpi must be between 72 and 600", 400)
+        
+        max_codes = current_app.config.get("QR_SHEET_MAX_CODES", 1000)
+        stmt = (
+            db.select(QRCode.id, QRCode.short_id, QRCode.module_matrix, QRCode.data_payload, QRCode.error_correction, QRCode.qr_version)
+            .where(QRCode.user_id == current_user.id, QRCode.template_id == template.id)
+            .order_by(QRCode.created_at, QRCode.id)
+            .limit(max_codes + 1)
+        )
+        if args.get("ids"):
+            stmt = stmt.where(QRCode.id.in_([id.strip() for id in args["ids"].split(",") if id.strip()]))
+        found = db.session.execute(stmt).all()
+        if not found:
+            return error_response("No QR codes to print", 404)
+        if len(found) > max_codes:
+            return error_response(f"A sheet can hold at most {max_codes} QR codes", 400)
+        
+        cells = []
+        for id, short_id, packed_matrix, payload, error_correction, version in found:
+            label = (payload or {}).get(label_field) if label_field else None
+            packed_matrix = packed_matrix or encode_with_params(
+                QRCode.build_public_scan_url(current_user.short_code, template.type, short_id or id),
+                RenderParams.from_columns(error_correction, version, None, None),
+            )
+            cells.append((packed_matrix, f"{label_prefix}{label}" if label not in (None, "") else None))
+        if label_field:
+            # natural order, so "Table 2" comes before "Table 10"
+            cells.sort(key=lambda cell: [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", cell[1] or "")])
+        
+        layout = SheetLayout(paper=paper, columns=columns, rows=rows, dpi=dpi, labels=bool(label_field))
+        if not all(layout.fits(packed_matrix) for packed_matrix, _ in cells):
+            return error_response("Some QR codes are too dense for cells this small; use fewer columns or rows, or a higher dpi", 400)
+        pages = paginate_cells(cells, layout.per_page)
+        if image_format == "PNG":
+            if not 1 <= page_number <= len(pages):
+                return error_response(f"page must be between 1 and {len(pages)}", 400)
+            return Response(render_sheet_page(layout, pages[page_number - 1], "PNG"), mimetype="image/png")
+        
+        current_app.logger.info(f"Streaming a {len(pages)}-page sheet of {len(cells)} QR codes for user {current_user.id}.")
+        rendered = render_pool.imap(render_sheet_page, repeat(layout), pages, repeat("PDF"))
+        return Response(
+            stream_with_context(iter_sheet_pdf(layout, rendered)),
+            mimetype="application/pdf",
+            headers={
+                "Content-Disposition": f'inline; filename="qrcodes-{template.type or "sheet"}.pdf"',
+                "X-Accel-Buffering": "no",
+            },
+        )
+
+    @staticmethod
+    def stats(id: str):
+        """
+        Scan counts for one of the current user's QR codes, read from the rollup tables.
+        
+        Query params: `granularity` (hour|day, default day), `start` and `end` (ISO 8601,
+        UTC if no offset). Defaults to the last 30 days, or the last 48 hours for hourly stats.
+        `unique_scanners_estimate` merges the daily sketches of every day the range touches.
+        """
+        current_user = get_current_user()
+        if not current_user:
+            return error_response("Unauthorized", 401)
+        qr: QRCode = QRCode.query.filter_by(id=id, user_id=current_user.id).first()
+        if not qr:
+            return error_response("Not found", 404)
+        
+        try:
+            granularity = StatGranularity(request.args.get("granularity", str(StatGranularity.DAY)))
+        except ValueError:
+            return error_response("Invalid granularity, expected 'hour' or 'day'", 400)
+        try:
+            end = request.args.get("end")
+            end = as_utc(datetime.fromisoformat(end)) if end else DateTimeUtils.aware_utcnow()
+            start = request.args.get("start")
+            default_window = timedelta(hours=48) if granularity == StatGranularity.HOUR else timedelta(days=30)
+            start = as_utc(datetime.fromisoformat(start)) if start else end - default_window
+        except ValueError:
+            return error_response("Invalid start or end, expected an ISO 8601 datetime", 400)
+        if start > end:
+            return error_response("start must be before end", 400)
+        
+        # Include the bucket that `start` falls in and every bucket that begins before `end`
+        stats = ScanStat.query.filter(
+            ScanStat.qr_code_id == qr.id,
+            ScanStat.granularity == str(granularity),
+            ScanStat.bucket_start >= bucket_start(start, granularity),
+            ScanStat.bucket_start < end,
+        ).order_by(ScanStat.bucket_start).all()
+        
+        return success_response(
+            "QR code stats fetched",
+            200,
+            {
+                "qr_code_id": qr.id,
+                "granularity": str(granularity),
+                "start": bucket_start(start, granularity).isoformat(),
+                "end": end.isoformat(),
+                "total_scans": sum(stat.count for stat in stats),
+                "unique_scanners_estimate": estimate_unique_visitors(qr.id, start, end),
+                "buckets": [stat.to_dict() for stat in stats],
+            },
+        )
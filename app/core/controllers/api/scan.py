@@ -0,0 +1,61 @@
+from flask import Response
+
+from ....utils.decorators.http_cache import set_etag
+from ....utils.helpers.short_ids import is_short_id
+from ....utils.scan import resolve_scan, resolve_short_id, scan_response_body, scan_etag, scan_cache, shared_scan_store, qr_id_filter, scan_events
+
+class ScanController:
+    @staticmethod
+    def scan(short_code: str, template_type: str, uuid: str):
+        """
+        Resolve a scanned QR code, validate the short_code and template_type in the URL, and return its data.
+        
+        The last URL segment is the QR code's UUID, or its base62 short id; a short id is
+        mapped to the UUID first and everything below is keyed by the UUID.
+        """
+        if is_short_id(uuid):
+            if not qr_id_filter.might_contain(uuid):
+                return {"message": "QR code not found"}, 404
+            qr_code_id = resolve_short_id(uuid)
+            if qr_code_id is None:
+                if qr_id_filter.ready:
+                    qr_id_filter.record_false_positive()
+                return {"message": "QR code not found"}, 404
+            uuid = qr_code_id
+        
+        cache_key = scan_cache.make_key(short_code, template_type, uuid)
+        cached = scan_cache.get(cache_key)
+        if cached is not None:
+            return ScanController._json_body(uuid, *cached)
+        
+        # The shared store is keyed by uuid alone; an entry that doesn't match the URL falls through to the database.
+        entry = shared_scan_store.get(uuid)
+        if entry is not None and entry[0] == short_code and entry[1] == template_type:
+            cached = entry[2:]
+            scan_cache.set(cache_key, cached)
+            return ScanController._json_body(uuid, *cached)
+        
+        # Unknown IDs (bots, typos) are turned away without the full lookup (see qr_id_filter.might_contain).
+        if not qr_id_filter.might_contain(uuid):
+            return {"message": "QR code not found"}, 404
+        
+        row = resolve_scan(uuid)
+        if not row:
+            if qr_id_filter.ready:
+                qr_id_filter.record_false_positive()
+            return {"message": "QR code not found"}, 404
+        if row.unique_code is None or row.unique_code != short_code:
+            return {"message": "Invalid user for this QR code"}, 404
+        if row.template_type is None or row.template_type != template_type:
+            return {"message": "Invalid template for this QR code"}, 404
+        
+        cached = (scan_etag(row), scan_response_body(row))
+        scan_cache.set(cache_key, cached)
+        return ScanController._json_body(uuid, *cached)
+    
+    @staticmethod
+    def _json_body(qr_code_id: str, etag: str, body: bytes) -> Response:
+        """Record the scan and serve the pre-serialized JSON body as-is, skipping re-encoding."""
+        scan_events.record(qr_code_id)
+        set_etag(etag)
+        return Response(body, status=200, mimetype="application/json")
@@ -1,5 +1,5 @@
 # app/core/controllers/api/template.py
-from typing import List
+from typing import List, Tuple
 
 from ....extensions import db
 from ....models.qrcode import Template
@@ -16,6 +16,17 @@ class TemplateController:
         }
         return success_response("Templates fetched successfully", 200, data)
 
+    @staticmethod
+    def list_version() -> Tuple:
+        """
+        Version parts for the template list's ETag: every template's (id, updated_at).
+        
+        A count and max(updated_at) can stay the same when one template is deleted and
+        another added; the pairs can't. There are only a handful of templates.
+        """
+        rows = db.session.execute(db.select(Template.id, Template.updated_at).order_by(Template.id)).all()
+        return tuple(part for row in rows for part in row)
+
     @staticmethod
     def create():
         """Stub for creating a new template (not implemented)."""
@@ -3,6 +3,7 @@ from flask import Blueprint, request
 from .. import qrcode_bp
 from ....controllers.api import QrCodeController
 from .....utils.decorators.auth import roles_required
+from .....utils.decorators.http_cache import http_cache
 
 @qrcode_bp.route("/", methods=["GET", "POST"])
 @roles_required("Admin", "Customer")
@@ -12,6 +13,24 @@ def qrcode():
     elif request.method == "POST":
         return QrCodeController.create()
 
+@qrcode_bp.route("/batch", methods=["POST"])
+@roles_required("Admin", "Customer")
+def qrcode_batch():
+    """Create many QR codes against one template."""
+    return QrCodeController.create_batch()
+
+@qrcode_bp.route("/export.zip", methods=["GET"])
+@roles_required("Admin", "Customer")
+def qrcode_export():
+    """Download all of the current user's QR code images as a streamed ZIP."""
+    return QrCodeController.export()
+
+@qrcode_bp.route("/sheet", methods=["GET"])
+@roles_required("Admin", "Customer")
+def qrcode_sheet():
+    """Printable multi-up sheet (PDF or PNG) of a template's QR codes."""
+    return QrCodeController.sheet()
+
 @qrcode_bp.route("/<string:id>", methods=["GET", "PUT", "DELETE"])
 @roles_required("Admin", "Customer")
 def manage_qrcode(id):
@@ -23,3 +42,16 @@ def manage_qrcode(id):
     elif request.method == "DELETE":
         return QrCodeController.delete(id)
 
+
+@qrcode_bp.route("/<string:id>/stats", methods=["GET"])
+@roles_required("Admin", "Customer")
+def qrcode_stats(id):
+    """Hourly or daily scan statistics for a QR code."""
+    return QrCodeController.stats(id)
+
+@qrcode_bp.route("/<string:id>/image", methods=["GET"])
+@roles_required("Admin", "Customer")
+@http_cache(max_age=86400, stale_while_revalidate=604800, public=False)
+def qrcode_image(id):
+    """Render a QR code at any size and format from its stored matrix."""
+    return QrCodeController.image(id)
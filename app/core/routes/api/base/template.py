@@ -2,8 +2,10 @@ from flask import Blueprint, request
 
 from ....controllers.api.template import TemplateController
 from .. import template_bp
+from .....utils.decorators.http_cache import http_cache
 
 @template_bp.route("/", methods=["GET", "POST"])
+@http_cache(max_age=300, stale_while_revalidate=3600, etag_func=TemplateController.list_version)
 def manage_templates():
     """Handle GET (list templates) and POST (create template, not implemented) requests."""
     if request.method == "GET":
@@ -8,4 +8,4 @@ from flask import Blueprint, render_template
 
 debug_bp: Blueprint = Blueprint('dev_debug', __name__, url_prefix='/dev/debug')
 
-from . import cookies
\ No newline at end of file
+from . import cookies, scan
\ No newline at end of file
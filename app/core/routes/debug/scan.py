@@ -0,0 +1,52 @@
+"""
+Author: Emmanuel Olowu
+Link: https://github.com/zeddyemy
+Copyright: © 2024 Emmanuel Olowu <zeddyemy@gmail.com>
+"""
+
+from flask import jsonify
+
+from . import debug_bp
+from ....utils.scan import scan_cache, shared_scan_store, qr_id_filter, scan_events
+from ....utils.outbox import outbox_worker
+from ....utils.helpers.render_cache import qr_render_cache
+from ....utils.storage import storage
+
+# per-worker scan cache counters, used to size SCAN_CACHE_MAXSIZE
+@debug_bp.route('/scan-cache')
+def scan_cache_stats():
+    return jsonify(scan_cache.stats())
+
+
+@debug_bp.route('/scan-store')
+def scan_store_stats():
+    return jsonify(shared_scan_store.stats())
+
+
+# false-positive rate and memory footprint of this worker's Bloom filter of QR code IDs
+@debug_bp.route('/scan-filter')
+def scan_filter_stats():
+    return jsonify(qr_id_filter.stats())
+
+
+@debug_bp.route('/scan-events')
+def scan_event_stats():
+    return jsonify(scan_events.stats())
+
+
+# this worker's outbox counters and the outbox backlog by status
+@debug_bp.route('/outbox')
+def outbox_stats():
+    return jsonify(outbox_worker.stats())
+
+
+# hit rate and byte usage of this worker's cache of rendered QR images
+@debug_bp.route('/qr-render-cache')
+def qr_render_cache_stats():
+    return jsonify(qr_render_cache.stats())
+
+
+# per-operation call counts, error counts and latency of this worker's storage backend
+@debug_bp.route('/storage')
+def storage_stats():
+    return jsonify(storage.stats())
@@ -1,3 +1,4 @@
 from .auth import RoleNames
 from .orders import OrderStatus
-from .payments import PaymentMethods, PaymentStatus, PaymentType, TransactionType, PaymentGatewayName, TransferStatus
\ No newline at end of file
+from .payments import PaymentMethods, PaymentStatus, PaymentType, TransactionType, PaymentGatewayName, TransferStatus
+from .scan import StatGranularity
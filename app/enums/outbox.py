@@ -0,0 +1,10 @@
+from enum import Enum
+
+class OutboxStatus(Enum):
+    """ENUMS for the status field in OutboxMessage Model"""
+    PENDING = "pending"
+    DONE    = "done"
+    FAILED  = "failed"
+    
+    def __str__(self) -> str:
+        return self.value
@@ -9,3 +9,12 @@ class QRCodeType(Enum):
     def __str__(self) -> str:
         return self.value  # Ensures usage as strings in queries
 
+
+
+class QRImageStatus(Enum):
+    PENDING = "pending"
+    READY   = "ready"
+    FAILED  = "failed"
+    
+    def __str__(self) -> str:
+        return self.value
@@ -0,0 +1,9 @@
+from enum import Enum
+
+class StatGranularity(Enum):
+    """ENUMS for the granularity field in ScanStat Model"""
+    HOUR = "hour"
+    DAY = "day"
+    
+    def __str__(self) -> str:
+        return self.value  # Ensures usage as strings in queries
@@ -21,6 +21,8 @@ from .payment import Payment, Transaction
 from .subscription import Subscription, SubscriptionPlan
 from .defaults import create_default_admin, create_roles, create_default_templates
 from .qrcode import QRCode, Template
+from .scan import ScanEvent, ScanStat, ScanRollupState
+from .outbox import OutboxMessage
 
 
 def create_db_defaults(app: Flask) -> None:
@@ -108,6 +108,7 @@ def create_default_templates(clear: bool = False) -> None:
                     type=str(QRCodeType.MENU),
                     schema_definition={"url": "string", "restaurant_name": "string", "table_number": "string"},
                     preview_url="https://…/menu_thumb.png",
+                    error_correction="M", # printed table cards get scuffed and stained
                     description="A template for restaurant menus with table numbers."
                 ),
                 Template(
@@ -0,0 +1,51 @@
+from typing import Any, Dict
+
+from ..extensions import db
+from ..enums.outbox import OutboxStatus
+from ..utils.date_time import DateTimeUtils, to_gmt1_or_none
+
+class OutboxMessage(db.Model):
+    """
+    A side effect (storage delete, image render, ...) to perform after a transaction commits.
+    
+    Written with `enqueue()` in the same session, and so the same transaction, as the model
+    change that needs it: if the change rolls back, the message never existed. The outbox
+    worker claims due messages, runs the handler registered for `topic` and retries failures
+    with backoff, so handlers must be idempotent.
+    """
+    __tablename__ = 'outbox_message'
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    topic = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.String(20), nullable=False, default=str(OutboxStatus.PENDING))
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.String(255), nullable=True)
+    available_at = db.Column(db.DateTime(timezone=True), nullable=False, default=DateTimeUtils.aware_utcnow) # not claimed before this
+    created_at = db.Column(db.DateTime(timezone=True), default=DateTimeUtils.aware_utcnow)
+    processed_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_outbox_message_status_available_at', 'status', 'available_at'),
+    )
+
+    def __repr__(self):
+        return f'<OutboxMessage {self.id} {self.topic} ({self.status})>'
+
+    @classmethod
+    def enqueue(cls, topic: str, **payload: Any) -> 'OutboxMessage':
+        """Add a message to the current session. It is committed (or rolled back) with the caller's changes."""
+        message = cls(topic=topic, payload=payload, available_at=DateTimeUtils.aware_utcnow())
+        db.session.add(message)
+        return message
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'topic': self.topic,
+            'payload': self.payload,
+            'status': self.status,
+            'attempts': self.attempts,
+            'last_error': self.last_error,
+            'created_at': to_gmt1_or_none(self.created_at),
+            'processed_at': to_gmt1_or_none(self.processed_at),
+        }
@@ -1,7 +1,10 @@
 from uuid import uuid4
+from flask import current_app
+from sqlalchemy.orm import validates
+from sqlalchemy.orm.attributes import set_committed_value
 
 from ..extensions import db
-from ..enums.qrcode import QRCodeType
+from ..enums.qrcode import QRCodeType, QRImageStatus
 from ..utils.date_time import datetime, DateTimeUtils, to_gmt1_or_none
 
 class Club(db.Model):
@@ -39,31 +42,118 @@ class QRCode(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('app_user.id'), nullable=False)
     template_id = db.Column(db.String(36), db.ForeignKey('template.id'), nullable=False)
     data_payload = db.Column(db.JSON, nullable=False)
-    qr_code_image_url = db.Column(db.String(255), nullable=False)
+    qr_code_image_url = db.Column(db.String(255), nullable=True) # None until an asynchronously created image is uploaded
+    image_status = db.Column(db.String(20), nullable=False, default=str(QRImageStatus.READY), server_default=str(QRImageStatus.READY))
+    image_attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    image_error = db.Column(db.String(255), nullable=True) # last render/upload error; image_attempts counts tries, failed or not
     type = db.Column(db.String(150), nullable=True)
     dj_id = db.Column(db.Integer, db.ForeignKey('dj.id'), nullable=True)
     club_id = db.Column(db.Integer, db.ForeignKey('club.id'), nullable=True)
     created_at = db.Column(db.DateTime(timezone=True), default=DateTimeUtils.aware_utcnow)
     updated_at = db.Column(db.DateTime(timezone=True), default=DateTimeUtils.aware_utcnow, onupdate=DateTimeUtils.aware_utcnow)
+    scan_response = db.Column(db.LargeBinary, nullable=True) # pre-serialized JSON body of the public scan response
+    module_matrix = db.Column(db.LargeBinary, nullable=True) # bit-packed QR modules of public_scan_url, see qr_raster.pack_matrix
+    short_id = db.Column(db.String(16), unique=True, nullable=True) # base62 id used in the scan URL instead of `id`, see helpers.short_ids
+    # Encode/render parameters chosen by helpers.qr_tuner when the code was created (None on older codes, see `render_params`)
+    error_correction = db.Column(db.String(1), nullable=True)
+    qr_version = db.Column(db.SmallInteger, nullable=True)
+    box_size = db.Column(db.SmallInteger, nullable=True)
+    border = db.Column(db.SmallInteger, nullable=True)
     owner = db.relationship('AppUser', back_populates='qr_codes')
     template = db.relationship('Template', back_populates='qr_codes')
     dj = db.relationship('DJ', back_populates='qr_codes')
     club = db.relationship('Club', back_populates='qr_codes')
 
+    __table_args__ = (
+        # Covers the scan lookup's join keys so the QR row can be resolved from the index alone.
+        db.Index('ix_qr_code_scan_lookup', 'id', 'user_id', 'template_id'),
+        # Keyset pagination of a user's QR codes, newest first (see QrCodeController.list)
+        db.Index('ix_qr_code_user_created_at_id', 'user_id', 'created_at', 'id'),
+        # The scan Bloom filter's sync and recent-code checks read only the newest rows (see utils.scan.bloom)
+        db.Index('ix_qr_code_created_at', 'created_at'),
+    )
+
     def __repr__(self) -> str:
         return f'<QrCode {self.id} for User {self.user_id}>'
 
     def to_dict(self) -> dict:
         """Return a dictionary representation of the QRCode instance."""
+        return QRCode.serialize(self)
+
+    @property
+    def scan_key(self) -> str:
+        """The identifier in this QR code's scan URL: its short id if it has one, else its UUID."""
+        return self.short_id or self.id
+
+    @property
+    def public_scan_url(self) -> str:
+        """The URL encoded in this QR code's image."""
+        return QRCode.build_public_scan_url(self.owner.short_code, self.template.type, self.scan_key)
+
+    @staticmethod
+    def build_public_scan_url(short_code: str, template_type: str, qr_code_id: str) -> str:
+        return f"{current_app.config['APP_DOMAIN_NAME']}/{short_code}/{template_type}/{qr_code_id}"
+
+    @property
+    def render_params(self):
+        """The `RenderParams` this QR code's image is encoded and rendered with."""
+        from ..utils.helpers.qr_tuner import RenderParams
+        return RenderParams.from_columns(self.error_correction, self.qr_version, self.box_size, self.border)
+
+    def refresh_module_matrix(self) -> bytes:
+        """
+        Encode `public_scan_url` with the recorded `render_params` and store the packed matrix.
+        
+        Written with its own UPDATE that leaves `updated_at` alone (the matrix is derived
+        data, so the code's ETags and scan response must not change). Commit afterwards.
+        """
+        from ..utils.helpers.qr_tuner import encode_with_params
+        
+        packed_matrix = encode_with_params(self.public_scan_url, self.render_params)
+        db.session.execute(
+            db.update(QRCode).where(QRCode.id == self.id).values(module_matrix=packed_matrix, updated_at=QRCode.updated_at)
+        )
+        set_committed_value(self, "module_matrix", packed_matrix)
+        return packed_matrix
+
+    def build_scan_response(self) -> bytes:
+        """Return the JSON body served by the public scan endpoint for this QR code."""
+        return current_app.json.dumps({'data': self.to_dict()}, separators=(',', ':')).encode()
+
+    def refresh_scan_response(self) -> None:
+        """
+        Rebuild `scan_response` after the QR code is created or changed. Call before committing.
+
+        The timestamps are stamped here rather than left to the column defaults,
+        so the stored body carries the same `updated_at` that gets written.
+        """
+        now = DateTimeUtils.aware_utcnow()
+        if self.created_at is None:
+            self.created_at = now
+        self.updated_at = now
+        self.scan_response = self.build_scan_response()
+
+    @staticmethod
+    def serialize(qr) -> dict:
+        """
+        Build the public dictionary representation of a QR code.
+
+        Accepts a QRCode instance or any row exposing the same column names
+        (e.g. the result of a column-only select), so hot paths can skip ORM hydration.
+        """
         return {
-            'id': self.id,
-            'type': self.type,
-            'data_payload': self.data_payload,
-            'qr_code_image_url': self.qr_code_image_url,
-            'dj_id': self.dj_id,
-            'club_id': self.club_id,
-            'created_at': to_gmt1_or_none(self.created_at),
-            'updated_at': to_gmt1_or_none(self.updated_at),
+            'id': qr.id,
+            'short_id': qr.short_id,
+            'type': qr.type,
+            'data_payload': qr.data_payload,
+            'qr_code_image_url': qr.qr_code_image_url,
+            'image_status': qr.image_status,
+            'error_correction': qr.error_correction,
+            'qr_version': qr.qr_version,
+            'dj_id': qr.dj_id,
+            'club_id': qr.club_id,
+            'created_at': to_gmt1_or_none(qr.created_at),
+            'updated_at': to_gmt1_or_none(qr.updated_at),
         }
 
 class Template(db.Model):
@@ -75,13 +165,29 @@ class Template(db.Model):
     type = db.Column(db.String(150), nullable=True)
     schema_definition = db.Column(db.JSON, nullable=False)  # JSON schema for data validation
     preview_url = db.Column(db.String(255), nullable=True)
+    error_correction = db.Column(db.String(1), nullable=True) # minimum QR error correction (L/M/Q/H) of its codes, else QR_DEFAULT_ERROR_CORRECTION
     created_at = db.Column(db.DateTime(timezone=True), default=DateTimeUtils.aware_utcnow)
     updated_at = db.Column(db.DateTime(timezone=True), default=DateTimeUtils.aware_utcnow, onupdate=DateTimeUtils.aware_utcnow)
     qr_codes = db.relationship('QRCode', back_populates='template', lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_template_id_type', 'id', 'type'),
+    )
+
     def __repr__(self):
         return f'<Template {self.name}>'
 
+    @validates('error_correction')
+    def validate_error_correction(self, key, value):
+        """Store the level upper-cased; anything but L/M/Q/H would fail every render of the template's codes."""
+        from ..utils.helpers.qr_tuner import ERROR_CORRECTION_LEVELS
+        if value is None:
+            return None
+        level = str(value).upper()
+        if len(level) != 1 or level not in ERROR_CORRECTION_LEVELS:
+            raise ValueError(f"error_correction must be one of {', '.join(ERROR_CORRECTION_LEVELS)}, got {value!r}.")
+        return level
+
     def to_dict(self) -> dict:
         """Return a dictionary representation of the Template instance."""
         return {
@@ -91,6 +197,7 @@ class Template(db.Model):
             'type': self.type,
             'schema_definition': self.schema_definition,
             'preview_url': self.preview_url,
+            'error_correction': self.error_correction,
             'created_at': to_gmt1_or_none(self.created_at),
             'updated_at': to_gmt1_or_none(self.updated_at),
         }
@@ -145,6 +252,11 @@ class Notification(db.Model):
     dj = db.relationship('DJ', backref='notifications')
     music_request = db.relationship('MusicRequest')
 
+    __table_args__ = (
+        # Keyset pagination of a DJ's notifications, newest first
+        db.Index('ix_notification_dj_created_at_id', 'dj_id', 'created_at', 'id'),
+    )
+
     def __repr__(self):
         return f'<Notification {self.type} for DJ {self.dj_id}>'
 
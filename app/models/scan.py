@@ -0,0 +1,95 @@
+from datetime import timezone
+
+from sqlalchemy.exc import IntegrityError
+
+from ..extensions import db
+from ..utils.date_time import DateTimeUtils, to_gmt1_or_none
+
+class ScanEvent(db.Model):
+    """
+    Raw analytics event for a single scan of a QR code.
+
+    Rows are written in batches by the scan event recorder, never inside the scan request itself.
+    There is deliberately no foreign key to `qr_code`, so bulk inserts stay cheap and events outlive deleted codes.
+    """
+    __tablename__ = 'scan_event'
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    qr_code_id = db.Column(db.String(50), nullable=False)
+    scanned_at = db.Column(db.DateTime(timezone=True), nullable=False, default=DateTimeUtils.aware_utcnow)
+    # set by the database when the buffered event is inserted; the rollup's safety lag is measured against it
+    inserted_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.func.now())
+    user_agent = db.Column(db.String(255), nullable=True)
+    referrer = db.Column(db.String(255), nullable=True)
+    ip_prefix = db.Column(db.String(50), nullable=True) # coarse network (/24 for IPv4, /48 for IPv6), never the full address
+    visitor_hash = db.Column(db.String(16), nullable=True) # hash of ip_prefix + user_agent, for unique-visitor estimates
+
+    __table_args__ = (
+        db.Index('ix_scan_event_qr_code_id_scanned_at', 'qr_code_id', 'scanned_at'),
+    )
+
+    def __repr__(self):
+        return f'<ScanEvent {self.id} for QrCode {self.qr_code_id}>'
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'qr_code_id': self.qr_code_id,
+            'scanned_at': to_gmt1_or_none(self.scanned_at),
+            'user_agent': self.user_agent,
+            'referrer': self.referrer,
+            'ip_prefix': self.ip_prefix,
+        }
+
+
+class ScanStat(db.Model):
+    """Rolled-up scan counts for a QR code over one hour or one day (UTC), built incrementally from scan events."""
+    __tablename__ = 'scan_stat'
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    qr_code_id = db.Column(db.String(50), nullable=False)
+    granularity = db.Column(db.String(10), nullable=False) # 'hour' or 'day', see StatGranularity
+    bucket_start = db.Column(db.DateTime(timezone=True), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    unique_visitors = db.Column(db.Integer, nullable=False, default=0) # exact for hours, HyperLogLog estimate for days
+    visitor_sketch = db.Column(db.LargeBinary, nullable=True) # serialized HyperLogLog, day buckets only
+
+    __table_args__ = (
+        db.UniqueConstraint('qr_code_id', 'granularity', 'bucket_start', name='uq_scan_stat_bucket'),
+    )
+
+    def __repr__(self):
+        return f'<ScanStat {self.granularity} {self.bucket_start} for QrCode {self.qr_code_id}>'
+
+    def to_dict(self) -> dict:
+        start = self.bucket_start
+        start = start.replace(tzinfo=timezone.utc) if start.tzinfo is None else start.astimezone(timezone.utc) # SQLite drops the tzinfo
+        return {
+            'bucket_start': start.isoformat(),
+            'count': self.count,
+            'unique_visitors': self.unique_visitors,
+        }
+
+
+class ScanRollupState(db.Model):
+    """High-water mark of the last scan event folded into the rollups, so each run only reads new events."""
+    __tablename__ = 'scan_rollup_state'
+    name = db.Column(db.String(50), primary_key=True)
+    last_event_id = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime(timezone=True), default=DateTimeUtils.aware_utcnow, onupdate=DateTimeUtils.aware_utcnow)
+
+    @classmethod
+    def get_or_create(cls, name: str, lock: bool = False) -> 'ScanRollupState':
+        """
+        :param lock: Lock the row until the transaction ends (SELECT ... FOR UPDATE)
+            and reload it, so concurrent rollups take turns on the high-water mark.
+        """
+        state = db.session.get(cls, name, with_for_update=lock, populate_existing=lock)
+        if state is not None:
+            return state
+        try:
+            with db.session.begin_nested():
+                state = cls(name=name, last_event_id=0)
+                db.session.add(state)
+            return state
+        except IntegrityError:
+            # another first-ever run inserted the row between our read and insert
+            return db.session.get(cls, name, with_for_update=lock, populate_existing=True)
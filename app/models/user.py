@@ -60,6 +60,10 @@ class AppUser(db.Model, UserMixin):
     
     roles = db.relationship('UserRole', back_populates='user', foreign_keys='UserRole.app_user_id', cascade="all, delete-orphan") # roles assigned to the user.
     assigned_roles = db.relationship('UserRole', back_populates='assigner', foreign_keys='UserRole.assigner_id', cascade="all, delete-orphan") # roles that the user has assigned to others
+    
+    __table_args__ = (
+        db.Index('ix_app_user_id_unique_code', 'id', 'unique_code'), # backs the scan lookup join
+    )
 
 
     def __str__(self) -> str:
@@ -70,7 +74,15 @@ class AppUser(db.Model, UserMixin):
         return self.unique_code
     
     def regenerate_unique_code(self):
+        from ..utils.scan import evict_user_scan_entries
+        
+        from .qrcode import QRCode
+        
+        old_code = self.unique_code
         self.unique_code = generate_random_string(9)
+        evict_user_scan_entries(self.id, old_code) # scan URLs with the old code must stop resolving
+        # Stored matrices encode the old scan URL; they are re-encoded on next use
+        db.session.execute(db.update(QRCode).where(QRCode.user_id == self.id).values(module_matrix=None, updated_at=QRCode.updated_at))
     
     @property
     def password(self) -> AttributeError:
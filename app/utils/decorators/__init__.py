@@ -6,4 +6,5 @@ This package contains the decorators for the Flask application.
 @package: Estate Management
 """
 from .auth import roles_required
-from .timing import get_time
\ No newline at end of file
+from .timing import get_time
+from .http_cache import http_cache, set_etag, make_etag
\ No newline at end of file
@@ -0,0 +1,86 @@
+'''
+This module defines the `http_cache` decorator for the Flask application.
+
+Read endpoints decorated with `http_cache` opt in to HTTP caching: the
+`apply_http_cache` after_request hook adds a strong ETag and a
+Cache-Control header (with stale-while-revalidate) to their successful
+responses, and answers matching If-None-Match requests with a 304.
+
+A view (or its controller) can pin the ETag to a version of the underlying
+data with `set_etag()`; otherwise the ETag is a hash of the response body.
+'''
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Any, Callable, Iterable, Optional
+
+from flask import g, request, Response
+
+CACHEABLE_METHODS = ("GET", "HEAD")
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    Build a strong ETag value from version parts (IDs, `updated_at` timestamps, counts...).
+    
+    Datetimes are normalized to UTC so aware and naive values read from
+    different databases produce the same tag.
+    """
+    normalized = []
+    for part in parts:
+        if isinstance(part, datetime):
+            if part.tzinfo is not None:
+                part = part.astimezone(timezone.utc).replace(tzinfo=None)
+            part = part.isoformat()
+        normalized.append(str(part))
+    return hashlib.sha1("|".join(normalized).encode()).hexdigest()
+
+
+def set_etag(etag: str) -> None:
+    """Use `etag` (see `make_etag`) for the current response instead of hashing its body."""
+    g.http_cache_etag = etag
+
+
+def is_not_modified(etag: str) -> bool:
+    """True if the request's If-None-Match already carries `etag`."""
+    return request.method in CACHEABLE_METHODS and etag in request.if_none_match
+
+
+def http_cache(max_age: int = 60, stale_while_revalidate: int = 300, public: bool = True,
+               etag_func: Optional[Callable[..., Iterable[Any]]] = None) -> Callable:
+    """
+    Decorator to opt a read endpoint in to ETag / Cache-Control handling.
+    
+    Args:
+        max_age (int): Seconds browsers and CDNs may serve the response without revalidating.
+        stale_while_revalidate (int): Further seconds a stale copy may be served while revalidating in the background.
+        public (bool): Whether shared caches (CDNs) may store the response.
+        etag_func (callable, optional): Called with the view's arguments, returns the version parts for the ETag.
+            When given, a matching If-None-Match is answered with 304 before the view runs.
+    
+    Returns:
+        function: The decorated function.
+    """
+    directives = [
+        "public" if public else "private",
+        f"max-age={max_age}",
+        f"stale-while-revalidate={stale_while_revalidate}",
+    ]
+    cache_control = ", ".join(directives)
+    
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if request.method not in CACHEABLE_METHODS:
+                return fn(*args, **kwargs)
+            
+            g.http_cache_control = cache_control
+            if etag_func is not None:
+                etag = make_etag(*etag_func(*args, **kwargs))
+                set_etag(etag)
+                if is_not_modified(etag):
+                    return Response(status=304)
+            
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
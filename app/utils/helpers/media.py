@@ -1,7 +1,7 @@
 '''
 This module defines helper functions for handling media operations in the QUAS Flask application.
 
-These functions assist with tasks such as saving media files to Cloudinary and adding media properties to the database.
+These functions assist with tasks such as saving media files to the storage backend and adding media properties to the database.
 
 @author: Emmanuel Olowu
 @link: https://github.com/zeddyemy
@@ -12,20 +12,12 @@ from io import BufferedReader
 from datetime import date
 from werkzeug.utils import secure_filename
 from werkzeug.datastructures import FileStorage
-import cloudinary
-import cloudinary.uploader
 
 from ...extensions import db
 from ...models import Media
+from ..storage import storage
 from .loggers import console_log, log_exception
 from .basics import generate_random_string
-from config import Config
-
-cloudinary.config( 
-    cloud_name = Config.CLOUDINARY_CLOUD_NAME, 
-    api_key = Config.CLOUDINARY_API_KEY, 
-    api_secret = Config.CLOUDINARY_API_SECRET 
-)
 
 # Constants for file type validation
 IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.svg'}
@@ -46,17 +38,12 @@ def validate_file_extension(extension) -> str:
     else:
         raise ValueError("Invalid file type")
 
-def upload_to_cloudinary(media_file: FileStorage, new_media_name, folder_path, resource_type):
-    """Upload the media file to Cloudinary."""
+def upload_to_storage(media_file: FileStorage, key: str) -> str:
+    """Store the media file and return its public URL."""
     try:
-        return cloudinary.uploader.upload(
-            media_file,
-            resource_type=resource_type,
-            public_id=new_media_name,
-            folder=folder_path,
-        )
+        return storage.put(key, media_file, media_file.mimetype)
     except Exception as e:
-        log_exception("Cloudinary upload failed", e)
+        log_exception(f"Media upload to {storage.name} failed", e)
         raise e
     
 
@@ -75,7 +62,7 @@ def save_media_to_db(media_name: str, original_media_path: str) -> Media:
 
 def save_media(media_file, filename=None) -> Media:
     """
-    Saves a media file (image or video) to Cloudinary and the database.
+    Saves a media file (image or video) to the storage backend and the database.
     and then return the media instance after adding the media to Media Table
 
     Args:
@@ -99,12 +86,10 @@ def save_media(media_file, filename=None) -> Media:
     
     
     folder_path: str = get_folder_path() # create the path were image will be stored
-    resource_type = validate_file_extension(the_media_ext) # Check the file type and set the resource_type accordingly
-    
-    # Upload the media to Cloudinary
-    upload_result = upload_to_cloudinary(media_file, new_media_name, folder_path, resource_type)
+    validate_file_extension(the_media_ext) # Reject unsupported file types
     
-    original_media_path: str = upload_result['secure_url'] # Get the URL of the uploaded media
+    # Upload the media to the storage backend
+    original_media_path: str = upload_to_storage(media_file, f"{folder_path}/{new_media_name}{the_media_ext.lower()}")
     
     # Add the media properties to database
     new_media = save_media_to_db(media_name, original_media_path)
@@ -0,0 +1,175 @@
+"""
+Database-level pagination for list endpoints.
+
+`paginate(stmt, sort_key, serialize, items_key)` runs one page of a select
+and builds the response body. LIMIT/OFFSET or a keyset predicate go into
+the SQL itself, so only the rows of the page are loaded and serialized.
+
+Keyset (cursor) pagination is the default. It continues after the sort key
+of the last row returned, e.g. `(created_at, id) < (last.created_at,
+last.id)`. With an index on the sort key every page costs the same, however
+deep it is, unlike OFFSET, which reads and discards every row before the
+page. Cursors are opaque to clients: the last row's key values,
+JSON-encoded in URL-safe base64.
+
+Passing `page` selects offset pagination and the page-numbered envelope from
+the README (`current_page`, `total`, `total_pages`). Counting is bounded:
+past PAGINATION_EXACT_COUNT_LIMIT rows the total is estimated (by the
+PostgreSQL planner, or reported as the limit elsewhere), flagged with
+`total_is_estimate`, and cached for PAGINATION_COUNT_CACHE_SECONDS.
+"""
+import base64
+import binascii
+import json
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from cachetools import TTLCache
+from flask import current_app, request
+from sqlalchemy import Select
+
+from ...extensions import db
+
+DEFAULT_PER_PAGE = 10
+
+_count_cache: Optional[TTLCache] = None # created on first use, with the configured TTL
+_count_cache_lock = threading.Lock()
+
+
+def get_per_page(default: int = DEFAULT_PER_PAGE) -> int:
+    """`per_page` from the query string, clamped to 1..PAGINATION_MAX_PER_PAGE."""
+    maximum = int(current_app.config.get("PAGINATION_MAX_PER_PAGE", 100))
+    return min(max(request.args.get("per_page", default, type=int), 1), maximum)
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encode a row's sort key values (datetimes, strings, numbers) as a cursor."""
+    payload = [{"dt": value.isoformat()} if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int, types: Optional[Sequence[type]] = None) -> List[Any]:
+    """
+    Decode a cursor made by `encode_cursor`.
+    
+    :param size: Number of values the cursor must hold.
+    :param types: Python type each value must have, in order (e.g. datetime, str),
+        so a tampered cursor can't reach the database as a mistyped comparison.
+    :raises ValueError: If the cursor is malformed or holds a value of the wrong type.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(payload, list) or len(payload) != size:
+            raise ValueError("wrong number of values")
+        values = [datetime.fromisoformat(value["dt"]) if isinstance(value, dict) else value for value in payload]
+    except (binascii.Error, UnicodeDecodeError, TypeError, KeyError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}") from e
+    
+    for value, expected in zip(values, types or ()):
+        # bool is an int to isinstance(), but never a valid key value
+        if not isinstance(value, expected) or (isinstance(value, bool) and expected is not bool):
+            raise ValueError(f"Invalid cursor: expected {expected.__name__}, got {type(value).__name__}")
+    return values
+
+
+def count_rows(stmt: Select) -> Tuple[int, bool]:
+    """
+    Count the rows `stmt` returns, reading at most PAGINATION_EXACT_COUNT_LIMIT + 1 of them.
+    
+    :return: (total, whether it is an estimate)
+    """
+    global _count_cache
+    limit = int(current_app.config.get("PAGINATION_EXACT_COUNT_LIMIT", 10_000))
+    stmt = stmt.order_by(None)
+    compiled = stmt.compile(db.engine, compile_kwargs={"render_postcompile": True})
+    key = (str(compiled), repr(sorted(compiled.params.items())))
+    with _count_cache_lock:
+        cached = _count_cache.get(key) if _count_cache is not None else None
+    if cached is not None:
+        return cached, True
+    
+    total = db.session.scalar(db.select(db.func.count()).select_from(stmt.limit(limit + 1).subquery()))
+    if total <= limit:
+        return total, False
+    
+    # large: too slow to count exactly on every request, so estimate and remember it for a while
+    total = max(_planner_estimate(compiled), limit)
+    with _count_cache_lock:
+        if _count_cache is None:
+            _count_cache = TTLCache(maxsize=4096, ttl=float(current_app.config.get("PAGINATION_COUNT_CACHE_SECONDS", 60)))
+        _count_cache[key] = total
+    return total, True
+
+
+def _planner_estimate(compiled) -> int:
+    """The PostgreSQL planner's row estimate for a compiled select, or 0 elsewhere or on error."""
+    if db.engine.dialect.name != "postgresql":
+        return 0
+    try:
+        plan = db.session.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        return int(plan[0]["Plan"]["Plan Rows"])
+    except Exception as e:
+        current_app.logger.warning(f"Pagination: could not estimate a row count: {e!r}")
+        return 0
+
+
+def _python_type(column) -> type:
+    """The Python type of a column's values, or `object` (anything) if its SQL type doesn't say."""
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return object
+
+
+def paginate(stmt: Select, sort_key: Sequence[Any], serialize: Callable[[Any], Dict[str, Any]], items_key: str = "items",
+             descending: bool = True) -> Dict[str, Any]:
+    """
+    Run one page of `stmt` as requested by the query string (`per_page`, then `cursor` or `page`).
+    
+    :param stmt: The filtered select, without ORDER BY. It may select an entity or columns,
+        but must expose every `sort_key` column by name on its rows.
+    :param sort_key: Columns that order the rows and together are unique (end with the primary key).
+        An index on them keeps keyset pages constant-time.
+    :param serialize: Turns a row into its dictionary.
+    :param items_key: Key of the list of items in the response body.
+    :return: The response body: the items plus `per_page` and `next_cursor` (keyset), or
+        `current_page`, `total` and `total_pages` (offset).
+    :raises ValueError: If the cursor is invalid, including values that don't match the `sort_key` column types.
+    """
+    per_page = get_per_page()
+    stmt = stmt.order_by(*[column.desc() if descending else column.asc() for column in sort_key])
+    single_entity = len(stmt.column_descriptions) == 1 and stmt.column_descriptions[0]["expr"] is stmt.column_descriptions[0]["entity"]
+    
+    def fetch(stmt: Select) -> list:
+        result = db.session.execute(stmt)
+        return result.scalars().all() if single_entity else result.all()
+    
+    if "page" in request.args:
+        page = max(request.args.get("page", 1, type=int), 1)
+        total, estimated = count_rows(stmt)
+        rows = fetch(stmt.limit(per_page).offset((page - 1) * per_page))
+        body = {
+            items_key: [serialize(row) for row in rows],
+            "current_page": page,
+            "per_page": per_page,
+            "total": total,
+            "total_pages": -(-total // per_page),
+        }
+        if estimated:
+            body["total_is_estimate"] = True
+        return body
+    
+    if request.args.get("cursor"):
+        after = decode_cursor(request.args["cursor"], len(sort_key), [_python_type(column) for column in sort_key])
+        key = db.tuple_(*sort_key)
+        stmt = stmt.where(key < tuple(after) if descending else key > tuple(after))
+    rows = fetch(stmt.limit(per_page + 1))
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    return {
+        items_key: [serialize(row) for row in rows],
+        "per_page": per_page,
+        "next_cursor": encode_cursor([getattr(rows[-1], column.key) for column in sort_key]) if has_more else None,
+    }
@@ -0,0 +1,164 @@
+"""
+Pluggable QR code rendering engines.
+
+An engine encodes data into a module matrix, then writes the matrix out as
+an image. Two engines are available:
+
+    - ``qrcode``: the `qrcode` library (the original renderer).
+    - ``segno``: the `segno` library, with its native SVG writer.
+
+Both share the raster writers here. PNGs are written as 1-bit images
+straight from the matrix by the NumPy rasterizer in `qr_raster`; WebP goes
+through PIL from the same pixel array. The engine used by
+`generate_qr_code_image` is chosen with QR_RENDER_ENGINE; compare them with
+`benchmarks/render_engines.py`.
+"""
+from abc import ABC, abstractmethod
+from io import BytesIO
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import qrcode
+import segno
+from flask import Flask
+from PIL import Image, features
+
+from .qr_raster import rasterize, matrix_to_png_1bit
+
+Matrix = Sequence[Sequence[int]] # rows of modules, 1 = dark
+
+
+class QRDataOverflow(ValueError):
+    """The data doesn't fit in the requested QR version at the requested error correction level."""
+
+MIME_TYPES = {
+    "PNG": "image/png",
+    "SVG": "image/svg+xml",
+    "WEBP": "image/webp",
+}
+
+def matrix_to_image(matrix: Matrix, box_size: int, border: int) -> Image.Image:
+    """Scale a module matrix up to a greyscale image with a light quiet zone."""
+    pixels = rasterize(matrix, box_size, border)
+    return Image.fromarray(np.where(pixels, 0, 255).astype(np.uint8), mode="L")
+
+
+def matrix_to_png(matrix: Matrix, box_size: int, border: int) -> bytes:
+    return matrix_to_png_1bit(matrix, box_size, border)
+
+
+def matrix_to_webp(matrix: Matrix, box_size: int, border: int) -> bytes:
+    buf = BytesIO()
+    matrix_to_image(matrix, box_size, border).save(buf, format="WEBP", lossless=True)
+    return buf.getvalue()
+
+
+def matrix_to_svg(matrix: Matrix, box_size: int, border: int) -> bytes:
+    """One SVG path with a horizontal segment per run of dark modules."""
+    side = (len(matrix) + 2 * border) * box_size
+    segments = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < len(row):
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < len(row) and row[x]:
+                x += 1
+            segments.append(f"M{start + border} {y + border + 0.5}h{x - start}")
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{side}" height="{side}" '
+        f'viewBox="0 0 {side // box_size} {side // box_size}">'
+        f'<rect width="100%" height="100%" fill="#fff"/>'
+        f'<path stroke="#000" d="{"".join(segments)}"/></svg>'
+    ).encode()
+
+
+def render_matrix(matrix: Matrix, box_size: int = 10, border: int = 4, image_format: str = "PNG") -> bytes:
+    """Write an already encoded module matrix in any supported format."""
+    image_format = image_format.upper()
+    if image_format == "PNG":
+        return matrix_to_png(matrix, box_size, border)
+    if image_format == "SVG":
+        return matrix_to_svg(matrix, box_size, border)
+    if image_format == "WEBP":
+        return matrix_to_webp(matrix, box_size, border)
+    raise ValueError(f"Unsupported image format: {image_format}")
+
+
+class QREngine(ABC):
+    """Base engine: subclasses implement `encode`, and may override `render` for native writers."""
+    
+    name = ""
+    
+    @abstractmethod
+    def encode(self, data: str, error_correction: str, version: Optional[int] = None) -> Matrix:
+        """Encode at `version`, or the smallest version that fits. Raises `QRDataOverflow` if it doesn't fit."""
+    
+    def render(self, data: str, error_correction: str = "L", box_size: int = 10, border: int = 4, image_format: str = "PNG") -> bytes:
+        return render_matrix(self.encode(data, error_correction.upper()), box_size, border, image_format)
+
+
+class QrcodeEngine(QREngine):
+    name = "qrcode"
+    
+    _LEVELS = {
+        "L": qrcode.constants.ERROR_CORRECT_L,
+        "M": qrcode.constants.ERROR_CORRECT_M,
+        "Q": qrcode.constants.ERROR_CORRECT_Q,
+        "H": qrcode.constants.ERROR_CORRECT_H,
+    }
+    
+    def encode(self, data: str, error_correction: str, version: Optional[int] = None) -> Matrix:
+        qr = qrcode.QRCode(version=version, error_correction=self._LEVELS[error_correction], border=0)
+        qr.add_data(data)
+        try:
+            qr.make(fit=version is None) # smallest version that fits, unless one is given
+        except qrcode.exceptions.DataOverflowError as e:
+            raise QRDataOverflow(str(e)) from e
+        return qr.modules
+
+
+class SegnoEngine(QREngine):
+    name = "segno"
+    
+    def encode(self, data: str, error_correction: str, version: Optional[int] = None) -> Matrix:
+        # boost_error=False keeps the requested level, as the qrcode engine does
+        try:
+            return segno.make(data, error=error_correction, version=version, micro=False, boost_error=False).matrix
+        except segno.DataOverflowError as e:
+            raise QRDataOverflow(str(e)) from e
+    
+    def render(self, data: str, error_correction: str = "L", box_size: int = 10, border: int = 4, image_format: str = "PNG") -> bytes:
+        if image_format.upper() != "SVG":
+            return super().render(data, error_correction, box_size, border, image_format)
+        qr = segno.make(data, error=error_correction.upper(), micro=False, boost_error=False)
+        buf = BytesIO()
+        qr.save(buf, kind="svg", scale=box_size, border=border, xmldecl=False, light="#fff")
+        return buf.getvalue()
+
+
+class QREngineRegistry:
+    """The available engines, and which one renders by default (QR_RENDER_ENGINE)."""
+    
+    def __init__(self):
+        self.engines: Dict[str, QREngine] = {engine.name: engine for engine in (QrcodeEngine(), SegnoEngine())}
+        self.default_name = "qrcode"
+    
+    def init_app(self, app: Flask) -> None:
+        name = app.config.get("QR_RENDER_ENGINE") or self.default_name
+        if name not in self.engines:
+            raise ValueError(f"Unknown QR_RENDER_ENGINE '{name}', expected one of {sorted(self.engines)}")
+        self.default_name = name
+    
+    def get(self, name: Optional[str] = None) -> QREngine:
+        return self.engines[name or self.default_name]
+    
+    @staticmethod
+    def formats() -> List[str]:
+        """Image formats every engine can write here (WebP needs a Pillow built with libwebp)."""
+        return [fmt for fmt in MIME_TYPES if fmt != "WEBP" or features.check("webp")]
+
+
+qr_engines = QREngineRegistry()
@@ -1,37 +1,66 @@
 # app/utils/helpers/qr_generator.py
-import qrcode
 from io import BytesIO
-from typing import Tuple
+from typing import Optional, Tuple
 
-def generate_qr_code_image(data: str) -> Tuple[BytesIO, str]:
+from .qr_engines import qr_engines, render_matrix, MIME_TYPES
+from .qr_raster import pack_matrix, unpack_matrix
+from .render_cache import qr_render_cache
+
+def generate_qr_code_image(data: str, error_correction: str = "L", box_size: int = 10, border: int = 4, image_format: str = "PNG", engine: Optional[str] = None) -> Tuple[BytesIO, str]:
     """
     Generates a QR code image for the given string data.
     The image is returned as a BytesIO object, suitable for in-memory processing
     or direct uploading to cloud storage.
+    Identical renders are served from `qr_render_cache` without re-encoding.
 
     :param data: The string data to encode in the QR code (e.g., a URL).
+    :param error_correction: Error correction level (L, M, Q, H).
+    :param box_size: How many pixels each "box" (module) of the QR code is.
+    :param border: How many boxes thick the white border around the QR code is.
+    :param image_format: PNG, SVG or WEBP.
+    :param engine: Rendering engine name; defaults to QR_RENDER_ENGINE.
     :return: A tuple containing:
-             - BytesIO object: The in-memory binary stream of the QR code image (PNG format).
+             - BytesIO object: The in-memory binary stream of the QR code image.
              - str: The MIME type of the image (e.g., 'image/png').
     """
-    # Create a QRCode object with specified parameters
-    qr = qrcode.QRCode(
-        version=1, # Controls the size and data capacity of the QR code (1-40)
-        error_correction=qrcode.constants.ERROR_CORRECT_L, # Error correction level (L, M, Q, H)
-        box_size=10, # How many pixels each "box" (module) of the QR code is
-        border=4, # How many boxes thick the white border around the QR code is
+    renderer = qr_engines.get(engine)
+    image_format = image_format.upper()
+    key = qr_render_cache.make_key(data, error_correction, box_size, border, image_format, renderer.name)
+    image = qr_render_cache.get_or_render(
+        key, lambda: renderer.render(data, error_correction, box_size, border, image_format)
     )
-    qr.add_data(data) # Add the data to be encoded
-    qr.make(fit=True) # Compute the QR code structure, fitting the data
-
-    # Create an image from the QR code data
-    # fill_color: color of the QR code modules
-    # back_color: color of the background
-    img = qr.make_image(fill_color="black", back_color="white")
-    
-    # Save the image to an in-memory byte array (BytesIO object)
-    byte_arr = BytesIO()
-    img.save(byte_arr, format='PNG') # Save as PNG format
-    byte_arr.seek(0) # Rewind the stream to the beginning, so it can be read from
-    
-    return byte_arr, 'image/png'
\ No newline at end of file
+    return BytesIO(image), MIME_TYPES[image_format]
+
+def encode_qr_code(data: str, error_correction: str = "L", engine: Optional[str] = None, version: Optional[int] = None) -> bytes:
+    """
+    Encode data to a bit-packed module matrix (see `qr_raster.pack_matrix`).
+    The matrix can be stored and rendered later at any size with `render_qr_code_matrix`.
+
+    :param version: Encode at exactly this QR version; by default the smallest that fits.
+    :raises QRDataOverflow: If the data doesn't fit in `version`.
+    """
+    encoder = qr_engines.get(engine)
+    return qr_render_cache.get_or_render(
+        matrix_cache_key(data, error_correction, encoder.name, version),
+        lambda: pack_matrix(encoder.encode(data, error_correction.upper(), version)),
+    )
+
+def render_qr_code_matrix(packed_matrix: bytes, box_size: int = 10, border: int = 4, image_format: str = "PNG") -> Tuple[BytesIO, str]:
+    """
+    Render a bit-packed module matrix without re-encoding it.
+    Renders are cached by the matrix content, so every size and format variant shares the cache.
+
+    :return: The image stream and its MIME type, as `generate_qr_code_image` returns.
+    """
+    image_format = image_format.upper()
+    image = qr_render_cache.get_or_render(
+        matrix_image_cache_key(packed_matrix, box_size, border, image_format),
+        lambda: render_matrix(unpack_matrix(packed_matrix), box_size, border, image_format),
+    )
+    return BytesIO(image), MIME_TYPES[image_format]
+
+def matrix_cache_key(data: str, error_correction: str = "L", engine: Optional[str] = None, version: Optional[int] = None) -> bytes:
+    return qr_render_cache.make_key(data, error_correction, version or 0, 0, "MATRIX", qr_engines.get(engine).name)
+
+def matrix_image_cache_key(packed_matrix: bytes, box_size: int = 10, border: int = 4, image_format: str = "PNG") -> bytes:
+    return qr_render_cache.make_key(packed_matrix.hex(), "", box_size, border, image_format, "matrix")
@@ -0,0 +1,84 @@
+"""
+Vectorized rasterizer for QR module matrices.
+
+The encoder's matrix (rows of 0/1 modules) is turned into a boolean pixel
+array with NumPy: pad for the quiet zone, then `repeat` along both axes to
+scale each module to `box_size` pixels. The PNG writer packs that array
+straight into a 1-bit greyscale PNG (`packbits`, one zlib stream, three
+chunks), so no per-pixel Python or PIL drawing is involved.
+"""
+import struct
+import zlib
+from typing import Sequence
+
+import numpy as np
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def rasterize(matrix: Sequence[Sequence[int]], box_size: int, border: int) -> np.ndarray:
+    """Scale a module matrix to a boolean pixel array (True = dark) with a light quiet zone."""
+    modules = np.asarray(matrix, dtype=bool)
+    modules = np.pad(modules, border, mode="constant", constant_values=False)
+    return modules.repeat(box_size, axis=0).repeat(box_size, axis=1)
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def matrix_to_png_1bit(matrix: Sequence[Sequence[int]], box_size: int, border: int, compression: int = 6) -> bytes:
+    """
+    Render a module matrix straight to a 1-bit PNG.
+    
+    Rows are identical within a module, so only one pixel row per module is
+    scaled and bit-packed before the packed rows are repeated: the large
+    array is 8x smaller than the full boolean image.
+    """
+    modules = np.pad(np.asarray(matrix, dtype=bool), border, mode="constant", constant_values=False)
+    packed = np.packbits(~modules.repeat(box_size, axis=1), axis=1)
+    return _write_png(packed.repeat(box_size, axis=0), modules.shape[1] * box_size, compression)
+
+
+def write_png_1bit(pixels: np.ndarray, compression: int = 6) -> bytes:
+    """Encode a boolean pixel array (True = dark) as a 1-bit greyscale PNG."""
+    return _write_png(np.packbits(~pixels, axis=1), pixels.shape[1], compression)
+
+
+def _write_png(rows: np.ndarray, width: int, compression: int) -> bytes:
+    """
+    Write bit-packed rows (1 = white, as PNG greyscale expects; each row padded
+    to whole bytes) as a PNG, in a single IDAT chunk.
+    
+    A row identical to the one above uses the "Up" filter, which turns it into
+    zeros that zlib compresses almost for free; every other row is stored
+    unfiltered.
+    """
+    height = rows.shape[0]
+    repeated = np.zeros(height, dtype=bool)
+    repeated[1:] = (rows[1:] == rows[:-1]).all(axis=1)
+    filters = np.where(repeated, 2, 0).astype(np.uint8)[:, None]
+    scanlines = np.hstack([filters, np.where(repeated[:, None], 0, rows).astype(np.uint8)])
+    header = struct.pack(">IIBBBBB", width, height, 1, 0, 0, 0, 0) # bit depth 1, greyscale, no interlace
+    return b"".join((
+        _PNG_SIGNATURE,
+        _chunk(b"IHDR", header),
+        _chunk(b"IDAT", zlib.compress(scanlines.tobytes(), compression)),
+        _chunk(b"IEND", b""),
+    ))
+
+
+def pack_matrix(matrix: Sequence[Sequence[int]]) -> bytes:
+    """
+    Bit-pack a square module matrix for storage: one byte with the side length
+    (at most 177 for version 40) followed by the modules, row-major, 8 per byte.
+    """
+    modules = np.asarray(matrix, dtype=bool)
+    return bytes((modules.shape[0],)) + np.packbits(modules).tobytes()
+
+
+def unpack_matrix(blob: bytes) -> np.ndarray:
+    """Inverse of `pack_matrix`: a boolean array of shape (side, side)."""
+    side = blob[0]
+    bits = np.unpackbits(np.frombuffer(blob, dtype=np.uint8, offset=1), count=side * side)
+    return bits.astype(bool).reshape(side, side)
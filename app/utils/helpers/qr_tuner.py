@@ -0,0 +1,118 @@
+"""
+Chooses how each QR code is encoded and rendered.
+
+A template sets the minimum error correction its codes need
+(`Template.error_correction`, else QR_DEFAULT_ERROR_CORRECTION). The tuner
+encodes at that level in the smallest QR version that fits. It then raises
+the level as far as that version still allows, since the extra damage
+tolerance costs nothing in size. `box_size` is the largest whole number of
+pixels per module that keeps the image, quiet zone included, within
+QR_IMAGE_PIXEL_BUDGET. A dense code gets smaller modules instead of a
+bigger PNG.
+
+The chosen parameters are stored on the QR code (`QRCode.render_params`),
+so re-encoding and re-rendering it later gives the same image and hits the
+same cache entries.
+"""
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from flask import current_app
+
+from .qr_engines import qr_engines, QRDataOverflow
+from .qr_generator import encode_qr_code
+from .render_cache import qr_render_cache
+from config import DEFAULT_PIXEL_BUDGET
+
+ERROR_CORRECTION_LEVELS = "LMQH" # increasing damage tolerance: ~7%, 15%, 25%, 30%
+DEFAULT_BORDER = 4
+
+
+class RenderParams(NamedTuple):
+    error_correction: str = "L"
+    version: Optional[int] = None # None: smallest that fits (codes created before tuning)
+    box_size: int = 10
+    border: int = DEFAULT_BORDER
+    
+    @classmethod
+    def from_columns(cls, error_correction: Optional[str], version: Optional[int], box_size: Optional[int], border: Optional[int]) -> "RenderParams":
+        """Parameters recorded on a QR code row; codes created before tuning get the old fixed ones."""
+        return cls(error_correction or "L", version, box_size or 10, DEFAULT_BORDER if border is None else border)
+    
+    def as_columns(self) -> Dict[str, Any]:
+        """Keyword arguments for the matching `QRCode` columns."""
+        return {"error_correction": self.error_correction, "qr_version": self.version, "box_size": self.box_size, "border": self.border}
+
+
+def matrix_version(packed_matrix: bytes) -> int:
+    """QR version of a bit-packed matrix, from its side length (17 + 4 * version)."""
+    return (packed_matrix[0] - 17) // 4
+
+
+def fit_box_size(packed_matrix: bytes, border: int = DEFAULT_BORDER, pixel_budget: Optional[int] = None) -> int:
+    """Largest whole pixels per module that keeps the image within `pixel_budget` pixels wide (at least 1)."""
+    pixel_budget = pixel_budget or int(current_app.config.get("QR_IMAGE_PIXEL_BUDGET", DEFAULT_PIXEL_BUDGET))
+    return max(1, pixel_budget // (packed_matrix[0] + 2 * border))
+
+
+def tuned_cache_key(data: str, min_error_correction: str = "L", engine: Optional[str] = None) -> bytes:
+    return qr_render_cache.make_key(data, min_error_correction, 0, 0, "TUNED", qr_engines.get(engine).name)
+
+
+def cached_tuning(data: str, min_error_correction: str = "L", engine: Optional[str] = None) -> Optional[Tuple[str, bytes]]:
+    """The result of `tune_error_correction` if it is in the render cache, else None."""
+    cached = qr_render_cache.get(tuned_cache_key(data, min_error_correction.upper(), engine))
+    return (chr(cached[0]), cached[1:]) if cached is not None else None
+
+
+def cache_tuning(data: str, min_error_correction: str, error_correction: str, packed_matrix: bytes, engine: Optional[str] = None) -> None:
+    """Store a tuning done elsewhere (e.g. in a render pool process) in this process's render cache."""
+    qr_render_cache.set(tuned_cache_key(data, min_error_correction.upper(), engine), error_correction.encode() + packed_matrix)
+
+
+def tune_error_correction(data: str, min_error_correction: str = "L", engine: Optional[str] = None) -> Tuple[str, bytes]:
+    """
+    Encode `data` in the smallest version that fits at `min_error_correction`, at the
+    highest level that version holds. Cached, like the encodes it is built from.
+    
+    :return: (error correction level, bit-packed matrix)
+    """
+    min_error_correction = min_error_correction.upper()
+    cached = cached_tuning(data, min_error_correction, engine)
+    if cached is not None:
+        return cached
+    
+    level, packed_matrix = min_error_correction, encode_qr_code(data, min_error_correction, engine)
+    version = matrix_version(packed_matrix)
+    for higher in ERROR_CORRECTION_LEVELS[ERROR_CORRECTION_LEVELS.index(min_error_correction) + 1:]:
+        try:
+            packed_matrix, level = encode_qr_code(data, higher, engine, version), higher
+        except QRDataOverflow:
+            break
+    cache_tuning(data, min_error_correction, level, packed_matrix, engine)
+    return level, packed_matrix
+
+
+def tune_render_params(data: str, min_error_correction: Optional[str] = None, pixel_budget: Optional[int] = None,
+                       border: int = DEFAULT_BORDER, engine: Optional[str] = None) -> Tuple[RenderParams, bytes]:
+    """
+    Choose the render parameters for a new QR code encoding `data`.
+    
+    :return: (parameters to record on the QR code, bit-packed matrix)
+    """
+    min_error_correction = min_error_correction or current_app.config.get("QR_DEFAULT_ERROR_CORRECTION", "L")
+    level, packed_matrix = tune_error_correction(data, min_error_correction, engine)
+    box_size = fit_box_size(packed_matrix, border, pixel_budget)
+    return RenderParams(level, matrix_version(packed_matrix), box_size, border), packed_matrix
+
+
+def encode_with_params(data: str, params: RenderParams, engine: Optional[str] = None) -> bytes:
+    """
+    Re-encode a QR code with its recorded parameters.
+    
+    If its data no longer fits the recorded version (e.g. its owner's short code
+    changed), it falls back to the smallest version that fits at the recorded level.
+    """
+    try:
+        return encode_qr_code(data, params.error_correction, engine, params.version)
+    except QRDataOverflow:
+        return encode_qr_code(data, params.error_correction, engine)
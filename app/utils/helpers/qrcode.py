@@ -1,13 +0,0 @@
-# import segno
-from io import BytesIO
-
-def make_qr(data: str) -> BytesIO:
-    """Generate a QR PNG in memory."""
-    # qr = segno.make(data)
-    # buf = BytesIO()
-    # qr.save(buf, kind='png', scale=4)
-    # buf.seek(0)
-    return "buf"
-
-def store_qr(data):
-    pass
\ No newline at end of file
@@ -0,0 +1,100 @@
+"""
+Content-addressed cache of rendered QR code images.
+
+Rendering the same data with the same settings always produces the same
+bytes, so each worker process keeps an LRU cache of encoded images keyed by
+a hash of (data, error correction, box size, border, format, engine). The cache is
+capped in bytes rather than entries. Retries and repeat renders then cost a
+hash and a dict lookup instead of a full encode.
+"""
+import hashlib
+from threading import Lock
+from typing import Any, Callable, Dict, Optional
+
+from cachetools import LRUCache
+from flask import Flask
+
+
+class _CountingLRUCache(LRUCache):
+    """LRUCache that counts evictions."""
+    
+    def __init__(self, maxsize, getsizeof=None):
+        super().__init__(maxsize, getsizeof=getsizeof)
+        self.evictions = 0
+    
+    def popitem(self):
+        # Only called by the cache itself when it is over its byte cap.
+        item = super().popitem()
+        self.evictions += 1
+        return item
+
+
+class RenderCache:
+    """Byte-capped LRU cache of encoded QR code images, with hit/miss/eviction counters."""
+    
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self._lock = Lock()
+        self._configure(max_bytes)
+    
+    def _configure(self, max_bytes: int) -> None:
+        self.max_bytes = int(max_bytes)
+        self.enabled = self.max_bytes > 0
+        self._cache = _CountingLRUCache(maxsize=max(self.max_bytes, 1), getsizeof=len)
+        self.hits = 0
+        self.misses = 0
+    
+    def init_app(self, app: Flask) -> None:
+        """Size the cache from QR_RENDER_CACHE_MAX_BYTES. 0 disables it."""
+        with self._lock:
+            self._configure(app.config.get("QR_RENDER_CACHE_MAX_BYTES", self.max_bytes))
+    
+    @staticmethod
+    def make_key(data: str, error_correction: str, box_size: int, border: int, image_format: str, engine: str = "") -> bytes:
+        parts = (data, error_correction.upper(), str(box_size), str(border), image_format.upper(), engine)
+        return hashlib.blake2b("\x00".join(parts).encode(), digest_size=16).digest()
+    
+    def get(self, key: bytes) -> Optional[bytes]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            image = self._cache.get(key)
+            if image is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return image
+    
+    def set(self, key: bytes, image: bytes) -> None:
+        if not self.enabled or len(image) > self.max_bytes:
+            return
+        with self._lock:
+            self._cache[key] = image
+    
+    def get_or_render(self, key: bytes, render: Callable[[], bytes]) -> bytes:
+        """Return the cached image for `key`, rendering and caching it on a miss (rendering runs unlocked)."""
+        image = self.get(key)
+        if image is None:
+            image = render()
+            self.set(key, image)
+        return image
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._cache),
+                "bytes": self._cache.currsize,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self._cache.evictions,
+            }
+
+
+qr_render_cache = RenderCache()
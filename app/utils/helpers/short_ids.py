@@ -0,0 +1,54 @@
+"""
+Compact base62 identifiers for scan URLs.
+
+A QR code's scan URL ends in its 36-character UUID, which pushes typical
+URLs past the capacity of QR version 4. With QR_SHORT_IDS enabled, new QR
+codes also get a random `short_id` of QR_SHORT_ID_LENGTH base62 characters
+(10 characters give about 59 bits), used in the URL in place of the UUID.
+The UUID stays the primary key, and codes created before keep their URLs.
+"""
+import secrets
+from typing import List
+
+from flask import current_app
+
+BASE62 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+_BASE62_SET = frozenset(BASE62)
+SHORT_ID_ATTEMPTS = 3 # inserts tried before a short id collision is reported as an error
+
+
+def short_ids_enabled() -> bool:
+    return bool(current_app.config.get("QR_SHORT_IDS", False))
+
+
+def generate_short_id(length: int = 10) -> str:
+    return "".join(secrets.choice(BASE62) for _ in range(length))
+
+
+def is_short_id(value: str) -> bool:
+    """True for strings shaped like a short id; UUIDs contain dashes, so they never are."""
+    return 6 <= len(value) <= 16 and all(char in _BASE62_SET for char in value)
+
+
+def allocate_short_ids(count: int, length: int = None) -> List[str]:
+    """
+    Generate `count` distinct short ids that no QR code uses yet.
+    
+    Candidates are checked against the database in one query per round; the unique
+    index on `qr_code.short_id` still guards against a concurrent insert taking one.
+    """
+    from ...extensions import db
+    from ...models.qrcode import QRCode
+    
+    length = length or int(current_app.config.get("QR_SHORT_ID_LENGTH", 10))
+    allocated: List[str] = []
+    while len(allocated) < count:
+        candidates = {generate_short_id(length) for _ in range(count - len(allocated))} - set(allocated)
+        taken = set(db.session.scalars(db.select(QRCode.short_id).where(QRCode.short_id.in_(candidates))))
+        allocated.extend(candidates - taken)
+    return allocated
+
+
+def is_short_id_conflict(error: Exception) -> bool:
+    """Whether an IntegrityError came from the unique index on `qr_code.short_id`."""
+    return "short_id" in str(getattr(error, "orig", error))
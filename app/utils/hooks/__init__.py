@@ -1,6 +1,6 @@
 from flask import Flask
 
-from .after_request import set_access_control_allows, add_security_headers, log_response, close_resources
+from .after_request import set_access_control_allows, add_security_headers, log_response, close_resources, apply_http_cache
 from .before_request import log_request, setup_resources
 
 
@@ -18,4 +18,5 @@ def register_hooks(app: Flask) -> None:
     # app.after_request(log_response)
     app.after_request(add_security_headers)
     app.after_request(set_access_control_allows)
+    app.after_request(apply_http_cache)
     
\ No newline at end of file
@@ -1,5 +1,6 @@
 import time
-from flask import Flask, request, Response
+import hashlib
+from flask import Flask, request, Response, g
 from ..helpers.loggers import console_log
 from ...extensions import db
 
@@ -58,3 +59,30 @@ def close_resources(response: Response) -> Response:
     """
     db.session.close()
     return response
+
+
+def apply_http_cache(response: Response) -> Response:
+    """
+    Function to add ETag and Cache-Control headers to responses of endpoints
+    decorated with `http_cache`, and turn them into a 304 when the client's
+    If-None-Match already matches.
+    
+    Args:
+        response (Response): The response object.
+    
+    Returns:
+        Response: The modified response object.
+    """
+    cache_control = g.get("http_cache_control")
+    if not cache_control or request.method not in ("GET", "HEAD") or response.status_code not in (200, 304):
+        return response
+    
+    etag = g.get("http_cache_etag")
+    if etag is None and response.status_code == 200 and not response.is_streamed:
+        etag = hashlib.sha1(response.get_data()).hexdigest()
+    
+    if etag is not None:
+        response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    
+    return response.make_conditional(request)
@@ -0,0 +1,17 @@
+"""
+Transactional outbox for side effects outside the database.
+
+Instead of calling a remote service inside a request (and losing the call if
+the transaction later fails, or the process dies), code adds an
+`OutboxMessage` to the same session as its model change and calls
+`outbox_worker.notify()` after the commit:
+
+    db.session.delete(qr)
+    OutboxMessage.enqueue(STORAGE_DELETE, key=...)
+    db.session.commit()
+    outbox_worker.notify()
+
+Handlers are registered per topic with `@outbox_worker.handler(topic)`.
+"""
+from .worker import outbox_worker, OutboxWorker, OutboxHandler
+from .handlers import STORAGE_DELETE
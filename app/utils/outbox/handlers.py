@@ -0,0 +1,14 @@
+"""Outbox handlers for generic storage side effects."""
+from flask import current_app
+
+from ..storage import storage
+from .worker import outbox_worker, Payload
+
+STORAGE_DELETE = "storage.delete"
+
+
+@outbox_worker.handler(STORAGE_DELETE)
+def delete_stored_object(payload: Payload) -> None:
+    # deleting a missing object is a no-op in every backend, so retries are safe
+    storage.delete(payload["key"])
+    current_app.logger.info(f"'{payload['key']}' deleted from {storage.name}.")
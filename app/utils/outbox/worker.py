@@ -0,0 +1,239 @@
+"""
+Drains the transactional outbox.
+
+Requests record side effects as `OutboxMessage` rows in their own
+transaction and call `outbox_worker.notify()` after committing. Each
+process runs one drain thread, started lazily on its first request, which
+wakes on notify() or every OUTBOX_POLL_SECONDS. It claims due messages by
+pushing their `available_at` forward by a lease (with SKIP LOCKED on
+databases that have it), then runs their handlers on a small thread pool.
+A failed message is retried after OUTBOX_RETRY_BACKOFF_SECONDS, doubling on
+each attempt. After OUTBOX_MAX_ATTEMPTS it is marked `failed` and its
+handler's `on_give_up` hook runs. A process that dies mid-message only
+delays it until the lease expires. Results are written only while the lease
+is still held (`available_at` unchanged since the claim): a handler that
+outlives OUTBOX_LEASE_SECONDS may run twice, so handlers must be idempotent,
+but the second claimer's attempts and status are never overwritten.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from flask import Flask
+
+from ...extensions import db
+from ...enums.outbox import OutboxStatus
+from ..date_time import DateTimeUtils
+from ..helpers.loggers import console_log, log_exception
+
+Payload = Dict[str, Any]
+
+
+class OutboxHandler(NamedTuple):
+    run: Callable[[Payload], Any]
+    on_give_up: Optional[Callable[[Payload, Exception], Any]] = None
+
+
+class OutboxWorker:
+    """Runs registered handlers for outbox messages, with retries and exponential backoff."""
+    
+    MAX_BACKOFF_SECONDS = 3600
+    
+    def __init__(self):
+        self.app: Optional[Flask] = None
+        self.enabled = True
+        self.max_workers = 4
+        self.batch_size = 50
+        self.max_attempts = 8
+        self.backoff_seconds = 2.0
+        self.poll_seconds = 5.0
+        self.lease_seconds = 300
+        self.handlers: Dict[str, OutboxHandler] = {}
+        self._wakeup = threading.Event()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pid = None
+        
+        self.succeeded = 0
+        self.retried = 0
+        self.failed = 0
+        self.lost_leases = 0
+    
+    def init_app(self, app: Flask) -> None:
+        self.app = app
+        self.enabled = bool(app.config.get("OUTBOX_ENABLED", True))
+        self.max_workers = int(app.config.get("OUTBOX_WORKERS", self.max_workers))
+        self.batch_size = int(app.config.get("OUTBOX_BATCH_SIZE", self.batch_size))
+        self.max_attempts = max(1, int(app.config.get("OUTBOX_MAX_ATTEMPTS", self.max_attempts)))
+        self.backoff_seconds = float(app.config.get("OUTBOX_RETRY_BACKOFF_SECONDS", self.backoff_seconds))
+        self.poll_seconds = float(app.config.get("OUTBOX_POLL_SECONDS", self.poll_seconds))
+        self.lease_seconds = int(app.config.get("OUTBOX_LEASE_SECONDS", self.lease_seconds))
+        if self.enabled:
+            # web workers drain in the background; CLI runs use `flask outbox drain` instead
+            app.before_request(self._ensure_worker)
+    
+    def handler(self, topic: str, on_give_up: Optional[Callable[[Payload, Exception], Any]] = None):
+        """Register the function that performs messages of `topic`. It runs in an app context and must be idempotent."""
+        def decorator(fn: Callable[[Payload], Any]) -> Callable[[Payload], Any]:
+            self.handlers[topic] = OutboxHandler(fn, on_give_up)
+            return fn
+        return decorator
+    
+    def notify(self) -> None:
+        """Wake this process's drain thread. Call after committing new messages."""
+        if self.enabled:
+            self._ensure_worker()
+            self._wakeup.set()
+    
+    # ----- background draining -----
+    
+    def _ensure_worker(self) -> None:
+        """Start this process's drain thread and handler pool (lazily, so each gunicorn worker gets its own after fork)."""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="outbox")
+            self._pid = pid
+            threading.Thread(target=self._run, name="outbox-drainer", daemon=True).start()
+    
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.poll_seconds)
+            self._wakeup.clear()
+            try:
+                while self.drain_once() == self.batch_size:
+                    pass
+            except Exception as e:
+                log_exception("Draining the outbox failed", e)
+    
+    def drain_once(self) -> int:
+        """Claim one batch of due messages and run them. Returns the number claimed."""
+        with self.app.app_context():
+            ids, lease = self._claim()
+        if not ids:
+            return 0
+        if self._pid == os.getpid():
+            list(self._executor.map(lambda message_id: self._process(message_id, lease), ids))
+        else:
+            for message_id in ids:
+                self._process(message_id, lease)
+        return len(ids)
+    
+    def _claim(self) -> Tuple[List[int], datetime]:
+        """Lease a batch of due messages. Returns their ids and the lease (their new `available_at`)."""
+        from ...models.outbox import OutboxMessage
+        
+        now = DateTimeUtils.aware_utcnow()
+        lease = now + timedelta(seconds=self.lease_seconds)
+        ids = db.session.scalars(
+            db.select(OutboxMessage.id)
+            .where(OutboxMessage.status == str(OutboxStatus.PENDING), OutboxMessage.available_at <= now)
+            .order_by(OutboxMessage.available_at, OutboxMessage.id)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if ids:
+            db.session.execute(
+                db.update(OutboxMessage)
+                .where(OutboxMessage.id.in_(ids))
+                .values(available_at=lease)
+            )
+        db.session.commit()
+        return ids, lease
+    
+    def _settle(self, message_id: int, lease: datetime, **values) -> bool:
+        """
+        Update a message only if it is still pending under our lease, and commit.
+        
+        :return: False if the lease expired and the message was claimed again (or
+            finished) elsewhere, in which case nothing is written.
+        """
+        from ...models.outbox import OutboxMessage
+        
+        result = db.session.execute(
+            db.update(OutboxMessage)
+            .where(OutboxMessage.id == message_id, OutboxMessage.status == str(OutboxStatus.PENDING),
+                   OutboxMessage.available_at == lease)
+            .values(attempts=OutboxMessage.attempts + 1, **values)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if result.rowcount == 0:
+            self.lost_leases += 1
+            console_log("OUTBOX", f"Lost the lease on message {message_id}; leaving it to its new owner.", "WARNING")
+            return False
+        return True
+    
+    def _process(self, message_id: int, lease: datetime) -> None:
+        from ...models.outbox import OutboxMessage
+        
+        with self.app.app_context():
+            message: Optional[OutboxMessage] = db.session.get(OutboxMessage, message_id)
+            if message is None or message.status != str(OutboxStatus.PENDING):
+                return
+            topic, payload = message.topic, dict(message.payload or {})
+            handler = self.handlers.get(topic)
+            try:
+                if handler is None:
+                    raise LookupError(f"No outbox handler registered for '{topic}'")
+                handler.run(payload)
+            except Exception as e:
+                db.session.rollback()
+                self._handle_failure(message_id, lease, topic, handler, payload, e)
+                return
+            
+            if self._settle(message_id, lease, status=str(OutboxStatus.DONE), last_error=None,
+                            processed_at=DateTimeUtils.aware_utcnow()):
+                self.succeeded += 1
+    
+    def _handle_failure(self, message_id: int, lease: datetime, topic: str, handler: Optional[OutboxHandler],
+                        payload: Payload, error: Exception) -> None:
+        from ...models.outbox import OutboxMessage
+        
+        attempts = (db.session.scalar(db.select(OutboxMessage.attempts).where(OutboxMessage.id == message_id)) or 0) + 1
+        last_error = repr(error)[:255]
+        
+        if handler is not None and attempts < self.max_attempts:
+            delay = min(self.backoff_seconds * 2 ** (attempts - 1), self.MAX_BACKOFF_SECONDS)
+            if self._settle(message_id, lease, last_error=last_error,
+                            available_at=DateTimeUtils.aware_utcnow() + timedelta(seconds=delay)):
+                self.retried += 1
+            return
+        
+        if not self._settle(message_id, lease, last_error=last_error, status=str(OutboxStatus.FAILED),
+                            processed_at=DateTimeUtils.aware_utcnow()):
+            return
+        self.failed += 1
+        log_exception(f"Giving up on outbox message {message_id} ({topic}) after {attempts} attempts", error)
+        if handler is not None and handler.on_give_up is not None:
+            try:
+                handler.on_give_up(payload, error)
+            except Exception as e:
+                db.session.rollback()
+                log_exception(f"on_give_up for outbox message {message_id} failed", e)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Counters for this process, plus the outbox backlog by status (needs an app context)."""
+        from ...models.outbox import OutboxMessage
+        
+        backlog = db.session.execute(
+            db.select(OutboxMessage.status, db.func.count()).group_by(OutboxMessage.status)
+        ).all()
+        return {
+            "enabled": self.enabled,
+            "workers": self.max_workers,
+            "topics": sorted(self.handlers),
+            "succeeded": self.succeeded,
+            "retried": self.retried,
+            "failed": self.failed,
+            "lost_leases": self.lost_leases,
+            "messages": {status: count for status, count in backlog},
+        }
+
+
+outbox_worker = OutboxWorker()
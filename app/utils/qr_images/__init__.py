@@ -0,0 +1,13 @@
+"""
+This package contains the helpers that render QR code images and store them.
+
+QR codes created in async mode are committed with a `pending` image and a
+render job in the outbox (`enqueue_image_render`); the outbox worker renders
+and uploads the image off the request path and fills in `qr_code_image_url`.
+Stored images are removed the same way (`enqueue_image_delete`). Batch
+creation renders on `render_pool` (a process pool) and uploads concurrently.
+"""
+from .worker import render_and_upload_image, enqueue_image_render, enqueue_image_delete, enqueue_matrix_backfill, QR_IMAGE_RENDER, QR_MATRIX_BACKFILL
+from .storage import qr_image_key, qr_image_key_for, store_qr_image, delete_qr_image
+from .batch import render_pool, RenderPool, tune_and_render, upload_many
+from .export import iter_export_zip
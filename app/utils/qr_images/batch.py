@@ -0,0 +1,192 @@
+"""
+Parallel rendering and upload for bulk QR code creation.
+
+Encoding a QR code is CPU-bound pure Python, so batches are encoded and
+rendered on a per-process `ProcessPoolExecutor` (spawned, not forked, since the web
+worker already runs threads). Uploads are network-bound and run on the
+shared storage pool (`storage.map`). Both return one `(result, error)` pair per input,
+in order, so callers can report per-item outcomes.
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+from io import BytesIO
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+from flask import Flask
+
+from ..helpers.loggers import log_exception
+from ..helpers.qr_generator import render_qr_code_matrix, matrix_image_cache_key
+from ..helpers.render_cache import qr_render_cache
+from ..helpers.qr_engines import qr_engines
+from ..helpers.qr_tuner import RenderParams, tune_render_params, cached_tuning, cache_tuning, fit_box_size, matrix_version, DEFAULT_BORDER, DEFAULT_PIXEL_BUDGET
+from ..storage import storage
+from .storage import store_qr_image
+
+R = TypeVar("R")
+Outcome = Tuple[Optional[object], Optional[Exception]]
+
+
+def tune_and_render(data: str, min_error_correction: str, pixel_budget: int, engine: Optional[str] = None) -> Tuple[RenderParams, bytes, bytes]:
+    """
+    Tune, encode and render one QR code to PNG (module-level so it can run in a worker
+    process, hence the settings passed in rather than read from the app config).
+    
+    :return: (render parameters, packed module matrix, PNG bytes)
+    """
+    params, packed_matrix = tune_render_params(data, min_error_correction, pixel_budget, DEFAULT_BORDER, engine)
+    stream, _ = render_qr_code_matrix(packed_matrix, params.box_size, params.border)
+    return params, packed_matrix, stream.getvalue()
+
+
+class RenderPool:
+    """Lazily created process pool for rendering QR code images in bulk."""
+    
+    def __init__(self):
+        self.processes = 2 # per web worker, see QR_RENDER_PROCESSES
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pid = None
+    
+    def init_app(self, app: Flask) -> None:
+        self.processes = int(app.config.get("QR_RENDER_PROCESSES") or self.processes)
+    
+    def _ensure_executor(self) -> ProcessPoolExecutor:
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.processes,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                    self._pid = pid
+                    atexit.register(self._executor.shutdown, wait=False, cancel_futures=True)
+        return self._executor
+    
+    def _reset(self) -> None:
+        with self._lock:
+            self._executor, self._pid = None, None
+    
+    def render_many(self, datas: Sequence[str], min_error_correction: str = "L", pixel_budget: int = DEFAULT_PIXEL_BUDGET) -> List[Outcome]:
+        """
+        Tune, encode and render each string (see `helpers.qr_tuner`), as
+        `(render parameters, packed matrix, PNG bytes)` results.
+        
+        Items already in this process's render cache are not sent to the pool, and
+        the pool's results are added to it. Small batches (or a 1-process pool) are
+        rendered inline.
+        """
+        outcomes: List[Optional[Outcome]] = [None] * len(datas)
+        misses = []
+        for index, data in enumerate(datas):
+            tuned = cached_tuning(data, min_error_correction)
+            png = None
+            if tuned is not None:
+                error_correction, packed_matrix = tuned
+                params = RenderParams(error_correction, matrix_version(packed_matrix),
+                                      fit_box_size(packed_matrix, DEFAULT_BORDER, pixel_budget), DEFAULT_BORDER)
+                png = qr_render_cache.get(matrix_image_cache_key(packed_matrix, params.box_size, params.border))
+            if png is None:
+                misses.append(index)
+            else:
+                outcomes[index] = ((params, packed_matrix, png), None)
+        
+        uncached = self._render_uncached([datas[i] for i in misses], min_error_correction, pixel_budget)
+        for index, outcome in zip(misses, uncached):
+            outcomes[index] = outcome
+            if outcome[0] is not None:
+                params, packed_matrix, png = outcome[0]
+                cache_tuning(datas[index], min_error_correction, params.error_correction, packed_matrix)
+                qr_render_cache.set(matrix_image_cache_key(packed_matrix, params.box_size, params.border), png)
+        return outcomes
+    
+    def _render_uncached(self, datas: Sequence[str], min_error_correction: str, pixel_budget: int) -> List[Outcome]:
+        if len(datas) < 2 or self.processes < 2:
+            return [self._render_inline(data, min_error_correction, pixel_budget) for data in datas]
+        try:
+            engine = qr_engines.default_name # spawned processes don't run init_app
+            futures = [self._ensure_executor().submit(tune_and_render, data, min_error_correction, pixel_budget, engine) for data in datas]
+        except BrokenProcessPool as e:
+            log_exception("QR render pool is broken, rendering inline", e)
+            self._reset()
+            return [self._render_inline(data, min_error_correction, pixel_budget) for data in datas]
+        
+        outcomes: List[Outcome] = []
+        for data, future in zip(datas, futures):
+            try:
+                outcomes.append((future.result(), None))
+            except BrokenProcessPool:
+                self._reset()
+                outcomes.append(self._render_inline(data, min_error_correction, pixel_budget))
+            except Exception as e:
+                outcomes.append((None, e))
+        return outcomes
+    
+    def imap(self, fn: Callable[..., R], *iterables: Iterable) -> Iterator[R]:
+        """
+        Like `map(fn, *iterables)`, run on the pool: results are yielded in order, each as
+        soon as it (and the ones before it) are done. At most two tasks per process are
+        queued at a time. `fn` must be a module-level function. Runs inline on a 1-process
+        pool, or if the pool breaks.
+        """
+        args = zip(*iterables)
+        if self.processes < 2:
+            for item in args:
+                yield fn(*item)
+            return
+        
+        window = deque()
+        try:
+            for item in args:
+                try:
+                    future = self._ensure_executor().submit(fn, *item)
+                except BrokenProcessPool:
+                    self._reset()
+                    future = None # rendered inline when its turn comes
+                window.append((item, future))
+                if len(window) >= 2 * self.processes:
+                    yield self._result(fn, *window.popleft())
+            while window:
+                yield self._result(fn, *window.popleft())
+        finally:
+            for _, future in window:
+                if future is not None:
+                    future.cancel()
+    
+    def _result(self, fn: Callable[..., R], item: tuple, future: Optional[Future]) -> R:
+        if future is None:
+            return fn(*item)
+        try:
+            return future.result()
+        except BrokenProcessPool as e:
+            log_exception("QR render pool is broken, rendering inline", e)
+            self._reset()
+            return fn(*item)
+    
+    @staticmethod
+    def _render_inline(data: str, min_error_correction: str, pixel_budget: int) -> Outcome:
+        try:
+            return tune_and_render(data, min_error_correction, pixel_budget), None
+        except Exception as e:
+            return None, e
+
+
+def upload_many(images: Sequence[Tuple[str, bytes]]) -> List[Outcome]:
+    """Upload (public_id, png) pairs concurrently, returning each image's URL or error in order."""
+    
+    def upload(item: Tuple[str, bytes]) -> Outcome:
+        public_id, png = item
+        try:
+            return store_qr_image(BytesIO(png), public_id), None
+        except Exception as e:
+            return None, e
+    
+    return storage.map(upload, images)
+
+
+render_pool = RenderPool()
@@ -0,0 +1,155 @@
+"""
+Streaming ZIP export of a user's QR code images.
+
+`iter_export_zip()` yields the archive in chunks as it is built, so the
+response can be sent with chunked transfer while it is still being
+written. QR codes are read in keyset pages. Their images are fetched from
+storage on the shared storage pool, at most QR_EXPORT_CONCURRENCY at a
+time, or re-rendered from the stored module matrix when the stored copy is
+missing. Entries are written in completion order. PNGs are already
+compressed, so they are stored as-is; only the trailing `manifest.csv` is
+deflated. Memory use is bounded by the fetch window plus one page of rows,
+whatever the number of codes. The manifest is spooled to disk if it grows
+large.
+"""
+import csv
+import json
+import tempfile
+import zipfile
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+from flask import current_app
+
+from ...extensions import db
+from ..date_time import DateTimeUtils
+from ..helpers.loggers import log_exception
+from ..helpers.qr_engines import render_matrix
+from ..helpers.qr_tuner import RenderParams, encode_with_params
+from ..helpers.qr_raster import unpack_matrix
+from ..storage import storage
+from .storage import qr_image_key_for
+
+MANIFEST_COLUMNS = ["filename", "qr_code_id", "type", "template_id", "public_scan_url", "image_url", "source", "created_at", "data"]
+
+
+class ExportRow(NamedTuple):
+    id: str
+    type: Optional[str]
+    template_id: str
+    image_url: Optional[str]
+    module_matrix: Optional[bytes]
+    render_params: RenderParams
+    public_scan_url: str
+    created_at: Any
+    data: Any
+
+
+class _ChunkSink:
+    """Write-only, unseekable file object that collects what `zipfile` writes until it is drained."""
+    
+    def __init__(self):
+        self._chunks: List[bytes] = []
+    
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self) -> None:
+        pass
+    
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _iter_rows(user_id: int, short_code: str, page_size: int) -> Iterator[ExportRow]:
+    from ...models.qrcode import QRCode, Template
+    
+    last_id = None
+    while True:
+        stmt = (
+            db.select(QRCode.id, QRCode.short_id, QRCode.type, QRCode.template_id, QRCode.qr_code_image_url, QRCode.module_matrix,
+                      QRCode.error_correction, QRCode.qr_version, QRCode.box_size, QRCode.border,
+                      QRCode.created_at, QRCode.data_payload, Template.type)
+            .join(Template, Template.id == QRCode.template_id)
+            .where(QRCode.user_id == user_id)
+            .order_by(QRCode.id)
+            .limit(page_size)
+        )
+        if last_id is not None:
+            stmt = stmt.where(QRCode.id > last_id)
+        page = db.session.execute(stmt).all()
+        db.session.commit() # don't hold a transaction open while the page streams out
+        for id, short_id, type, template_id, image_url, module_matrix, error_correction, version, box_size, border, \
+                created_at, data, template_type in page:
+            yield ExportRow(id, type, template_id, image_url, module_matrix,
+                            RenderParams.from_columns(error_correction, version, box_size, border),
+                            QRCode.build_public_scan_url(short_code, template_type, short_id or id), created_at, data)
+        if len(page) < page_size:
+            return
+        last_id = page[-1][0]
+
+
+def _fetch_image(row: ExportRow) -> Dict[str, Any]:
+    """Read a QR code's stored PNG, or render it from its matrix. Never raises."""
+    if row.image_url:
+        try:
+            return {"row": row, "png": storage.get(qr_image_key_for(row.id, row.image_url)), "source": "storage"}
+        except Exception as e:
+            current_app.logger.warning(f"Export: stored image of QR code {row.id} unavailable, re-rendering: {e!r}")
+    try:
+        # rendered directly rather than through the render cache, which an export would flush
+        packed = row.module_matrix or encode_with_params(row.public_scan_url, row.render_params)
+        png = render_matrix(unpack_matrix(packed), row.render_params.box_size, row.render_params.border)
+        return {"row": row, "png": png, "source": "rendered"}
+    except Exception as e:
+        log_exception(f"Export: rendering QR code {row.id} failed", e)
+        return {"row": row, "png": None, "source": "failed"}
+
+
+def iter_export_zip(user_id: int, short_code: str, page_size: int = 500) -> Iterator[bytes]:
+    """
+    Yield a ZIP archive of the user's QR code images (`qr_codes/<id>.png`) plus `manifest.csv`.
+    
+    Must be consumed inside an app context (e.g. wrapped in `stream_with_context`).
+    """
+    concurrency = int(current_app.config.get("QR_EXPORT_CONCURRENCY", 4))
+    sink = _ChunkSink()
+    archive = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED)
+    manifest_file = tempfile.SpooledTemporaryFile(max_size=1024 * 1024, mode="w+", newline="", encoding="utf-8")
+    manifest = csv.writer(manifest_file)
+    manifest.writerow(MANIFEST_COLUMNS)
+    timestamp = DateTimeUtils.aware_utcnow().timetuple()[:6]
+    
+    try:
+        for result in storage.imap_unordered(_fetch_image, _iter_rows(user_id, short_code, page_size), concurrency):
+            row: ExportRow = result["row"]
+            filename = ""
+            if result["png"] is not None:
+                filename = f"qr_codes/{row.id}.png"
+                archive.writestr(zipfile.ZipInfo(filename, timestamp), result["png"])
+            manifest.writerow([
+                filename, row.id, row.type or "", row.template_id, row.public_scan_url, row.image_url or "",
+                result["source"], row.created_at.isoformat() if row.created_at else "", json.dumps(row.data, separators=(",", ":")),
+            ])
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+        
+        manifest_file.seek(0)
+        info = zipfile.ZipInfo("manifest.csv", timestamp)
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with archive.open(info, mode="w", force_zip64=True) as entry:
+            while True:
+                text = manifest_file.read(64 * 1024)
+                if not text:
+                    break
+                entry.write(text.encode("utf-8"))
+                chunk = sink.drain()
+                if chunk:
+                    yield chunk
+        archive.close()
+        yield sink.drain()
+    finally:
+        manifest_file.close()
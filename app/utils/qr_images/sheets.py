@@ -0,0 +1,174 @@
+"""
+Printable multi-up sheets of QR codes (table tents, stickers...).
+
+A sheet is a grid of `columns x rows` cells on A4 or Letter pages, each
+with a QR code and an optional label underneath (e.g. the table number).
+Pages are rasterized as 1-bit bitmaps from the stored module matrices
+(nothing is re-encoded) by `render_sheet_page`, which runs on
+`render_pool`. `iter_sheet_pdf` writes them into a PDF one page at a
+time, as each page comes back from the pool, so the first bytes reach the
+client before the last page is drawn.
+"""
+import zlib
+from functools import lru_cache
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from ..helpers.qr_raster import rasterize, unpack_matrix, write_png_1bit
+
+PAPER_SIZES = {"a4": (595.28, 841.89), "letter": (612.0, 792.0)} # points (1/72 in)
+QUIET_ZONE = 4 # modules
+
+# (packed module matrix, label)
+Cell = Tuple[bytes, Optional[str]]
+
+
+class SheetLayout(NamedTuple):
+    paper: str = "a4"
+    columns: int = 3
+    rows: int = 4
+    dpi: int = 200
+    margin: float = 28.35 # points (1 cm)
+    labels: bool = True
+    
+    @property
+    def per_page(self) -> int:
+        return self.columns * self.rows
+    
+    @property
+    def page_size(self) -> Tuple[float, float]:
+        """Page width and height in points."""
+        return PAPER_SIZES[self.paper]
+    
+    @property
+    def page_pixels(self) -> Tuple[int, int]:
+        width, height = self.page_size
+        return round(width * self.dpi / 72), round(height * self.dpi / 72)
+    
+    def cell_box(self, index: int) -> Tuple[int, int, int, int]:
+        """Pixel (left, top, width, height) of cell `index`, filled row by row."""
+        width, height = self.page_pixels
+        margin = round(self.margin * self.dpi / 72)
+        cell_w = (width - 2 * margin) // self.columns
+        cell_h = (height - 2 * margin) // self.rows
+        row, column = divmod(index, self.columns)
+        return margin + column * cell_w, margin + row * cell_h, cell_w, cell_h
+    
+    @property
+    def label_height(self) -> int:
+        """Pixel height of the label strip at the bottom of each cell (0 without labels)."""
+        return max(12, self.cell_box(0)[3] // 7) if self.labels else 0
+    
+    @property
+    def code_pixels(self) -> int:
+        """Pixel side of the largest square a QR code can take in a cell, above its label."""
+        _, _, cell_w, cell_h = self.cell_box(0)
+        return min(cell_w, cell_h - self.label_height)
+    
+    def fits(self, packed_matrix: bytes) -> bool:
+        """Whether a code, quiet zone included, fits its cell at one pixel or more per module."""
+        return packed_matrix[0] + 2 * QUIET_ZONE <= self.code_pixels
+
+
+@lru_cache(maxsize=8)
+def _font(size: int) -> ImageFont.ImageFont:
+    return ImageFont.load_default(size=size)
+
+
+def _draw_label(text: str, width: int, height: int) -> np.ndarray:
+    """Centered label as a boolean pixel array (True = dark), shrunk to fit the cell width."""
+    size = max(8, int(height * 0.7))
+    font = _font(size)
+    while size > 8 and font.getlength(text) > width * 0.95:
+        size = max(8, int(size * 0.85))
+        font = _font(size)
+    image = Image.new("1", (width, height), 1)
+    ImageDraw.Draw(image).text((width / 2, height / 2), text, font=font, fill=0, anchor="mm")
+    return ~np.asarray(image, dtype=bool)
+
+
+def render_sheet_page(layout: SheetLayout, cells: Sequence[Cell], image_format: str = "PDF") -> bytes:
+    """
+    Rasterize one page of cells (module-level so it can run in a worker process).
+    
+    :return: A 1-bit PNG for "PNG"; for "PDF", the page's bit-packed rows
+        (0 = black, as PDF DeviceGray expects), zlib-compressed, for `iter_sheet_pdf`.
+    """
+    width, height = layout.page_pixels
+    page = np.zeros((height, width), dtype=bool)
+    for index, (packed_matrix, label) in enumerate(cells):
+        left, top, cell_w, cell_h = layout.cell_box(index)
+        label_h = layout.label_height
+        if not layout.fits(packed_matrix):
+            raise ValueError(f"A {packed_matrix[0]}-module QR code doesn't fit a {layout.code_pixels}px cell")
+        matrix = unpack_matrix(packed_matrix)
+        # whole pixels per module, so every module prints the same size
+        box_size = max(1, int(layout.code_pixels * 0.92) // (matrix.shape[0] + 2 * QUIET_ZONE))
+        pixels = rasterize(matrix, box_size, QUIET_ZONE)
+        side = pixels.shape[0]
+        x, y = left + (cell_w - side) // 2, top + (cell_h - label_h - side) // 2
+        page[y:y + side, x:x + side] = pixels
+        if label:
+            page[y + side:y + side + label_h, left:left + cell_w] |= _draw_label(label, cell_w, label_h)
+    
+    if image_format.upper() == "PNG":
+        return write_png_1bit(page)
+    return zlib.compress(np.packbits(~page, axis=1).tobytes(), 6)
+
+
+def paginate_cells(cells: Sequence[Cell], per_page: int) -> List[List[Cell]]:
+    return [list(cells[i:i + per_page]) for i in range(0, len(cells), per_page)]
+
+
+def iter_sheet_pdf(layout: SheetLayout, pages: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Write pages from `render_sheet_page(..., "PDF")` as a PDF, yielding each page as soon as it arrives.
+    
+    Every page is one full-page 1-bit image. Object offsets are tracked as the bytes go
+    out, so the page tree, catalog and cross-reference table can be written at the end
+    without buffering the document.
+    """
+    width_px, height_px = layout.page_pixels
+    width_pt, height_pt = layout.page_size
+    offsets: List[int] = []
+    position = 0
+    
+    def emit(number: int, body: bytes) -> bytes:
+        nonlocal position
+        if len(offsets) < number:
+            offsets.extend([0] * (number - len(offsets)))
+        offsets[number - 1] = position
+        data = b"%d 0 obj\n" % number + body + b"\nendobj\n"
+        position += len(data)
+        return data
+    
+    header = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+    position = len(header)
+    yield header
+    
+    # objects 1 and 2 (catalog, page tree) are written last; each page takes three more
+    kids = []
+    for index, data in enumerate(pages):
+        image_obj, content_obj, page_obj = 3 + 3 * index, 4 + 3 * index, 5 + 3 * index
+        content = b"q %.2f 0 0 %.2f 0 0 cm /Im0 Do Q" % (width_pt, height_pt)
+        chunk = emit(image_obj, (
+            b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray"
+            b" /BitsPerComponent 1 /Filter /FlateDecode /Length %d >>\nstream\n" % (width_px, height_px, len(data))
+        ) + data + b"\nendstream")
+        chunk += emit(content_obj, b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        chunk += emit(page_obj, (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f]"
+            b" /Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>" % (width_pt, height_pt, image_obj, content_obj)
+        ))
+        kids.append(page_obj)
+        yield chunk
+    
+    tail = emit(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % kid for kid in kids), len(kids)))
+    tail += emit(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+    xref_offset = position
+    tail += b"xref\n0 %d\n0000000000 65535 f \n" % (len(offsets) + 1)
+    tail += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    tail += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(offsets) + 1, xref_offset)
+    yield tail
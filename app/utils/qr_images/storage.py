@@ -0,0 +1,45 @@
+"""Where QR code images live in the configured storage backend."""
+import re
+from typing import BinaryIO, Optional
+
+from flask import current_app
+
+from ..storage import storage
+
+QR_IMAGE_FOLDER = "qr_codes"
+_URL_KEY = re.compile(rf"/{QR_IMAGE_FOLDER}/([^/?#]+)\.\w+(?:[?#].*)?$")
+
+
+def qr_image_key(public_id: str) -> str:
+    return f"{QR_IMAGE_FOLDER}/{public_id}.png"
+
+
+def qr_image_key_for(qr_code_id: str, image_url: Optional[str]) -> str:
+    """
+    Key of a QR code's stored image. Images are stored under the QR code's id, but
+    older ones were uploaded under a random public id that only survives in the URL.
+    """
+    match = _URL_KEY.search(image_url or "")
+    return qr_image_key(match.group(1) if match else qr_code_id)
+
+
+def store_qr_image(file_stream: BinaryIO, public_id: str) -> str:
+    """
+    Store a QR code PNG and return its public URL.
+    
+    :raises Exception: If the storage backend fails; the error is logged and re-raised.
+    """
+    try:
+        return storage.put(qr_image_key(public_id), file_stream, "image/png")
+    except Exception as e:
+        current_app.logger.error(f"Storing QR image '{public_id}' in {storage.name} failed: {e}")
+        raise
+
+
+def delete_qr_image(public_id: str) -> None:
+    """Delete a QR code image. Failures are logged, not raised: the database row is what matters."""
+    try:
+        storage.delete(qr_image_key(public_id))
+        current_app.logger.info(f"QR image '{public_id}' deleted from {storage.name}.")
+    except Exception as e:
+        current_app.logger.error(f"Deleting QR image '{public_id}' from {storage.name} failed: {e}")
@@ -0,0 +1,142 @@
+"""
+Background rendering and upload of QR code images.
+
+`QrCodeController.create` in async mode commits the QR code with
+`image_status = pending` together with a `qr_image.render` outbox message
+(`enqueue_image_render`). The outbox worker renders the PNG, stores it (see
+`app.utils.storage`) and marks the row `ready`, retrying failures with
+backoff. Each attempt is counted in `image_attempts`, and a failed one
+leaves its error in `image_error`. When the worker gives up the row is
+marked `failed`. The job is durable: a restart only delays it.
+"""
+from typing import Optional
+
+from ...extensions import db
+from ...enums.qrcode import QRImageStatus
+from ..helpers.loggers import log_exception
+from ..helpers.qr_generator import render_qr_code_matrix
+from ..helpers.qr_tuner import encode_with_params
+from ..outbox import outbox_worker, STORAGE_DELETE
+from ..outbox.worker import Payload
+from .storage import store_qr_image, delete_qr_image, qr_image_key_for
+from ..scan import refresh_scan_entry
+
+QR_IMAGE_RENDER = "qr_image.render"
+QR_MATRIX_BACKFILL = "qr_code.backfill_matrix"
+
+
+def render_and_upload_image(qr_code_id: str) -> bool:
+    """
+    Render and upload the image of a pending QR code, then mark it ready.
+    
+    Must run inside an app context. Raises on render/upload errors so the
+    caller can decide whether to retry, after counting the failed attempt.
+    
+    :return: False if the QR code no longer exists or already has its image.
+    """
+    try:
+        return _render_and_upload(qr_code_id)
+    except Exception as e:
+        db.session.rollback()
+        _record_failed_attempt(qr_code_id, e)
+        raise
+
+
+def _render_and_upload(qr_code_id: str) -> bool:
+    from ...models.qrcode import QRCode
+    
+    qr: Optional[QRCode] = db.session.get(QRCode, qr_code_id)
+    if qr is None or qr.image_status == str(QRImageStatus.READY):
+        return False
+    
+    params = qr.render_params
+    packed_matrix = qr.module_matrix or encode_with_params(qr.public_scan_url, params)
+    image_stream, _ = render_qr_code_matrix(packed_matrix, params.box_size, params.border)
+    db.session.commit() # don't hold a transaction open across the upload
+    image_url = store_qr_image(image_stream, qr_code_id)
+    
+    qr = db.session.get(QRCode, qr_code_id)
+    if qr is None: # deleted while the image was uploading
+        delete_qr_image(qr_code_id)
+        return False
+    qr.qr_code_image_url = image_url
+    qr.module_matrix = qr.module_matrix or packed_matrix
+    qr.image_status = str(QRImageStatus.READY)
+    qr.image_attempts += 1
+    qr.image_error = None
+    qr.refresh_scan_response()
+    db.session.commit()
+    refresh_scan_entry(qr_code_id)
+    return True
+
+
+def _record_failed_attempt(qr_code_id: str, error: Exception) -> None:
+    """Count a failed render/upload attempt on a pending QR code and keep its error."""
+    from ...models.qrcode import QRCode
+    
+    try:
+        qr: Optional[QRCode] = db.session.get(QRCode, qr_code_id)
+        if qr is None or qr.image_status == str(QRImageStatus.READY):
+            return
+        qr.image_attempts += 1
+        qr.image_error = repr(error)[:255]
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        log_exception(f"Could not record a failed image attempt for QR code {qr_code_id}", e)
+
+
+def enqueue_image_render(qr_code_id: str) -> None:
+    """Add a render job for a pending QR code to the current transaction (see `app.utils.outbox`)."""
+    from ...models.outbox import OutboxMessage
+    OutboxMessage.enqueue(QR_IMAGE_RENDER, qr_code_id=str(qr_code_id))
+
+
+def enqueue_image_delete(qr_code_id: str, image_url: Optional[str]) -> None:
+    """Add the deletion of a QR code's stored image to the current transaction, if it has one."""
+    from ...models.outbox import OutboxMessage
+    if image_url:
+        OutboxMessage.enqueue(STORAGE_DELETE, key=qr_image_key_for(str(qr_code_id), image_url))
+
+
+def enqueue_matrix_backfill(qr_code_id: str) -> None:
+    """
+    Queue storing the module matrix of a QR code that has none, so a read
+    request that had to encode it doesn't write to the QR code itself.
+    """
+    from ...models.outbox import OutboxMessage
+    OutboxMessage.enqueue(QR_MATRIX_BACKFILL, qr_code_id=str(qr_code_id))
+
+
+def mark_image_failed(qr_code_id: str, error: Exception) -> None:
+    """Give up on a pending image: mark the row `failed` and keep the error."""
+    from ...models.qrcode import QRCode
+    
+    qr: Optional[QRCode] = db.session.get(QRCode, qr_code_id)
+    if qr is None or qr.image_status == str(QRImageStatus.READY):
+        return
+    qr.image_status = str(QRImageStatus.FAILED)
+    qr.image_error = repr(error)[:255]
+    qr.refresh_scan_response()
+    db.session.commit()
+    refresh_scan_entry(qr_code_id)
+
+
+def _render_image_given_up(payload: Payload, error: Exception) -> None:
+    mark_image_failed(payload["qr_code_id"], error)
+
+
+@outbox_worker.handler(QR_IMAGE_RENDER, on_give_up=_render_image_given_up)
+def _render_image_job(payload: Payload) -> None:
+    render_and_upload_image(payload["qr_code_id"])
+
+
+@outbox_worker.handler(QR_MATRIX_BACKFILL)
+def _backfill_matrix_job(payload: Payload) -> None:
+    from ...models.qrcode import QRCode
+    
+    qr: Optional[QRCode] = db.session.get(QRCode, payload["qr_code_id"])
+    if qr is None or qr.module_matrix is not None: # deleted, or another job got there first
+        return
+    qr.refresh_module_matrix()
+    db.session.commit()
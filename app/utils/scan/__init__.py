@@ -0,0 +1,19 @@
+"""
+This package contains the helpers behind the public scan endpoint.
+
+Scans are the hottest path in the application, so everything here is
+written to keep the number of database round trips per scan to a minimum.
+Lookups go through two cache tiers before reaching the database:
+a per-worker LRU/TTL cache, then a memory-mapped store shared by all workers.
+A per-worker Bloom filter of QR code IDs turns away scans for unknown IDs,
+and scan analytics are buffered, written off the request path and rolled
+up into hourly/daily stats.
+"""
+from .cache import scan_cache, ScanCache
+from .bloom import qr_id_filter, BloomFilter
+from .events import scan_events, ScanEventRecorder
+from .rollup import roll_up_scan_events, compact_scan_events, estimate_unique_visitors, build_missing_day_sketches
+from .hll import HyperLogLog
+from .shared_store import shared_scan_store, SharedScanStore
+from .lookup import resolve_scan, resolve_short_id, scan_lookup_select, scan_response_body, scan_etag, ScanLookup
+from .entries import refresh_scan_entry, refresh_scan_entries, evict_scan_entry, evict_user_scan_entries, iter_scan_payloads, backfill_scan_responses
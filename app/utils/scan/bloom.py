@@ -0,0 +1,250 @@
+"""
+Negative-lookup Bloom filter over QR code IDs.
+
+Bots and mistyped URLs send a steady stream of scans for IDs that don't
+exist. Each worker keeps a Bloom filter of every `QRCode.id` (and
+`short_id`, for codes that have one) so those scans
+can be answered with a 404 without a full scan lookup. A Bloom filter
+never gives false negatives for IDs that have been added, but a worker's
+filter lags behind QR codes created by other workers.
+
+Keeping it current:
+    - QR codes created in this process are added straight away.
+    - A background thread adds IDs created by other workers every
+      SCAN_BLOOM_SYNC_SECONDS, using `created_at` as a watermark.
+    - Deletes can't be removed from a Bloom filter, so the whole filter is
+      rebuilt every SCAN_BLOOM_REBUILD_SECONDS.
+An ID the filter doesn't hold may still have been created by another
+worker since the last sync. Creates write through to the shared scan store
+(by ID and short id), so before rejecting an ID `might_contain` looks it up
+there: an mmap probe, not a database query. Without a shared store
+(SCAN_STORE_PATH unset), a code created by another worker can be rejected
+for up to SCAN_BLOOM_SYNC_SECONDS. If the background thread has fallen
+behind, or the first build hasn't finished yet, every ID is reported as
+possibly present.
+"""
+import os
+import math
+import hashlib
+import threading
+import time
+from datetime import timedelta
+from typing import Any, Dict, Iterable, Optional
+
+from flask import Flask
+
+from ...extensions import db
+from ..date_time import DateTimeUtils
+from ..helpers.loggers import log_exception
+from .shared_store import shared_scan_store
+
+# IDs committed slightly out of created_at order must not slip past the sync watermark.
+_SYNC_OVERLAP = timedelta(seconds=30)
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter sized for `capacity` items at `error_rate` false positives.
+    
+    `add` is a read-modify-write of shared bytes: concurrent adds must be serialized by
+    the caller, or a lost bit becomes a false negative. Lookups need no lock.
+    """
+    
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = max(int(capacity), 1)
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / self.capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+    
+    def _positions(self, item: str) -> Iterable[int]:
+        # Double hashing (Kirsch-Mitzenmacher): k positions from one 128-bit digest.
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+    
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+    
+    def __contains__(self, item: str) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+    
+    @property
+    def memory_bytes(self) -> int:
+        return len(self.bits)
+    
+    @property
+    def estimated_false_positive_rate(self) -> float:
+        """Expected false-positive rate for the number of items added so far."""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+
+class QRCodeIdFilter:
+    """Per-process Bloom filter of QR code IDs, with background sync and periodic rebuilds."""
+    
+    def __init__(self):
+        self.app: Optional[Flask] = None
+        self.enabled = False
+        self.capacity = 1_000_000
+        self.error_rate = 0.001
+        self.rebuild_seconds = 3600
+        self.sync_seconds = 5
+        
+        self._filter: Optional[BloomFilter] = None
+        self._lock = threading.Lock()
+        self._pid = None
+        self._built_at = None
+        self._watermark = None
+        self._synced_at = None
+        
+        self.rejected = 0 # lookups answered "definitely absent"
+        self.false_positives = 0 # lookups that passed the filter but weren't in the database
+        self.misses = 0 # IDs the filter didn't hold yet but another worker had put in the shared store
+        self.unsynced_passes = 0 # lookups let through because the filter was behind
+    
+    def init_app(self, app: Flask) -> None:
+        self.app = app
+        self.enabled = bool(app.config.get("SCAN_BLOOM_ENABLED", True))
+        self.capacity = int(app.config.get("SCAN_BLOOM_CAPACITY", self.capacity))
+        self.error_rate = float(app.config.get("SCAN_BLOOM_ERROR_RATE", self.error_rate))
+        self.rebuild_seconds = int(app.config.get("SCAN_BLOOM_REBUILD_SECONDS", self.rebuild_seconds))
+        self.sync_seconds = int(app.config.get("SCAN_BLOOM_SYNC_SECONDS", self.sync_seconds))
+    
+    @property
+    def ready(self) -> bool:
+        return self._filter is not None
+    
+    # ----- lookups -----
+    
+    def might_contain(self, qr_code_id: str) -> bool:
+        """False only if the QR code (by ID or short id) definitely doesn't exist."""
+        if not self.enabled:
+            return True
+        self._ensure_worker()
+        key = str(qr_code_id)
+        bloom, watermark = self._filter, self._watermark
+        if bloom is None or key in bloom:
+            return True
+        if watermark is None or DateTimeUtils.aware_utcnow() - watermark > timedelta(seconds=3 * self.sync_seconds):
+            self.unsynced_passes += 1
+            return True
+        if shared_scan_store.contains(key):
+            self.misses += 1
+            self.add(key)
+            return True
+        self.rejected += 1
+        return False
+    
+    def add(self, qr_code_id: str) -> None:
+        with self._lock:
+            bloom = self._filter
+            if bloom is not None:
+                bloom.add(str(qr_code_id))
+    
+    def record_false_positive(self) -> None:
+        self.false_positives += 1
+    
+    # ----- building -----
+    
+    def rebuild(self) -> BloomFilter:
+        """Build a fresh filter from every QR code ID in the database and swap it in."""
+        from ...models.qrcode import QRCode
+        
+        started = DateTimeUtils.aware_utcnow()
+        total = db.session.scalar(db.select(db.func.count(QRCode.id))) or 0
+        bloom = BloomFilter(max(self.capacity, total * 2), self.error_rate) # headroom for growth until the next rebuild
+        for qr_code_id, short_id in db.session.execute(db.select(QRCode.id, QRCode.short_id).execution_options(yield_per=10_000)):
+            bloom.add(qr_code_id)
+            if short_id:
+                bloom.add(short_id)
+        db.session.remove()
+        
+        with self._lock:
+            self._filter = bloom
+            self._built_at = started
+            self._watermark = started
+            self._synced_at = started
+        return bloom
+    
+    def sync(self) -> int:
+        """Add IDs created (by any worker) since the last sync. Returns how many were added."""
+        from ...models.qrcode import QRCode
+        
+        bloom, watermark = self._filter, self._watermark
+        if bloom is None or watermark is None:
+            return 0
+        
+        now = DateTimeUtils.aware_utcnow()
+        stmt = db.select(QRCode.id, QRCode.short_id).where(QRCode.created_at >= watermark - _SYNC_OVERLAP)
+        keys = [key for row in db.session.execute(stmt) for key in row if key]
+        db.session.remove()
+        
+        added = 0
+        with self._lock: # request threads add to the same filter
+            for key in keys:
+                if key not in bloom: # the overlap window re-reads recent IDs; keep `count` honest
+                    bloom.add(key)
+                    added += 1
+        
+        self._watermark = now
+        self._synced_at = now
+        return added
+    
+    def _ensure_worker(self) -> None:
+        """
+        Start this process's maintenance thread (lazily, so each gunicorn worker gets its own after fork).
+        A filter inherited from the parent is kept until the first rebuild replaces it.
+        """
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._pid = pid
+            thread = threading.Thread(target=self._run, name="scan-bloom-filter", daemon=True)
+            thread.start()
+    
+    def _run(self) -> None:
+        next_rebuild = 0.0
+        while True:
+            try:
+                with self.app.app_context():
+                    if time.monotonic() >= next_rebuild:
+                        self.rebuild()
+                        next_rebuild = time.monotonic() + self.rebuild_seconds
+                    else:
+                        self.sync()
+            except Exception as e:
+                log_exception("Scan Bloom filter maintenance failed", e)
+            time.sleep(self.sync_seconds)
+    
+    def stats(self) -> Dict[str, Any]:
+        bloom = self._filter
+        absent_lookups = self.rejected + self.false_positives
+        return {
+            "enabled": self.enabled,
+            "ready": bloom is not None,
+            "items": bloom.count if bloom else 0,
+            "capacity": bloom.capacity if bloom else self.capacity,
+            "bits": bloom.num_bits if bloom else 0,
+            "hashes": bloom.num_hashes if bloom else 0,
+            "memory_bytes": bloom.memory_bytes if bloom else 0,
+            "target_false_positive_rate": self.error_rate,
+            "estimated_false_positive_rate": bloom.estimated_false_positive_rate if bloom else None,
+            "observed_false_positive_rate": round(self.false_positives / absent_lookups, 6) if absent_lookups else None,
+            "rejected": self.rejected,
+            "false_positives": self.false_positives,
+            "misses": self.misses,
+            "unsynced_passes": self.unsynced_passes,
+            "built_at": self._built_at.isoformat() if self._built_at else None,
+            "synced_at": self._synced_at.isoformat() if self._synced_at else None,
+        }
+
+
+qr_id_filter = QRCodeIdFilter()
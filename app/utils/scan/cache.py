@@ -0,0 +1,123 @@
+"""
+In-process cache in front of the scan lookup.
+
+Each worker process keeps its own bounded LRU cache with a TTL, keyed by the
+three parts of the scan URL: (short_code, template_type, uuid). Only resolved
+scans are cached. Writes in this process invalidate entries straight away;
+the TTL bounds how long another worker can keep serving a stale entry.
+"""
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple
+
+from cachetools import Cache, TTLCache
+from flask import Flask
+
+ScanKey = Tuple[str, str, str]
+
+
+class _CountingTTLCache(TTLCache):
+    """TTLCache that counts capacity evictions and TTL expirations."""
+    
+    def __init__(self, maxsize, ttl, **kwargs):
+        super().__init__(maxsize, ttl, **kwargs)
+        self.evictions = 0
+        self.expirations = 0
+    
+    def popitem(self):
+        # Only called by the cache itself when it is full.
+        item = super().popitem()
+        self.evictions += 1
+        return item
+    
+    def expire(self, time=None):
+        # Cache.__len__ doesn't expire first (TTLCache.__len__ would recurse back here)
+        size_before = Cache.__len__(self)
+        super().expire(time)
+        self.expirations += size_before - Cache.__len__(self)
+
+
+class ScanCache:
+    """Bounded LRU/TTL cache of resolved scan responses, with hit/miss/eviction counters."""
+    
+    def __init__(self, maxsize: int = 10_000, ttl: float = 300):
+        self._lock = Lock()
+        self._configure(maxsize, ttl)
+    
+    def _configure(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = int(maxsize)
+        self.ttl = float(ttl)
+        self.enabled = self.maxsize > 0 and self.ttl > 0
+        self._cache = _CountingTTLCache(maxsize=max(self.maxsize, 1), ttl=max(self.ttl, 1))
+        self.hits = 0
+        self.misses = 0
+    
+    def init_app(self, app: Flask) -> None:
+        """Size the cache from SCAN_CACHE_MAXSIZE and SCAN_CACHE_TTL. A size or TTL of 0 disables it."""
+        with self._lock:
+            self._configure(app.config.get("SCAN_CACHE_MAXSIZE", self.maxsize), app.config.get("SCAN_CACHE_TTL", self.ttl))
+    
+    @staticmethod
+    def make_key(short_code: str, template_type: str, uuid: str) -> ScanKey:
+        return (str(short_code), str(template_type), str(uuid))
+    
+    def get(self, key: ScanKey) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            value = self._cache.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+    
+    def set(self, key: ScanKey, value: Any) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._cache[key] = value
+    
+    def invalidate(self, qr_code_id: Optional[str] = None, short_code: Optional[str] = None) -> int:
+        """
+        Drop every entry for a QR code and/or a user's short code.
+        
+        Writes are rare compared to scans, so this walks the (bounded) key set
+        instead of maintaining secondary indexes on the read path.
+        
+        :return: The number of entries removed.
+        """
+        if qr_code_id is None and short_code is None:
+            return 0
+        
+        qr_code_id = None if qr_code_id is None else str(qr_code_id)
+        with self._lock:
+            stale = [
+                key for key in list(self._cache.keys())
+                if (qr_code_id is not None and key[2] == qr_code_id)
+                or (short_code is not None and key[0] == short_code)
+            ]
+            for key in stale:
+                self._cache.pop(key, None)
+        return len(stale)
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._cache),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self._cache.evictions,
+                "expirations": self._cache.expirations,
+            }
+
+
+scan_cache = ScanCache()
@@ -0,0 +1,123 @@
+"""
+Keeps the scan caches in step with writes to QR codes and users.
+
+Controllers and models call these after changing anything that appears in a
+scan URL or response, instead of touching each cache tier themselves.
+"""
+from typing import Callable, Iterator, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+from ...extensions import db
+from ...models.qrcode import QRCode
+from .cache import scan_cache
+from .lookup import resolve_scan, scan_lookup_select, scan_response_body, scan_etag
+from .shared_store import shared_scan_store
+
+
+def after_commit(fn: Callable[[], None]) -> None:
+    """Run `fn` once the current transaction commits."""
+    event.listen(db.session(), "after_commit", lambda session: fn(), once=True)
+
+
+def build_scan_payload(row) -> bytes:
+    """Serialize a scan lookup row for the shared store."""
+    return shared_scan_store.serialize(row.unique_code, row.template_type, scan_etag(row), scan_response_body(row))
+
+
+def iter_scan_payloads(batch_size: int = 1000) -> Iterator[Tuple[str, bytes]]:
+    """Yield (key, payload) for every QR code's ID and short id, streaming from the database."""
+    stmt = scan_lookup_select().execution_options(yield_per=batch_size)
+    for row in db.session.execute(stmt):
+        payload = build_scan_payload(row)
+        yield row.id, payload
+        if row.short_id:
+            yield row.short_id, payload
+
+
+def backfill_scan_responses(batch_size: int = 500) -> int:
+    """
+    Build `scan_response` for QR codes that don't have one yet, one committed batch at a time.
+    
+    Batches are walked by primary key, so the job can be interrupted and
+    re-run safely. `updated_at` is written back unchanged so the column's
+    onupdate doesn't fire and the stored body stays consistent with it.
+    
+    :return: The number of rows backfilled.
+    """
+    total, last_id = 0, None
+    while True:
+        stmt = db.select(QRCode).where(QRCode.scan_response.is_(None)).order_by(QRCode.id).limit(batch_size)
+        if last_id is not None:
+            stmt = stmt.where(QRCode.id > last_id)
+        batch = db.session.scalars(stmt).all()
+        if not batch:
+            return total
+        
+        db.session.execute(
+            db.update(QRCode),
+            [{"id": qr.id, "scan_response": qr.build_scan_response(), "updated_at": qr.updated_at} for qr in batch],
+        )
+        db.session.commit()
+        total += len(batch)
+        last_id = batch[-1].id
+        db.session.expunge_all()
+
+
+def refresh_scan_entry(qr_code_id: str) -> None:
+    """
+    Write-through after a QR code is created or updated (call after commit).
+    
+    The shared store gets an entry under the short id too, which is how other
+    workers' Bloom filters learn about a new short id before their next sync.
+    """
+    scan_cache.invalidate(qr_code_id=qr_code_id)
+    if shared_scan_store.enabled:
+        row = resolve_scan(qr_code_id)
+        if row is None:
+            shared_scan_store.delete(qr_code_id)
+            return
+        payload = build_scan_payload(row)
+        shared_scan_store.put(qr_code_id, payload)
+        if row.short_id:
+            shared_scan_store.put(row.short_id, payload)
+
+
+def refresh_scan_entries(qr_code_ids: Sequence[str]) -> None:
+    """Bulk `refresh_scan_entry` for QR codes created together, with one lookup query."""
+    for qr_code_id in qr_code_ids:
+        scan_cache.invalidate(qr_code_id=qr_code_id)
+    if shared_scan_store.enabled and qr_code_ids:
+        for row in db.session.execute(scan_lookup_select().where(QRCode.id.in_(list(qr_code_ids)))):
+            payload = build_scan_payload(row)
+            shared_scan_store.put(row.id, payload)
+            if row.short_id:
+                shared_scan_store.put(row.short_id, payload)
+
+
+def evict_scan_entry(qr_code_id: str, short_id: Optional[str] = None) -> None:
+    """Drop a deleted QR code from every tier (call after commit)."""
+    scan_cache.invalidate(qr_code_id=qr_code_id)
+    shared_scan_store.delete(qr_code_id)
+    if short_id:
+        shared_scan_store.delete(short_id)
+
+
+def evict_user_scan_entries(user_id: int, short_code: str) -> None:
+    """
+    Drop every scan entry for a user whose short code is changing.
+    
+    Evicts now and again once the transaction commits, so a scan served in
+    between can't re-cache the old short code.
+    """
+    qr_code_ids = []
+    if shared_scan_store.enabled:
+        qr_code_ids = db.session.scalars(db.select(QRCode.id).where(QRCode.user_id == user_id)).all()
+    
+    def evict():
+        scan_cache.invalidate(short_code=short_code)
+        for qr_code_id in qr_code_ids:
+            shared_scan_store.delete(qr_code_id)
+    
+    evict()
+    after_commit(evict)
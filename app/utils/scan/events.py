@@ -0,0 +1,164 @@
+"""
+Non-blocking scan analytics.
+
+The scan route hands each event to `scan_events.record()`, which only puts
+a small dict on a bounded in-process queue. A background thread drains the
+queue and writes events to `scan_event` with multi-row INSERTs, whenever a
+batch fills up or the flush interval passes. When the queue is full the
+event is dropped and counted: analytics must never slow a scan down.
+"""
+import os
+import atexit
+import hashlib
+import ipaddress
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from flask import Flask, request
+
+from ...extensions import db
+from ..date_time import DateTimeUtils
+from ..helpers.loggers import log_exception
+
+
+def coarse_ip(address: Optional[str]) -> Optional[str]:
+    """Reduce an IP address to its /24 (IPv4) or /48 (IPv6) network."""
+    if not address:
+        return None
+    try:
+        ip = ipaddress.ip_address(address.strip())
+    except ValueError:
+        return None
+    prefix = 24 if ip.version == 4 else 48
+    return str(ipaddress.ip_network(f"{ip}/{prefix}", strict=False))
+
+
+def visitor_hash(ip_prefix: Optional[str], user_agent: Optional[str]) -> str:
+    """Stable, non-reversible visitor key used for unique-scanner counts."""
+    return hashlib.blake2b(f"{ip_prefix}|{user_agent}".encode(), digest_size=8).hexdigest()
+
+
+class ScanEventRecorder:
+    """Buffers scan events in a bounded queue and bulk-inserts them from a background thread."""
+    
+    def __init__(self):
+        self.app: Optional[Flask] = None
+        self.enabled = True
+        self.batch_size = 500
+        self.flush_seconds = 2.0
+        self._queue: queue.Queue = queue.Queue(maxsize=10_000)
+        self._lock = threading.Lock()
+        self._pid = None
+        
+        self.recorded = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.failed = 0
+        self.batches = 0
+    
+    def init_app(self, app: Flask) -> None:
+        self.app = app
+        self.enabled = bool(app.config.get("SCAN_EVENTS_ENABLED", True))
+        self.batch_size = int(app.config.get("SCAN_EVENTS_BATCH_SIZE", self.batch_size))
+        self.flush_seconds = float(app.config.get("SCAN_EVENTS_FLUSH_SECONDS", self.flush_seconds))
+        self._queue = queue.Queue(maxsize=int(app.config.get("SCAN_EVENTS_QUEUE_SIZE", 10_000)))
+    
+    def record(self, qr_code_id: str) -> None:
+        """Queue a scan event for the current request. Never blocks; drops the event if the buffer is full."""
+        if not self.enabled:
+            return
+        self._ensure_worker()
+        
+        user_agent = request.headers.get("User-Agent") or None
+        ip_prefix = coarse_ip(request.remote_addr) # X-Forwarded-For is applied by ProxyFix only for TRUSTED_PROXY_HOPS
+        event = {
+            "qr_code_id": str(qr_code_id),
+            "scanned_at": DateTimeUtils.aware_utcnow(),
+            "user_agent": user_agent[:255] if user_agent else None,
+            "referrer": request.referrer[:255] if request.referrer else None,
+            "ip_prefix": ip_prefix,
+            "visitor_hash": visitor_hash(ip_prefix, user_agent),
+        }
+        try:
+            self._queue.put_nowait(event)
+            self.recorded += 1
+        except queue.Full:
+            self.dropped += 1
+    
+    # ----- background flushing -----
+    
+    def _ensure_worker(self) -> None:
+        """Start this process's flush thread (lazily, so each gunicorn worker gets its own after fork)."""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._pid = pid
+            threading.Thread(target=self._run, name="scan-event-recorder", daemon=True).start()
+            atexit.register(self.flush)
+    
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+    
+    def _collect(self) -> List[Dict[str, Any]]:
+        """Block until a batch is full or the flush interval has passed since the first event."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+    
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        from ...models.scan import ScanEvent
+        
+        try:
+            with self.app.app_context():
+                db.session.execute(db.insert(ScanEvent).values(batch)) # one multi-row INSERT per batch
+                db.session.commit()
+            self.flushed += len(batch)
+            self.batches += 1
+        except Exception as e:
+            self.failed += len(batch)
+            log_exception(f"Failed to write {len(batch)} scan events", e)
+    
+    def flush(self) -> None:
+        """Write whatever is buffered right now (used at shutdown)."""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "queued": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "flushed": self.flushed,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
+
+
+scan_events = ScanEventRecorder()
@@ -0,0 +1,78 @@
+"""
+HyperLogLog sketches for estimating unique scanners.
+
+A sketch is a fixed array of 2^precision one-byte registers (4 KB at the
+default precision of 12, about 1.6% standard error), however many visitors
+it has seen. Two sketches merge by taking the register-wise maximum, so the
+daily sketches stored on `ScanStat` can be combined into an estimate for
+any range of days, and sketches built by separate rollup runs (or workers)
+can be folded into each other without double counting.
+"""
+import hashlib
+import math
+from typing import Iterable, Optional, Union
+
+SKETCH_VERSION = 1
+DEFAULT_PRECISION = 12
+
+
+class HyperLogLog:
+    """Dense HyperLogLog with a 64-bit hash, so no large-range correction is needed."""
+    
+    def __init__(self, precision: int = DEFAULT_PRECISION, registers: Optional[bytearray] = None):
+        if not 4 <= precision <= 16:
+            raise ValueError("HyperLogLog precision must be between 4 and 16")
+        self.precision = precision
+        self.num_registers = 1 << precision
+        self.registers = registers if registers is not None else bytearray(self.num_registers)
+        if len(self.registers) != self.num_registers:
+            raise ValueError("Register count does not match precision")
+    
+    def add(self, value: Union[str, bytes]) -> None:
+        if isinstance(value, str):
+            value = value.encode()
+        h = int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), "big")
+        index = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1 # position of the leftmost 1-bit
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+    
+    def update(self, values: Iterable[Union[str, bytes]]) -> 'HyperLogLog':
+        for value in values:
+            self.add(value)
+        return self
+    
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        """Fold `other` into this sketch in place (the union of both sets)."""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+    
+    def cardinality(self) -> int:
+        m = self.num_registers
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros) # linear counting is more accurate for small sets
+        return int(round(estimate))
+    
+    def to_bytes(self) -> bytes:
+        return bytes((SKETCH_VERSION, self.precision)) + bytes(self.registers)
+    
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> 'HyperLogLog':
+        if len(blob) < 2 or blob[0] != SKETCH_VERSION:
+            raise ValueError("Unrecognised HyperLogLog sketch")
+        return cls(precision=blob[1], registers=bytearray(blob[2:]))
+    
+    @classmethod
+    def merged(cls, blobs: Iterable[Optional[bytes]], precision: int = DEFAULT_PRECISION) -> 'HyperLogLog':
+        """Union of serialized sketches, skipping empty ones."""
+        sketch = cls(precision)
+        for blob in blobs:
+            if blob:
+                sketch.merge(cls.from_bytes(blob))
+        return sketch
@@ -0,0 +1,87 @@
+import threading
+from typing import Optional
+
+from cachetools import LRUCache
+from sqlalchemy import select
+from sqlalchemy.engine import Row
+
+from ...extensions import db
+from ...models.qrcode import QRCode, Template
+from ...models.user import AppUser
+from ..decorators.http_cache import make_etag
+
+# Alias for the row returned by `resolve_scan`
+ScanLookup = Row
+
+
+def scan_lookup_select():
+    """
+    Build the single joined select used to resolve scans.
+    
+    Only the columns needed to validate the scan URL and the pre-serialized
+    response body are selected, so no ORM objects are hydrated.
+    The joins are outer joins so a missing owner or template is still
+    reported as such instead of looking like an unknown QR code.
+    """
+    return (
+        select(
+            QRCode.id,
+            QRCode.short_id,
+            QRCode.updated_at,
+            QRCode.scan_response,
+            AppUser.unique_code,
+            Template.type.label('template_type'),
+        )
+        .select_from(QRCode)
+        .outerjoin(AppUser, AppUser.id == QRCode.user_id)
+        .outerjoin(Template, Template.id == QRCode.template_id)
+    )
+
+
+def resolve_scan(qr_code_id: str) -> Optional[ScanLookup]:
+    """
+    Resolve a QR code, its owner's short code and its template type in one query.
+
+    :param qr_code_id: The QR code's UUID as it appears in the scan URL.
+    :return: The lookup row, or None if no QR code has that ID.
+    """
+    return db.session.execute(scan_lookup_select().where(QRCode.id == str(qr_code_id))).first()
+
+
+# short id -> UUID; the mapping never changes, so entries are only ever evicted for space
+_short_ids: LRUCache = LRUCache(maxsize=100_000)
+_short_ids_lock = threading.Lock()
+
+
+def resolve_short_id(short_id: str) -> Optional[str]:
+    """
+    Map a short id from a scan URL to its QR code's UUID, remembering hits in this process.
+
+    Misses are not remembered, so a QR code created afterwards resolves straight away.
+    """
+    with _short_ids_lock:
+        qr_code_id = _short_ids.get(short_id)
+    if qr_code_id is None:
+        qr_code_id = db.session.scalar(select(QRCode.id).where(QRCode.short_id == short_id))
+        if qr_code_id is not None:
+            with _short_ids_lock:
+                _short_ids[short_id] = qr_code_id
+    return qr_code_id
+
+
+def scan_response_body(row: ScanLookup) -> bytes:
+    """
+    Return the pre-serialized scan response for a lookup row.
+    
+    Rows that predate the `scan_response` column (not yet backfilled) are
+    built from the model on the fly.
+    """
+    if row.scan_response is not None:
+        return bytes(row.scan_response)
+    return db.session.get(QRCode, row.id).build_scan_response()
+
+
+
+def scan_etag(row: ScanLookup) -> str:
+    """Strong ETag for a scan response, derived from the QR code's `updated_at`."""
+    return make_etag(row.id, row.updated_at)
@@ -0,0 +1,246 @@
+"""
+Incremental rollup of raw scan events into hourly and daily `ScanStat` rows.
+
+Each run reads only the events after the stored high-water mark, adds their
+counts to the affected buckets, and advances the mark in the same
+transaction, so a run can be interrupted and repeated safely. The mark's row
+is locked for each batch, so overlapping runs (e.g. a slow cron run and the
+next one) take turns rather than counting the same events twice. Raw events
+that are already rolled up can then be compacted away.
+
+Event ids don't commit in order: a worker's insert can commit after one with
+a higher id from another worker. So a run stops at the newest event the
+database inserted (`inserted_at`, stamped by the database, unlike
+`scanned_at`, which is the request time before buffering) more than
+SCAN_ROLLUP_LAG_SECONDS ago. Any lower id was inserted before that, and the
+recorder commits each insert straight away, so it has long committed.
+
+Unique visitors are exact for hourly buckets (a COUNT(DISTINCT) over one
+hour of events). Daily buckets instead carry a HyperLogLog sketch that each
+run merges its new visitors into, so they never rescan a day's events and
+stay correct after those events are compacted.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import func, distinct
+
+from ...extensions import db
+from ...enums.scan import StatGranularity
+from ...models.scan import ScanEvent, ScanStat, ScanRollupState
+from ..date_time import DateTimeUtils
+from .hll import HyperLogLog
+
+ROLLUP_NAME = "scan_stats"
+
+BucketKey = Tuple[str, str, datetime]
+
+
+def as_utc(dt: datetime) -> datetime:
+    """Treat naive datetimes (e.g. from SQLite) as UTC and return an aware UTC datetime."""
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+def bucket_start(dt: datetime, granularity: StatGranularity) -> datetime:
+    dt = as_utc(dt)
+    if granularity == StatGranularity.HOUR:
+        return dt.replace(minute=0, second=0, microsecond=0)
+    return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def bucket_span(granularity: StatGranularity) -> timedelta:
+    return timedelta(hours=1) if granularity == StatGranularity.HOUR else timedelta(days=1)
+
+
+def _hour_bucket_expression():
+    """SQL for the UTC hour an event's scanned_at falls in."""
+    if db.engine.dialect.name == "postgresql":
+        return func.date_trunc("hour", func.timezone("UTC", ScanEvent.scanned_at))
+    return func.strftime("%Y-%m-%d %H:00:00", ScanEvent.scanned_at) # SQLite stores UTC text
+
+
+def _count_unique_visitors(keys: Iterable[BucketKey]) -> Dict[BucketKey, int]:
+    """
+    Exact distinct visitors in hourly buckets, in one grouped query over the
+    codes' events between the earliest and latest bucket (an index range scan
+    on qr_code_id, scanned_at; a batch's events are close together in time).
+    """
+    keys = set(keys)
+    if not keys:
+        return {}
+    hour = str(StatGranularity.HOUR)
+    span = bucket_span(StatGranularity.HOUR)
+    bucket = _hour_bucket_expression().label("bucket")
+    rows = db.session.execute(
+        db.select(ScanEvent.qr_code_id, bucket, func.count(distinct(ScanEvent.visitor_hash)))
+        .where(ScanEvent.qr_code_id.in_({key[0] for key in keys}))
+        .where(ScanEvent.scanned_at >= min(key[2] for key in keys), ScanEvent.scanned_at < max(key[2] for key in keys) + span)
+        .group_by(ScanEvent.qr_code_id, bucket)
+    )
+    counts = dict.fromkeys(keys, 0)
+    for qr_code_id, start, visitors in rows:
+        start = as_utc(datetime.fromisoformat(start) if isinstance(start, str) else start)
+        if (qr_code_id, hour, start) in counts:
+            counts[(qr_code_id, hour, start)] = visitors
+    return counts
+
+
+def _apply_batch(counts: Dict[BucketKey, int], sketches: Dict[BucketKey, HyperLogLog]) -> None:
+    """Add the batch's counts to the stored buckets, creating missing ones, and refresh their unique visitors."""
+    qr_code_ids = {key[0] for key in counts}
+    earliest = min(key[2] for key in counts)
+    existing = {
+        (stat.qr_code_id, stat.granularity, as_utc(stat.bucket_start)): stat
+        for stat in db.session.scalars(
+            db.select(ScanStat)
+            .where(ScanStat.qr_code_id.in_(qr_code_ids))
+            .where(ScanStat.bucket_start >= earliest)
+        )
+    }
+    unique_visitors = _count_unique_visitors(key for key in counts if key not in sketches)
+    
+    for key, count in counts.items():
+        qr_code_id, granularity, start = key
+        stat = existing.get(key)
+        if stat is None:
+            stat = ScanStat(qr_code_id=qr_code_id, granularity=granularity, bucket_start=start, count=0)
+            db.session.add(stat)
+        stat.count += count
+        
+        if key in sketches:
+            sketch = sketches[key]
+            if stat.visitor_sketch:
+                sketch.merge(HyperLogLog.from_bytes(stat.visitor_sketch))
+            stat.visitor_sketch = sketch.to_bytes()
+            stat.unique_visitors = sketch.cardinality()
+        else:
+            stat.unique_visitors = unique_visitors[key]
+
+
+def roll_up_scan_events(batch_size: int = 10_000, lag_seconds: Optional[float] = None) -> Dict[str, int]:
+    """
+    Fold scan events newer than the high-water mark into the hourly and daily rollups.
+    
+    :param lag_seconds: Leave events inserted more recently than this for a later run
+        (default SCAN_ROLLUP_LAG_SECONDS).
+    :return: Counts of events processed and batches committed.
+    """
+    if lag_seconds is None:
+        lag_seconds = float(current_app.config.get("SCAN_ROLLUP_LAG_SECONDS", 60))
+    cutoff = DateTimeUtils.aware_utcnow() - timedelta(seconds=lag_seconds)
+    # walks the primary key down from the newest event; only the last `lag_seconds` of events are skipped over
+    upper = db.session.scalar(
+        db.select(ScanEvent.id).where(ScanEvent.inserted_at < cutoff).order_by(ScanEvent.id.desc()).limit(1)
+    ) or 0
+    processed = batches = 0
+    
+    while True:
+        # locked per batch (each commit releases it), so an overlapping run waits and then sees the advanced mark
+        state = ScanRollupState.get_or_create(ROLLUP_NAME, lock=True)
+        if state.last_event_id >= upper:
+            break
+        events = db.session.execute(
+            db.select(ScanEvent.id, ScanEvent.qr_code_id, ScanEvent.scanned_at, ScanEvent.visitor_hash)
+            .where(ScanEvent.id > state.last_event_id, ScanEvent.id <= upper)
+            .order_by(ScanEvent.id)
+            .limit(batch_size)
+        ).all()
+        if not events:
+            break
+        
+        counts: Dict[BucketKey, int] = defaultdict(int)
+        sketches: Dict[BucketKey, HyperLogLog] = defaultdict(HyperLogLog)
+        for event in events:
+            for granularity in StatGranularity:
+                counts[(event.qr_code_id, str(granularity), bucket_start(event.scanned_at, granularity))] += 1
+            day_key = (event.qr_code_id, str(StatGranularity.DAY), bucket_start(event.scanned_at, StatGranularity.DAY))
+            sketch = sketches[day_key] # created even without a visitor hash, so every day bucket has a sketch
+            if event.visitor_hash:
+                sketch.add(event.visitor_hash)
+        
+        _apply_batch(counts, sketches)
+        state.last_event_id = events[-1].id
+        db.session.commit() # rollups and high-water mark move together
+        
+        processed += len(events)
+        batches += 1
+    
+    db.session.commit()
+    return {"events": processed, "batches": batches, "last_event_id": state.last_event_id}
+
+
+def build_missing_day_sketches(batch_size: int = 500) -> int:
+    """
+    Build sketches for daily buckets rolled up before sketches existed, from
+    their raw events (only up to the high-water mark, so later runs don't add
+    the same events twice).
+    
+    :return: The number of buckets given a sketch.
+    """
+    state = db.session.get(ScanRollupState, ROLLUP_NAME)
+    if state is None:
+        return 0
+    built = 0
+    while True:
+        stats = db.session.scalars(
+            db.select(ScanStat)
+            .where(ScanStat.granularity == str(StatGranularity.DAY), ScanStat.visitor_sketch.is_(None))
+            .limit(batch_size)
+        ).all()
+        if not stats:
+            return built
+        for stat in stats:
+            start = as_utc(stat.bucket_start)
+            sketch = HyperLogLog().update(h for h in db.session.scalars(
+                db.select(ScanEvent.visitor_hash)
+                .where(ScanEvent.qr_code_id == stat.qr_code_id, ScanEvent.id <= state.last_event_id)
+                .where(ScanEvent.scanned_at >= start, ScanEvent.scanned_at < start + bucket_span(StatGranularity.DAY))
+            ) if h)
+            stat.visitor_sketch = sketch.to_bytes()
+        db.session.commit()
+        built += len(stats)
+
+
+def estimate_unique_visitors(qr_code_id: str, start: datetime, end: datetime) -> Optional[int]:
+    """
+    Estimated unique visitors of a QR code between `start` and `end`, at day resolution.
+    
+    Merges the daily sketches of every UTC day the range touches. Returns None
+    when no day in the range has a sketch.
+    """
+    blobs: Iterable[bytes] = db.session.scalars(
+        db.select(ScanStat.visitor_sketch)
+        .where(ScanStat.qr_code_id == qr_code_id)
+        .where(ScanStat.granularity == str(StatGranularity.DAY))
+        .where(ScanStat.bucket_start >= bucket_start(start, StatGranularity.DAY), ScanStat.bucket_start < end)
+        .where(ScanStat.visitor_sketch.is_not(None))
+    ).all()
+    if not blobs:
+        return None
+    return HyperLogLog.merged(blobs).cardinality()
+
+
+def compact_scan_events(older_than_days: int) -> int:
+    """
+    Delete raw events older than `older_than_days` that are already rolled up.
+    
+    The cutoff is floored to a UTC day boundary, so no hourly bucket is ever
+    left with only part of its raw events. Daily unique visitors live in the
+    sketches and don't need the raw events at all.
+    
+    :return: The number of events deleted.
+    """
+    state = db.session.get(ScanRollupState, ROLLUP_NAME)
+    if state is None or not state.last_event_id:
+        return 0
+    
+    cutoff = bucket_start(DateTimeUtils.aware_utcnow() - timedelta(days=older_than_days), StatGranularity.DAY)
+    result = db.session.execute(
+        db.delete(ScanEvent)
+        .where(ScanEvent.scanned_at < cutoff)
+        .where(ScanEvent.id <= state.last_event_id)
+    )
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,446 @@
+"""
+Scan lookup store shared by every worker on a host through a memory-mapped file.
+
+The file holds a fixed-size, open-addressed (linear probing) hash table that
+maps a QR code's 16-byte UUID to the serialized scan payload. Reads are
+lock-free: each slot carries a sequence counter that writers make odd while
+they update it, so a reader that races a writer just retries. Writers
+serialize on an exclusive `flock` of the file.
+
+Because the table lives in the page cache rather than in each worker's heap,
+its memory doesn't grow with the worker count, and a freshly forked worker
+starts warm.
+
+Rebuilds (from the database) and compactions (dropping the tombstones left
+by deletes) write a new file without taking the lock, while workers keep
+using the old one. Keys written meanwhile are appended to a journal file.
+The lock is held only to copy those keys across and rename the new file
+into place. Writers notice the replacement under the lock and remap;
+readers check for it at most once per second.
+
+File layout (little endian):
+    header: magic(8s) version(I) slot_count(I) slot_size(I) used(I) padding to 64 bytes
+    slot:   seq(I) state(B) pad(3x) key(16s) length(I) payload(slot_size - 28 bytes)
+"""
+import os
+import json
+import mmap
+import struct
+import hashlib
+import time
+from contextlib import contextmanager
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+from uuid import UUID
+
+from flask import Flask
+
+try:
+    import fcntl
+except ImportError: # not available on Windows; the store is disabled there
+    fcntl = None
+
+from ..helpers.loggers import console_log, log_exception
+
+_MAGIC = b"SCNSTORE"
+_VERSION = 1
+_HEADER = struct.Struct("<8sIIII")
+_HEADER_SIZE = 64
+_SLOT_HEADER = struct.Struct("<IB3x16sI")
+_SEQ = struct.Struct("<I")
+
+_EMPTY, _USED, _DELETED = 0, 1, 2
+_MAX_LOAD = 0.75
+_READ_RETRIES = 8
+_REPLACED_CHECK_SECONDS = 1.0 # how often readers look for a rebuilt file
+
+
+def store_key(qr_code_id: str) -> bytes:
+    """16-byte table key for a QR code ID: the UUID's bytes, or a 128-bit hash for non-UUID IDs."""
+    try:
+        return UUID(str(qr_code_id)).bytes
+    except ValueError:
+        return hashlib.blake2b(str(qr_code_id).encode(), digest_size=16).digest()
+
+
+class SharedScanStore:
+    """Memory-mapped, cross-process table from QR code ID to scan payload."""
+    
+    def __init__(self):
+        self.path: Optional[str] = None
+        self.slot_count = 65536
+        self.slot_size = 1024
+        self._lock = Lock()
+        self._write_lock = Lock() # flock doesn't exclude threads sharing one file description
+        self._pid = None
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._inode = None
+        self._checked_at = 0.0
+    
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path) and fcntl is not None
+    
+    @property
+    def payload_max(self) -> int:
+        return self.slot_size - _SLOT_HEADER.size
+    
+    def init_app(self, app: Flask) -> None:
+        self.path = app.config.get("SCAN_STORE_PATH") or None
+        self.slot_count = int(app.config.get("SCAN_STORE_SLOTS", self.slot_count))
+        self.slot_size = int(app.config.get("SCAN_STORE_SLOT_SIZE", self.slot_size))
+        if self.path and fcntl is None:
+            console_log("SCAN STORE", "fcntl is unavailable on this platform; the shared scan store is disabled.", "WARNING")
+    
+    # ----- file handling -----
+    
+    @property
+    def _journal_path(self) -> str:
+        return f"{self.path}.journal"
+    
+    def _write_empty(self, path: str) -> None:
+        with open(path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, self.slot_count, self.slot_size, 0).ljust(_HEADER_SIZE, b"\0"))
+            f.truncate(_HEADER_SIZE + self.slot_count * self.slot_size) # sparse: untouched slots cost no disk or memory
+    
+    def _create_file(self, path: str) -> None:
+        """
+        Create the store file unless it exists. It is built under a temporary name
+        and hard-linked into place, which fails if another worker got there first,
+        so a store already in use is never replaced by an empty one.
+        """
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            self._write_empty(tmp_path)
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass # another worker created it; use theirs
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    
+    def _replaced(self) -> bool:
+        """Whether the mapped file is no longer the one at `path` (a rebuild renamed a new one in)."""
+        try:
+            return os.stat(self.path).st_ino != self._inode
+        except FileNotFoundError:
+            return True
+    
+    def _open(self) -> Optional[mmap.mmap]:
+        """Map the store file for this process, creating it if missing. Remapped after fork or a rebuild."""
+        if not self.enabled:
+            return None
+        
+        pid = os.getpid()
+        if self._mmap is not None and self._pid == pid:
+            if time.monotonic() - self._checked_at < _REPLACED_CHECK_SECONDS:
+                return self._mmap
+            self._checked_at = time.monotonic()
+            if not self._replaced():
+                return self._mmap
+        
+        with self._lock:
+            if self._mmap is not None and self._pid == pid and not self._replaced():
+                return self._mmap
+            
+            if self._pid != pid:
+                # A forked worker must open its own file description, or flock() would be shared with the parent.
+                self._close()
+            # After a rebuild the old mapping is just dropped, not closed: other threads may still be reading it.
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            if not os.path.exists(self.path):
+                self._create_file(self.path)
+            
+            f = open(self.path, "r+b")
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE)
+            magic, version, slot_count, slot_size, _ = _HEADER.unpack_from(mm, 0)
+            if magic != _MAGIC or version != _VERSION:
+                mm.close()
+                f.close()
+                raise ValueError(f"{self.path} is not a scan store file")
+            
+            # The file's geometry wins over config, so every worker probes the same way.
+            self.slot_count, self.slot_size = slot_count, slot_size
+            self._file, self._mmap, self._pid = f, mm, pid
+            self._inode, self._checked_at = os.fstat(f.fileno()).st_ino, time.monotonic()
+            return mm
+    
+    def _close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+        if self._file is not None:
+            self._file.close()
+        self._file = self._mmap = self._pid = self._inode = None
+    
+    @contextmanager
+    def _locked(self):
+        """
+        Exclusive cross-process write lock on the current store file; yields its mapping.
+        
+        If a rebuild replaced the file while we waited, the lock is retaken on the new one.
+        """
+        with self._write_lock:
+            while True:
+                mm = self._open()
+                fd = self._file.fileno()
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                if not self._replaced():
+                    break
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                self._checked_at = 0.0 # remap on the next _open
+            try:
+                yield mm
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+    
+    def _journal(self, key: bytes) -> None:
+        """Note a written key for a rebuild in progress (call with the lock held)."""
+        if os.path.exists(self._journal_path):
+            with open(self._journal_path, "ab") as journal:
+                journal.write(key)
+    
+    # ----- table operations -----
+    
+    def _slot_offset(self, index: int) -> int:
+        return _HEADER_SIZE + index * self.slot_size
+    
+    def _probe(self, key: bytes):
+        start = int.from_bytes(key[:8], "little") % self.slot_count
+        for i in range(self.slot_count):
+            yield (start + i) % self.slot_count
+    
+    def _read_slot(self, mm: mmap.mmap, offset: int) -> Optional[Tuple[int, bytes, bytes]]:
+        for _ in range(_READ_RETRIES):
+            seq_before = _SEQ.unpack_from(mm, offset)[0]
+            if seq_before & 1:
+                continue # a writer is mid-update
+            _, state, key, length = _SLOT_HEADER.unpack_from(mm, offset)
+            payload = mm[offset + _SLOT_HEADER.size: offset + _SLOT_HEADER.size + min(length, self.payload_max)] if state == _USED else b""
+            if _SEQ.unpack_from(mm, offset)[0] == seq_before:
+                return state, key, payload
+        return None
+    
+    def _write_slot(self, mm: mmap.mmap, offset: int, state: int, key: bytes, payload: bytes) -> None:
+        seq = _SEQ.unpack_from(mm, offset)[0]
+        _SEQ.pack_into(mm, offset, (seq + 1) & 0xFFFFFFFF) # odd: readers back off
+        _SLOT_HEADER.pack_into(mm, offset, (seq + 1) & 0xFFFFFFFF, state, key, len(payload))
+        mm[offset + _SLOT_HEADER.size: offset + _SLOT_HEADER.size + len(payload)] = payload
+        _SEQ.pack_into(mm, offset, (seq + 2) & 0xFFFFFFFF)
+    
+    def _used(self, mm: mmap.mmap) -> int:
+        return _HEADER.unpack_from(mm, 0)[4]
+    
+    def _set_used(self, mm: mmap.mmap, used: int) -> None:
+        _HEADER.pack_into(mm, 0, _MAGIC, _VERSION, self.slot_count, self.slot_size, used)
+    
+    def _put(self, mm: mmap.mmap, key: bytes, payload: bytes) -> bool:
+        target = None
+        for index in self._probe(key):
+            offset = self._slot_offset(index)
+            _, state, slot_key, _ = _SLOT_HEADER.unpack_from(mm, offset)
+            if state == _USED and slot_key == key:
+                self._write_slot(mm, offset, _USED, key, payload)
+                return True
+            if state == _DELETED and target is None:
+                target = offset
+            if state == _EMPTY:
+                if target is None:
+                    if self._used(mm) + 1 > self.slot_count * _MAX_LOAD:
+                        return False
+                    self._set_used(mm, self._used(mm) + 1)
+                    target = offset
+                break
+        if target is None:
+            return False
+        self._write_slot(mm, target, _USED, key, payload)
+        return True
+    
+    def _find(self, mm: mmap.mmap, key: bytes) -> Optional[bytes]:
+        """The key's payload, read with the lock held (no retries needed), or None if absent."""
+        for index in self._probe(key):
+            offset = self._slot_offset(index)
+            _, state, slot_key, length = _SLOT_HEADER.unpack_from(mm, offset)
+            if state == _EMPTY:
+                return None
+            if state == _USED and slot_key == key:
+                return mm[offset + _SLOT_HEADER.size: offset + _SLOT_HEADER.size + min(length, self.payload_max)]
+        return None
+    
+    def _delete(self, mm: mmap.mmap, key: bytes) -> bool:
+        for index in self._probe(key):
+            offset = self._slot_offset(index)
+            _, state, slot_key, _ = _SLOT_HEADER.unpack_from(mm, offset)
+            if state == _EMPTY:
+                return False
+            if state == _USED and slot_key == key:
+                # Tombstone, so keys further along the probe chain stay reachable.
+                self._write_slot(mm, offset, _DELETED, key, b"")
+                return True
+        return False
+    
+    # ----- public API -----
+    
+    @staticmethod
+    def serialize(unique_code: str, template_type: str, etag: str, body: bytes) -> bytes:
+        """Pack a scan payload. `body` is the pre-serialized JSON response body."""
+        return json.dumps({"u": unique_code, "t": template_type, "e": etag}).encode() + b"\n" + body
+    
+    @staticmethod
+    def deserialize(payload: bytes) -> Tuple[str, str, str, bytes]:
+        meta, body = payload.split(b"\n", 1)
+        meta = json.loads(meta)
+        return meta["u"], meta["t"], meta["e"], body
+    
+    def get(self, qr_code_id: str) -> Optional[Tuple[str, str, str, bytes]]:
+        """Return (unique_code, template_type, etag, response body) for a QR code, or None on a miss."""
+        try:
+            mm = self._open()
+            if mm is None:
+                return None
+            key = store_key(qr_code_id)
+            for index in self._probe(key):
+                slot = self._read_slot(mm, self._slot_offset(index))
+                if slot is None:
+                    return None # contended; let the caller fall back to the database
+                state, slot_key, payload = slot
+                if state == _EMPTY:
+                    return None
+                if state == _USED and slot_key == key:
+                    return self.deserialize(payload)
+        except Exception as e:
+            log_exception("Shared scan store read failed", e)
+        return None
+    
+    def contains(self, qr_code_id: str) -> bool:
+        """Whether the table has an entry for this key, without reading its payload."""
+        try:
+            mm = self._open()
+            if mm is None:
+                return False
+            key = store_key(qr_code_id)
+            for index in self._probe(key):
+                slot = self._read_slot(mm, self._slot_offset(index))
+                if slot is None or slot[0] == _EMPTY:
+                    return False
+                if slot[0] == _USED and slot[1] == key:
+                    return True
+        except Exception as e:
+            log_exception("Shared scan store read failed", e)
+        return False
+    
+    def put(self, qr_code_id: str, payload: bytes) -> bool:
+        """Insert or replace a QR code's payload. Payloads too large for a slot are skipped."""
+        if len(payload) > self.payload_max:
+            return False
+        try:
+            if not self.enabled:
+                return False
+            key = store_key(qr_code_id)
+            with self._locked() as mm:
+                self._journal(key)
+                return self._put(mm, key, payload)
+        except Exception as e:
+            log_exception("Shared scan store write failed", e)
+            return False
+    
+    def delete(self, qr_code_id: str) -> bool:
+        try:
+            if not self.enabled:
+                return False
+            key = store_key(qr_code_id)
+            with self._locked() as mm:
+                self._journal(key)
+                return self._delete(mm, key)
+        except Exception as e:
+            log_exception("Shared scan store delete failed", e)
+            return False
+    
+    def _swap_in(self, fill: Callable[[mmap.mmap, mmap.mmap], Tuple[int, int]]) -> Dict[str, int]:
+        """
+        Build a new store file with `fill(new, current)` and rename it over the current one.
+        
+        `fill` runs without the lock; keys written meanwhile are journaled and copied
+        from the current file into the new one under the lock, just before the rename.
+        """
+        if self._open() is None:
+            raise RuntimeError("The shared scan store is disabled (set SCAN_STORE_PATH).")
+        
+        with self._locked():
+            try:
+                open(self._journal_path, "xb").close() # writers journal their keys from here on
+            except FileExistsError:
+                raise RuntimeError(f"A rebuild is already running (remove {self._journal_path} if it was interrupted).")
+        tmp_path = f"{self.path}.{os.getpid()}.rebuild"
+        try:
+            self._write_empty(tmp_path)
+            with open(tmp_path, "r+b") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE) as new:
+                written, skipped = fill(new, self._open())
+                with self._locked() as current:
+                    with open(self._journal_path, "rb") as journal:
+                        keys = journal.read()
+                    for offset in range(0, len(keys) - 15, 16):
+                        key = keys[offset:offset + 16]
+                        payload = self._find(current, key)
+                        if payload is None:
+                            self._delete(new, key)
+                        else:
+                            self._put(new, key, payload)
+                    new.flush()
+                    os.replace(tmp_path, self.path)
+                    os.remove(self._journal_path)
+        finally:
+            for path in (tmp_path, self._journal_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        self._checked_at = 0.0 # remap straight away
+        return {"written": written, "skipped": skipped, "slots": self.slot_count}
+    
+    def rebuild(self, entries: Iterable[Tuple[str, bytes]]) -> Dict[str, int]:
+        """
+        Replace the table with one built from `entries` of (key, payload).
+        
+        The database is streamed without holding the write lock (see `_swap_in`);
+        tombstones from deletes are not carried over.
+        """
+        def fill(new: mmap.mmap, current: mmap.mmap) -> Tuple[int, int]:
+            written = skipped = 0
+            for qr_code_id, payload in entries:
+                if len(payload) <= self.payload_max and self._put(new, store_key(qr_code_id), payload):
+                    written += 1
+                else:
+                    skipped += 1
+            return written, skipped
+        
+        return self._swap_in(fill)
+    
+    def compact(self) -> Dict[str, int]:
+        """Copy the live entries into a fresh file, reclaiming the slots of deleted ones."""
+        def fill(new: mmap.mmap, current: mmap.mmap) -> Tuple[int, int]:
+            written = skipped = 0
+            for index in range(self.slot_count):
+                slot = self._read_slot(current, self._slot_offset(index))
+                if slot is not None and slot[0] == _USED:
+                    if self._put(new, slot[1], slot[2]):
+                        written += 1
+                    else:
+                        skipped += 1
+            return written, skipped
+        
+        return self._swap_in(fill)
+    
+    def stats(self) -> Dict[str, Any]:
+        mm = self._open() if self.enabled else None
+        used = self._used(mm) if mm is not None else 0
+        return {
+            "enabled": mm is not None,
+            "path": self.path,
+            "slots": self.slot_count,
+            "slot_size": self.slot_size,
+            "used": used,
+            "load_factor": round(used / self.slot_count, 4) if self.slot_count else None,
+            "file_bytes": _HEADER_SIZE + self.slot_count * self.slot_size,
+        }
+
+
+shared_scan_store = SharedScanStore()
@@ -0,0 +1,197 @@
+"""
+Object storage for QR code images and uploaded media.
+
+Code stores and removes files through the `storage` facade, never a
+provider SDK directly. STORAGE_BACKEND picks the implementation:
+
+    - ``cloudinary`` (default): uploads to Cloudinary.
+    - ``local``: content-addressed files under STORAGE_LOCAL_ROOT, served at
+      STORAGE_LOCAL_URL. Identical bytes are stored once. Useful for load
+      tests without network access, or for serving images from our own nginx.
+
+Calls are timed and counted per operation (see `storage.stats()`), and
+`storage.map()` runs many calls concurrently on a bounded per-process pool
+of STORAGE_UPLOAD_WORKERS threads shared by every batch path.
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TypeVar
+
+from flask import Flask, current_app, send_from_directory
+
+from .base import StorageBackend, Data
+from .cloudinary import CloudinaryStorage
+from .local import LocalStorage
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class CallStats:
+    """Thread-safe call, error and latency counters for one storage operation."""
+    
+    def __init__(self, window: int = 1024):
+        self.calls = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self._recent = deque(maxlen=window) # latencies of the last `window` calls, for percentiles
+        self._lock = threading.Lock()
+    
+    def record(self, seconds: float, failed: bool) -> None:
+        with self._lock:
+            self.calls += 1
+            self.errors += failed
+            self.total_seconds += seconds
+            self._recent.append(seconds)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            recent = sorted(self._recent)
+            calls, errors, total = self.calls, self.errors, self.total_seconds
+        
+        def percentile(p: float) -> Optional[float]:
+            return round(recent[min(len(recent) - 1, int(p * len(recent)))] * 1000, 2) if recent else None
+        
+        return {
+            "calls": calls,
+            "errors": errors,
+            "mean_ms": round(total / calls * 1000, 2) if calls else None,
+            "p50_ms": percentile(0.50),
+            "p99_ms": percentile(0.99),
+        }
+
+
+class Storage:
+    """Delegates to the backend selected by STORAGE_BACKEND."""
+    
+    OPERATIONS = ("put", "get", "delete")
+    
+    def __init__(self):
+        self.backend: Optional[StorageBackend] = None
+        self.max_workers = 8
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pid = None
+        self._stats = {op: CallStats() for op in self.OPERATIONS}
+    
+    def init_app(self, app: Flask) -> None:
+        self.max_workers = max(1, int(app.config.get("STORAGE_UPLOAD_WORKERS", self.max_workers)))
+        name = (app.config.get("STORAGE_BACKEND") or "cloudinary").lower()
+        if name == "cloudinary":
+            self.backend = CloudinaryStorage(app)
+        elif name == "local":
+            root = app.config.get("STORAGE_LOCAL_ROOT") or os.path.join(app.instance_path, "storage")
+            base_url = app.config.get("STORAGE_LOCAL_URL") or "/media"
+            self.backend = LocalStorage(root, base_url)
+            if base_url.startswith("/"):
+                # Same-origin URL: serve the files from the app unless nginx answers first
+                files_dir = self.backend.files_dir
+                app.add_url_rule(
+                    f"{base_url.rstrip('/')}/<path:key>",
+                    endpoint="local_storage",
+                    view_func=lambda key: send_from_directory(files_dir, key, max_age=86400),
+                )
+        else:
+            raise ValueError(f"Unknown STORAGE_BACKEND '{name}', expected 'cloudinary' or 'local'")
+    
+    @property
+    def name(self) -> str:
+        return self.backend.name
+    
+    def _timed(self, op: str, fn: Callable[..., R], *args) -> R:
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = fn(*args)
+            failed = False
+            return result
+        finally:
+            self._stats[op].record(time.perf_counter() - start, failed)
+    
+    def put(self, key: str, data: Data, content_type: Optional[str] = None) -> str:
+        return self._timed("put", self.backend.put, key, data, content_type)
+    
+    def get(self, key: str) -> bytes:
+        return self._timed("get", self.backend.get, key)
+    
+    def delete(self, key: str) -> None:
+        self._timed("delete", self.backend.delete, key)
+    
+    def url(self, key: str) -> str:
+        return self.backend.url(key)
+    
+    def _ensure_executor(self) -> ThreadPoolExecutor:
+        """Create this process's pool lazily, so each gunicorn worker gets its own after fork."""
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="storage")
+                    self._pid = pid
+        return self._executor
+    
+    def map(self, fn: Callable[[T], R], items: Iterable[T]) -> List[R]:
+        """
+        Apply `fn` to every item on the shared storage pool and return the results in order.
+        
+        `fn` runs inside the caller's app context. At most STORAGE_UPLOAD_WORKERS calls run at
+        once per process, however many requests are mapping concurrently.
+        """
+        items = list(items)
+        if not items:
+            return []
+        app = current_app._get_current_object()
+        
+        def call(item: T) -> R:
+            with app.app_context():
+                return fn(item)
+        
+        if len(items) == 1:
+            return [call(items[0])]
+        return list(self._ensure_executor().map(call, items))
+    
+    def imap_unordered(self, fn: Callable[[T], R], items: Iterable[T], max_in_flight: Optional[int] = None) -> Iterator[R]:
+        """
+        Lazily apply `fn` to `items` on the shared storage pool, yielding results as they complete.
+        
+        At most `max_in_flight` calls are queued or running at once, and `items` is only read
+        as slots free up, so a long stream (e.g. an export) holds a bounded amount of memory
+        and leaves room on the pool for other requests. Closing the iterator early cancels
+        the calls that haven't started.
+        """
+        app = current_app._get_current_object()
+        limit = max(1, max_in_flight or self.max_workers)
+        executor = self._ensure_executor()
+        
+        def call(item: T) -> R:
+            with app.app_context():
+                return fn(item)
+        
+        pending = set()
+        try:
+            for item in items:
+                pending.add(executor.submit(call, item))
+                if len(pending) >= limit:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend.name if self.backend else None,
+            "workers": self.max_workers,
+            **{op: self._stats[op].to_dict() for op in self.OPERATIONS},
+        }
+
+
+storage = Storage()
@@ -0,0 +1,36 @@
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Optional, Union
+
+Data = Union[bytes, BinaryIO]
+
+
+def read_bytes(data: Data) -> bytes:
+    """Accept raw bytes or any file-like object (BytesIO, FileStorage, ...)."""
+    return data if isinstance(data, bytes) else data.read()
+
+
+class StorageBackend(ABC):
+    """
+    Interface of an object store for images and media.
+    
+    Keys are slash-separated paths including the file extension,
+    e.g. ``qr_codes/<uuid>.png``.
+    """
+    
+    name = ""
+    
+    @abstractmethod
+    def put(self, key: str, data: Data, content_type: Optional[str] = None) -> str:
+        """Store `data` under `key`, replacing any existing object, and return its public URL."""
+    
+    @abstractmethod
+    def get(self, key: str) -> bytes:
+        """Return the object's bytes. Raises FileNotFoundError if it doesn't exist."""
+    
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove the object. Deleting a missing key is not an error."""
+    
+    @abstractmethod
+    def url(self, key: str) -> str:
+        """Public URL of the object."""
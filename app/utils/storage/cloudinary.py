@@ -0,0 +1,85 @@
+import os
+from typing import Optional
+
+import cloudinary
+import cloudinary.uploader
+import cloudinary.utils
+import requests
+import urllib3
+from flask import Flask
+
+from .base import StorageBackend, Data
+
+VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mov', '.flv'}
+
+
+class CloudinaryStorage(StorageBackend):
+    """
+    Cloudinary-backed storage.
+    
+    A key's extension is dropped to form the public id (Cloudinary adds its
+    own), so ``qr_codes/<uuid>.png`` is stored as public id ``qr_codes/<uuid>``.
+    
+    The SDK is configured once, here. Its module-level HTTP connector is a
+    urllib3 PoolManager that keeps a single connection per host, so
+    concurrent uploads each open (and then discard) a new TLS connection.
+    It is replaced with a keep-alive pool sized for CLOUDINARY_POOL_SIZE
+    concurrent calls, and every call gets the configured timeouts.
+    """
+    
+    name = "cloudinary"
+    
+    def __init__(self, app: Flask):
+        cloudinary.config(
+            cloud_name=app.config.get('CLOUDINARY_CLOUD_NAME'),
+            api_key=app.config.get('CLOUDINARY_API_KEY'),
+            api_secret=app.config.get('CLOUDINARY_API_SECRET'),
+            secure=True,
+        )
+        pool_size = int(app.config.get('CLOUDINARY_POOL_SIZE') or 12)
+        self.timeout = urllib3.Timeout(
+            connect=float(app.config.get('CLOUDINARY_CONNECT_TIMEOUT') or 5),
+            read=float(app.config.get('CLOUDINARY_READ_TIMEOUT') or 30),
+        )
+        cloudinary.uploader._http = cloudinary.utils.get_http_connector(
+            cloudinary.config(),
+            dict(cloudinary.CERT_KWARGS, num_pools=2, maxsize=pool_size, block=False),
+        )
+        self._session = requests.Session() # for get(): keep-alive to the delivery CDN
+        self._session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=pool_size))
+    
+    @staticmethod
+    def _public_id(key: str) -> str:
+        return os.path.splitext(key)[0]
+    
+    @staticmethod
+    def _resource_type(key: str) -> str:
+        return "video" if os.path.splitext(key)[1].lower() in VIDEO_EXTENSIONS else "image"
+    
+    def put(self, key: str, data: Data, content_type: Optional[str] = None) -> str:
+        folder, _, name = self._public_id(key).rpartition("/")
+        response = cloudinary.uploader.upload(
+            data,
+            public_id=name,
+            folder=folder or None,
+            resource_type=self._resource_type(key),
+            overwrite=True,
+            timeout=self.timeout,
+        )
+        return response['secure_url']
+    
+    def get(self, key: str) -> bytes:
+        response = self._session.get(self.url(key), timeout=(self.timeout.connect_timeout, self.timeout.read_timeout))
+        if response.status_code == 404:
+            raise FileNotFoundError(key)
+        response.raise_for_status()
+        return response.content
+    
+    def delete(self, key: str) -> None:
+        cloudinary.uploader.destroy(self._public_id(key), resource_type=self._resource_type(key), timeout=self.timeout)
+    
+    def url(self, key: str) -> str:
+        url, _ = cloudinary.utils.cloudinary_url(
+            self._public_id(key), resource_type=self._resource_type(key), format=os.path.splitext(key)[1].lstrip(".") or None
+        )
+        return url
@@ -0,0 +1,111 @@
+import hashlib
+import os
+import tempfile
+from typing import Optional
+
+from .base import StorageBackend, Data, read_bytes
+
+
+class LocalStorage(StorageBackend):
+    """
+    Content-addressed storage on the local filesystem.
+    
+    Each distinct content is written once, to ``<root>/objects/ab/<sha256>``.
+    A key is a hard link to its object at ``<root>/files/<key>``, so identical
+    bytes stored under many keys take the space of one copy. Deleting a key
+    removes the object once no other key links to it.
+    
+    ``<root>/files`` is what gets served at `base_url` (by nginx in
+    production, or the app's own `/media` route).
+    """
+    
+    name = "local"
+    
+    def __init__(self, root: str, base_url: str):
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip("/")
+        self.files_dir = os.path.join(self.root, "files")
+        self.objects_dir = os.path.join(self.root, "objects")
+        os.makedirs(self.files_dir, exist_ok=True)
+        os.makedirs(self.objects_dir, exist_ok=True)
+    
+    def _file_path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.files_dir, key))
+        if not path.startswith(self.files_dir + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+    
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest)
+    
+    def _write_atomic(self, path: str, content: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp, path)
+    
+    @staticmethod
+    def _digest_of(path: str) -> Optional[str]:
+        try:
+            with open(path, "rb") as f:
+                return hashlib.sha256(f.read()).hexdigest()
+        except FileNotFoundError:
+            return None
+    
+    def _release(self, digest: str) -> None:
+        """Remove an object once no key links to it any more."""
+        object_path = self._object_path(digest)
+        try:
+            if os.stat(object_path).st_nlink <= 1:
+                os.unlink(object_path)
+        except FileNotFoundError:
+            pass
+    
+    def put(self, key: str, data: Data, content_type: Optional[str] = None) -> str:
+        content = read_bytes(data)
+        digest = hashlib.sha256(content).hexdigest()
+        object_path = self._object_path(digest)
+        file_path = self._file_path(key)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        previous = self._digest_of(file_path)
+        if previous == digest:
+            return self.url(key) # same content already stored under this key
+        
+        for _ in range(3): # a concurrent delete can remove the object between the write and the link
+            if not os.path.exists(object_path):
+                self._write_atomic(object_path, content)
+            tmp_link = f"{file_path}.tmp-{os.getpid()}-{id(content)}"
+            try:
+                os.link(object_path, tmp_link)
+            except FileNotFoundError:
+                continue
+            os.replace(tmp_link, file_path) # atomically swaps in the new content for an existing key
+            if os.path.lexists(tmp_link):
+                # rename() is a no-op between two links to the same file (a concurrent put of this content)
+                os.unlink(tmp_link)
+            break
+        else:
+            raise OSError(f"Could not store {key}")
+        
+        if previous and previous != digest:
+            self._release(previous)
+        return self.url(key)
+    
+    def get(self, key: str) -> bytes:
+        with open(self._file_path(key), "rb") as f:
+            return f.read()
+    
+    def delete(self, key: str) -> None:
+        file_path = self._file_path(key)
+        digest = self._digest_of(file_path)
+        if digest is None:
+            return
+        try:
+            os.unlink(file_path)
+        except FileNotFoundError:
+            return
+        self._release(digest)
+    
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
@@ -0,0 +1,167 @@
+"""
+Shared setup for the benchmark scripts.
+
+Benchmarks run against a throwaway database (SQLite in a temp dir by default)
+and never touch the database configured for the app.
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import statistics
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+def make_app(database_url: str | None = None):
+    """Create an app bound to a benchmark database, with all tables created."""
+    if not database_url:
+        database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='scancodes-bench-'), 'bench.sqlite3')}"
+    
+    # config.py reads these at import time, so they must be set before importing the app
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ.setdefault("JWT_SECRET_KEY", "benchmark-jwt-secret-key-0123456789")
+    
+    from app import create_app
+    from app.extensions import db
+    
+    app = create_app("development", create_defaults=False)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """Summarise latency samples (in seconds) as milliseconds."""
+    ordered = sorted(samples)
+    
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+    
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": pct(50),
+        "p99_ms": pct(99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def time_calls(fn: Callable, inputs: Sequence[tuple], warmup: int = 20, batch: int = 1, repeat: int = 1,
+               warmup_inputs: Optional[Sequence[tuple]] = None) -> Dict[str, float]:
+    """
+    Call `fn(*args)` for each input (after `warmup` untimed calls) and summarise throughput and latency.
+    
+    :param warmup_inputs: Inputs for the untimed calls, instead of the first `warmup` timed
+        ones. Pass them when a repeated input is cheaper (e.g. a cache hit), so the timed
+        calls don't include inputs the warmup already cached.
+    :param batch: Time this many calls at once and record their mean as one sample, for
+        calls so cheap that the timer itself would dominate single-call samples. The
+        percentiles are then over batch means, which hide single slow calls, so they are
+        reported as `batch_mean_p50_ms`, `batch_mean_p99_ms` and `batch_mean_max_ms`
+        instead of `p50_ms`, `p99_ms` and `max_ms`.
+    :param repeat: Run the inputs this many times and keep the fastest run, as `timeit`
+        does, to filter out interference from the rest of the machine.
+    """
+    for args in (inputs[:warmup] if warmup_inputs is None else warmup_inputs):
+        fn(*args)
+    best = None
+    for _ in range(repeat):
+        timings = []
+        started = time.perf_counter()
+        for offset in range(0, len(inputs), batch):
+            chunk = inputs[offset:offset + batch]
+            start = time.perf_counter()
+            for args in chunk:
+                fn(*args)
+            timings.append((time.perf_counter() - start) / len(chunk))
+        elapsed = time.perf_counter() - started
+        if best is None or elapsed < best[0]:
+            best = (elapsed, timings)
+    elapsed, timings = best
+    latency = percentiles(timings)
+    if batch > 1:
+        latency = {
+            "batch": batch,
+            "batches": latency["count"],
+            "mean_ms": latency["mean_ms"],
+            **{f"batch_mean_{metric}": latency[metric] for metric in ("p50_ms", "p99_ms", "max_ms")},
+        }
+    return {"ops_per_sec": len(inputs) / elapsed, **latency}
+
+
+def trace_allocations(fn: Callable, inputs: Sequence[tuple]) -> Dict[str, float]:
+    """
+    Python heap allocated per call, measured with tracemalloc in a separate (slower) pass.
+    
+    `alloc_kib_per_op` is the mean peak above the pre-call heap; `retained_kib` is
+    what was still allocated after the last call (caches, or a leak).
+    """
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        peaks = []
+        for args in inputs:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            fn(*args)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        retained = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+    return {"alloc_kib_per_op": statistics.fmean(peaks) / 1024, "retained_kib": retained / 1024}
+
+
+# metric -> True if higher is better; metrics not listed here are informational
+COMPARED_METRICS = {
+    "ops_per_sec": True,
+    "p50_ms": False,
+    "p99_ms": False,
+    "batch_mean_p50_ms": False,
+    "batch_mean_p99_ms": False,
+    "alloc_kib_per_op": False,
+    "bytes_per_image": False,
+}
+
+
+def compare_to_baseline(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[Dict[str, Any]]:
+    """
+    Compare each case's metrics with a stored run.
+    
+    :param tolerance: Allowed relative change in the worse direction (0.1 = 10%).
+    :return: One entry per compared metric, flagged `regression` when it got worse by more than `tolerance`.
+    """
+    comparisons = []
+    for case, metrics in results.items():
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = (baseline.get(case) or {}).get(metric), metrics.get(metric)
+            if not isinstance(old, (int, float)) or not isinstance(new, (int, float)) or not old:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            comparisons.append({
+                "case": case,
+                "metric": metric,
+                "baseline": old,
+                "current": new,
+                "change_pct": round(change * 100, 1),
+                "regression": worse > tolerance,
+            })
+    return comparisons
+
+
+def load_json(path: str) -> Any:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_json(path: str, data: Any) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write("\n")
@@ -0,0 +1,160 @@
+"""
+Benchmark the QR code creation pipeline, stage by stage and end to end.
+
+Cases:
+    generate_qr_code_image/miss   encode + render of distinct URLs (render cache misses)
+    generate_qr_code_image/hit    the same URL again (render cache hits)
+    validate_json_data            a menu payload against its template schema
+    QRCode.to_dict                serializing an in-memory QR code
+    QrCodeController.create       POST /api/qrcodes/ through the test client, images
+                                  stored with the local storage backend in a temp dir
+
+Each case reports ops/sec and latency percentiles, heap allocated per call
+from a separate tracemalloc pass, and bytes per image where there is one.
+The cheap cases are timed in batches (best of 5 runs), so their
+percentiles are over per-batch means (`batch_mean_p50_ms` and so on), not
+over single calls. Results are
+printed as JSON (and written to `--output`). With `--baseline`, every metric
+is compared against a stored run, and the script exits with status 1 if any
+got worse by more than `--tolerance`. Compare runs from the same machine.
+
+Usage:
+    python benchmarks/qr_pipeline.py [--count 300] [--output run.json]
+    python benchmarks/qr_pipeline.py --baseline benchmarks/baseline.json [--tolerance 0.15]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from contextlib import redirect_stdout
+from uuid import uuid4
+
+from _common import make_app, time_calls, trace_allocations, compare_to_baseline, load_json, write_json
+
+MENU_PAYLOAD = {"url": "https://example.com/menu", "restaurant_name": "Bench Bistro", "table_number": "12"}
+
+
+def scan_urls(count: int) -> list:
+    return [(f"https://www.scancodes.net/abc12def3/menu/{uuid4()}",) for _ in range(count)]
+
+
+def bench_generate(count: int) -> dict:
+    from app.utils.helpers.qr_generator import generate_qr_code_image
+    
+    def render(data: str) -> int:
+        stream, _ = generate_qr_code_image(data)
+        return len(stream.getvalue())
+    
+    urls = scan_urls(count)
+    sizes = [render(*url) for url in urls[:50]]
+    miss = time_calls(render, scan_urls(count), warmup_inputs=scan_urls(20))
+    miss.update(trace_allocations(render, scan_urls(min(count, 100))), bytes_per_image=sum(sizes) / len(sizes))
+    
+    hit_inputs = urls[:1] * count
+    hit = time_calls(render, hit_inputs * 10, batch=50, repeat=5)
+    hit.update(trace_allocations(render, hit_inputs[:100]))
+    return {"generate_qr_code_image/miss": miss, "generate_qr_code_image/hit": hit}
+
+
+def bench_validate(count: int) -> dict:
+    from app.models.defaults import create_default_templates
+    from app.models.qrcode import Template
+    from app.utils.helpers.validate import validate_json_data
+    
+    create_default_templates()
+    schema = Template.query.filter_by(type="menu").first().schema_definition
+    inputs = [(dict(MENU_PAYLOAD, table_number=str(i)), schema) for i in range(count * 100)]
+    assert validate_json_data(*inputs[0])
+    result = time_calls(validate_json_data, inputs, batch=100, repeat=5)
+    result.update(trace_allocations(validate_json_data, inputs[:1000]))
+    return {"validate_json_data": result}
+
+
+def bench_to_dict(count: int) -> dict:
+    from app.models.qrcode import QRCode
+    from app.utils.date_time import DateTimeUtils
+    
+    now = DateTimeUtils.aware_utcnow()
+    qrs = [
+        (QRCode(id=str(uuid4()), user_id=1, template_id=str(uuid4()), data_payload=dict(MENU_PAYLOAD), type="menu",
+                qr_code_image_url="/media/qr_codes/bench.png", image_status="ready", created_at=now, updated_at=now),)
+        for _ in range(count * 10)
+    ]
+    result = time_calls(QRCode.to_dict, qrs * 10, batch=100, repeat=5)
+    result.update(trace_allocations(QRCode.to_dict, qrs[:1000]))
+    return {"QRCode.to_dict": result}
+
+
+def bench_create(app, count: int, storage_root: str) -> dict:
+    from flask_jwt_extended import create_access_token
+    from app.extensions import db
+    from app.models import AppUser, Role, UserRole
+    from app.enums.auth import RoleNames
+    from app.models.defaults import create_roles, create_default_templates
+    from app.models.qrcode import Template
+    
+    create_roles()
+    create_default_templates()
+    user = AppUser(username="bench", email="bench@example.com", password="bench")
+    user.roles.append(UserRole(role=Role.query.filter_by(name=RoleNames.CUSTOMER).first()))
+    db.session.add(user)
+    db.session.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(identity={'user_id': user.id})}"}
+    template_id = Template.query.filter_by(type="menu").first().id
+    client = app.test_client()
+    
+    def create(table_number: int) -> None:
+        response = client.post("/api/qrcodes/", headers=headers, json={
+            "template_id": template_id,
+            "data": dict(MENU_PAYLOAD, table_number=str(table_number)),
+        })
+        assert response.status_code == 201, response.get_json()
+    
+    result = time_calls(create, [(i,) for i in range(count)], warmup_inputs=[(i,) for i in range(2 * count, 2 * count + 20)])
+    result.update(trace_allocations(create, [(i,) for i in range(count, count + min(count, 50))]))
+    
+    sizes = [os.path.getsize(os.path.join(path, name)) for path, _, names in os.walk(storage_root) for name in names]
+    result["bytes_per_image"] = sum(sizes) / len(sizes)
+    return {"QrCodeController.create": result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=300, help="Calls per case (x100 for the cheap ones, timed in batches).")
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--output", default=None, help="Also write the results to this JSON file (e.g. to store a baseline).")
+    parser.add_argument("--baseline", default=None, help="JSON file from an earlier --output run to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Relative change allowed before a metric counts as a regression.")
+    args = parser.parse_args()
+    
+    # images go to a throwaway local directory, never to the configured storage
+    storage_root = tempfile.mkdtemp(prefix="scancodes-bench-storage-")
+    os.environ["STORAGE_BACKEND"] = "local"
+    os.environ["STORAGE_LOCAL_ROOT"] = storage_root
+    os.environ["OUTBOX_ENABLED"] = "false"
+    app = make_app(args.database_url)
+    app.logger.setLevel("WARNING") # per-request INFO logging would dominate the timings
+    
+    results = {}
+    with app.app_context(), redirect_stdout(sys.stderr):
+        results.update(bench_generate(args.count))
+        results.update(bench_validate(args.count))
+        results.update(bench_to_dict(args.count))
+        results.update(bench_create(app, args.count, storage_root))
+    results = {case: {metric: float(f"{value:.4g}") for metric, value in metrics.items()} for case, metrics in results.items()}
+    
+    report = {"count": args.count, "results": results}
+    if args.baseline:
+        comparisons = compare_to_baseline(results, load_json(args.baseline)["results"], args.tolerance)
+        report["regressions"] = [c for c in comparisons if c["regression"]]
+        report["comparisons"] = comparisons
+    if args.output:
+        write_json(args.output, report)
+    print(json.dumps(report, indent=2))
+    if report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
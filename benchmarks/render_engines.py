@@ -0,0 +1,70 @@
+"""
+Microbenchmark the QR rendering engines across output formats.
+
+Renders `--count` distinct scan URLs with every engine and format, calling
+the engines directly so the render cache never answers, and prints
+renders/sec and the mean output size for each combination. The first
+configuration is the original qrcode + PIL path for reference.
+
+Usage:
+    python benchmarks/render_engines.py [--count 300] [--box-size 10] [--error-correction L]
+"""
+import argparse
+import json
+import time
+from io import BytesIO
+from uuid import uuid4
+
+import _common # noqa: F401 (puts the project root on sys.path)
+
+
+def legacy_render(data: str, error_correction: str, box_size: int, border: int) -> bytes:
+    """The renderer used before engines existed: qrcode + PIL's default 1-bit image."""
+    import qrcode
+    from app.utils.helpers.qr_engines import QrcodeEngine
+    
+    qr = qrcode.QRCode(version=1, error_correction=QrcodeEngine._LEVELS[error_correction], box_size=box_size, border=border)
+    qr.add_data(data)
+    qr.make(fit=True)
+    buf = BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def measure(render, datas) -> dict:
+    sizes = []
+    start = time.perf_counter()
+    for data in datas:
+        sizes.append(len(render(data)))
+    elapsed = time.perf_counter() - start
+    return {
+        "renders_per_sec": round(len(datas) / elapsed, 1),
+        "ms_per_render": round(elapsed / len(datas) * 1000, 3),
+        "mean_bytes": round(sum(sizes) / len(sizes)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=300, help="Distinct URLs rendered per configuration.")
+    parser.add_argument("--box-size", type=int, default=10)
+    parser.add_argument("--border", type=int, default=4)
+    parser.add_argument("--error-correction", default="L", choices=["L", "M", "Q", "H"])
+    args = parser.parse_args()
+    
+    from app.utils.helpers.qr_engines import qr_engines
+    
+    datas = [f"https://www.scancodes.net/abc12def3/menu/{uuid4()}" for _ in range(args.count)]
+    results = {
+        "legacy/PNG": measure(lambda d: legacy_render(d, args.error_correction, args.box_size, args.border), datas)
+    }
+    for name, engine in qr_engines.engines.items():
+        for fmt in qr_engines.formats():
+            results[f"{name}/{fmt}"] = measure(
+                lambda d: engine.render(d, args.error_correction, args.box_size, args.border, fmt), datas
+            )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
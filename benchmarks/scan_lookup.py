@@ -0,0 +1,128 @@
+"""
+Benchmark the scan lookup: the legacy three-query resolution against the single joined select.
+
+Seeds a throwaway database with `--rows` QR codes (1M by default) spread over
+`--users` owners and the default templates, then times both strategies on the
+same random sample of scans and prints p50/p99 latency for each.
+
+Usage:
+    python benchmarks/scan_lookup.py [--rows 1000000] [--samples 5000] [--database-url URL]
+"""
+import argparse
+import json
+import random
+import time
+from uuid import uuid4
+
+from _common import make_app, percentiles
+
+
+def seed(db, rows: int, users: int, chunk: int = 20_000) -> list:
+    from app.models import AppUser, QRCode, Template
+    from app.models.defaults import create_default_templates
+    from app.utils.date_time import DateTimeUtils
+    
+    create_default_templates()
+    templates = [(t.id, t.type) for t in Template.query.all()]
+    
+    now = DateTimeUtils.aware_utcnow()
+    db.session.execute(
+        AppUser.__table__.insert(),
+        [{"username": f"bench{i}", "unique_code": f"b{i:08d}", "date_joined": now} for i in range(users)],
+    )
+    user_rows = db.session.execute(db.select(AppUser.id, AppUser.unique_code)).all()
+    db.session.commit()
+    
+    scans = []
+    for start in range(0, rows, chunk):
+        batch = []
+        for _ in range(min(chunk, rows - start)):
+            user_id, short_code = random.choice(user_rows)
+            template_id, template_type = random.choice(templates)
+            qr_id = str(uuid4())
+            batch.append({
+                "id": qr_id,
+                "user_id": user_id,
+                "template_id": template_id,
+                "data_payload": {"url": "https://example.com/menu", "table_number": "1"},
+                "qr_code_image_url": f"https://res.cloudinary.com/bench/{qr_id}.png",
+                "created_at": now,
+                "updated_at": now,
+            })
+            if len(scans) < 200_000:
+                scans.append((short_code, template_type, qr_id))
+        db.session.execute(QRCode.__table__.insert(), batch)
+        db.session.commit()
+    
+    from app.utils.scan import backfill_scan_responses
+    backfill_scan_responses(batch_size=5000)
+    return scans
+
+
+def legacy_scan(short_code, template_type, uuid):
+    """The scan view as it was before the joined lookup: three ORM queries."""
+    from app.models.qrcode import QRCode, Template
+    from app.models.user import AppUser
+    
+    qr = QRCode.query.filter_by(id=str(uuid)).first()
+    if not qr:
+        return None
+    user = AppUser.query.filter_by(unique_code=short_code).first()
+    if not user or user.id != qr.user_id:
+        return None
+    template = Template.query.filter_by(id=qr.template_id).first()
+    if not template or template.type != template_type:
+        return None
+    return qr.to_dict()
+
+
+def joined_scan(short_code, template_type, uuid):
+    from app.utils.scan import resolve_scan, scan_response_body
+    
+    row = resolve_scan(uuid)
+    if not row or row.unique_code != short_code or row.template_type != template_type:
+        return None
+    return scan_response_body(row)
+
+
+def measure(db, fn, sample) -> list:
+    timings = []
+    for args in sample:
+        start = time.perf_counter()
+        result = fn(*args)
+        timings.append(time.perf_counter() - start)
+        assert result is not None, f"scan {args} did not resolve"
+        db.session.remove() # each scan is its own request
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--samples", type=int, default=5_000)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+    
+    app = make_app(args.database_url)
+    from app.extensions import db
+    
+    with app.app_context():
+        started = time.perf_counter()
+        scans = seed(db, args.rows, args.users)
+        seeded_in = time.perf_counter() - started
+        
+        sample = random.sample(scans, min(args.samples, len(scans)))
+        measure(db, joined_scan, sample[:200]) # warm up caches and connections
+        
+        results = {
+            "rows": args.rows,
+            "seed_seconds": round(seeded_in, 1),
+            "legacy_three_queries": percentiles(measure(db, legacy_scan, sample)),
+            "single_joined_query": percentiles(measure(db, joined_scan, sample)),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
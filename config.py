@@ -1,5 +1,7 @@
 import os, logging
 
+DEFAULT_PIXEL_BUDGET = 330 # QR image width: a version 2 code at 10px modules; QR_IMAGE_PIXEL_BUDGET overrides it
+
 class Config:
     CREATE_DEFAULTS = True
     ENV = os.getenv("ENV") or "development"
@@ -36,6 +38,88 @@ class Config:
     CLOUDINARY_CLOUD_NAME = os.getenv("CLOUDINARY_CLOUD_NAME")
     CLOUDINARY_API_KEY = os.getenv("CLOUDINARY_API_KEY")
     CLOUDINARY_API_SECRET = os.getenv("CLOUDINARY_API_SECRET")
+    
+    # Image/media storage: "cloudinary", or "local" for content-addressed files on disk
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND") or "cloudinary"
+    STORAGE_LOCAL_ROOT = os.getenv("STORAGE_LOCAL_ROOT") # defaults to <instance path>/storage
+    STORAGE_LOCAL_URL = os.getenv("STORAGE_LOCAL_URL") or "/media" # public URL prefix of <root>/files (e.g. served by nginx)
+    STORAGE_UPLOAD_WORKERS = int(os.getenv("STORAGE_UPLOAD_WORKERS") or 8) # per-process pool for batch uploads/deletes
+    CLOUDINARY_POOL_SIZE = int(os.getenv("CLOUDINARY_POOL_SIZE") or 12) # keep-alive connections; upload workers + image workers
+    CLOUDINARY_CONNECT_TIMEOUT = float(os.getenv("CLOUDINARY_CONNECT_TIMEOUT") or 5) # seconds
+    CLOUDINARY_READ_TIMEOUT = float(os.getenv("CLOUDINARY_READ_TIMEOUT") or 30)
+    
+    # Scan lookup cache (per worker process). Set either to 0 to disable it.
+    SCAN_CACHE_MAXSIZE = int(os.getenv("SCAN_CACHE_MAXSIZE") or 10000)
+    SCAN_CACHE_TTL = int(os.getenv("SCAN_CACHE_TTL") or 300) # seconds
+    
+    # Scan lookup store shared by all workers on a host (memory-mapped file). Unset to disable it.
+    SCAN_STORE_PATH = os.getenv("SCAN_STORE_PATH")
+    SCAN_STORE_SLOTS = int(os.getenv("SCAN_STORE_SLOTS") or 65536)
+    SCAN_STORE_SLOT_SIZE = int(os.getenv("SCAN_STORE_SLOT_SIZE") or 1024) # bytes, caps the payload size per QR code
+    
+    # Bloom filter of QR code IDs (per worker process), used to reject scans for unknown IDs without a DB query
+    SCAN_BLOOM_ENABLED = (os.getenv("SCAN_BLOOM_ENABLED") or "true").lower() in ("true", "1", "yes")
+    SCAN_BLOOM_CAPACITY = int(os.getenv("SCAN_BLOOM_CAPACITY") or 1_000_000)
+    SCAN_BLOOM_ERROR_RATE = float(os.getenv("SCAN_BLOOM_ERROR_RATE") or 0.001)
+    SCAN_BLOOM_SYNC_SECONDS = int(os.getenv("SCAN_BLOOM_SYNC_SECONDS") or 5) # picks up QR codes created by other workers
+    SCAN_BLOOM_REBUILD_SECONDS = int(os.getenv("SCAN_BLOOM_REBUILD_SECONDS") or 3600) # drops deleted QR codes
+    
+    # Scan analytics: events are buffered per worker and bulk-inserted from a background thread
+    SCAN_EVENTS_ENABLED = (os.getenv("SCAN_EVENTS_ENABLED") or "true").lower() in ("true", "1", "yes")
+    SCAN_EVENTS_QUEUE_SIZE = int(os.getenv("SCAN_EVENTS_QUEUE_SIZE") or 10000) # events beyond this are dropped, not waited on
+    SCAN_EVENTS_BATCH_SIZE = int(os.getenv("SCAN_EVENTS_BATCH_SIZE") or 500)
+    SCAN_EVENTS_FLUSH_SECONDS = float(os.getenv("SCAN_EVENTS_FLUSH_SECONDS") or 2)
+    # Reverse proxies in front of the app whose X-Forwarded-For entries are trusted (e.g. 1 behind one load balancer).
+    # With 0 the header is ignored, since clients can forge it, and the client address is the socket peer.
+    TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS") or 0)
+    SCAN_ROLLUP_LAG_SECONDS = float(os.getenv("SCAN_ROLLUP_LAG_SECONDS") or 60) # newer events wait for the next run, so out-of-order commits aren't skipped
+    
+    # List endpoints (see app/utils/helpers/pagination.py)
+    PAGINATION_MAX_PER_PAGE = int(os.getenv("PAGINATION_MAX_PER_PAGE") or 100)
+    PAGINATION_EXACT_COUNT_LIMIT = int(os.getenv("PAGINATION_EXACT_COUNT_LIMIT") or 10000) # larger totals are estimated
+    PAGINATION_COUNT_CACHE_SECONDS = int(os.getenv("PAGINATION_COUNT_CACHE_SECONDS") or 60) # how long estimated totals are reused
+    
+    # Transactional outbox: side effects (image renders, storage deletes) drained per worker process
+    OUTBOX_ENABLED = (os.getenv("OUTBOX_ENABLED") or "true").lower() in ("true", "1", "yes")
+    OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS") or 4)
+    OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE") or 50) # messages claimed at a time
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS") or 8) # the message is marked failed after this many
+    OUTBOX_RETRY_BACKOFF_SECONDS = float(os.getenv("OUTBOX_RETRY_BACKOFF_SECONDS") or 2) # doubles on each retry
+    OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS") or 5) # picks up messages written by other processes
+    OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS") or 300) # a claimed message is retried after this if its worker died
+    
+    # QR rendering engine: "qrcode" or "segno" (see benchmarks/render_engines.py)
+    QR_RENDER_ENGINE = os.getenv("QR_RENDER_ENGINE") or "segno"
+    
+    # Rendered QR images, cached per worker process by content hash. 0 disables it.
+    QR_RENDER_CACHE_MAX_BYTES = int(os.getenv("QR_RENDER_CACHE_MAX_BYTES") or 64 * 1024 * 1024)
+    
+    # On-demand renders from stored module matrices (GET /api/qrcodes/<id>/image?size=)
+    QR_IMAGE_MIN_SIZE = int(os.getenv("QR_IMAGE_MIN_SIZE") or 64) # pixels
+    QR_IMAGE_MAX_SIZE = int(os.getenv("QR_IMAGE_MAX_SIZE") or 4096)
+    
+    # Encode/render tuning of new QR codes, see app/utils/helpers/qr_tuner.py
+    QR_DEFAULT_ERROR_CORRECTION = (os.getenv("QR_DEFAULT_ERROR_CORRECTION") or "L").upper() # for templates without their own
+    QR_IMAGE_PIXEL_BUDGET = int(os.getenv("QR_IMAGE_PIXEL_BUDGET") or DEFAULT_PIXEL_BUDGET) # max stored image width
+    
+    # Batch QR code creation
+    QR_BATCH_MAX_ITEMS = int(os.getenv("QR_BATCH_MAX_ITEMS") or 500)
+    # Render processes *per web worker* (each gunicorn worker starts its own pool); 1 renders inline.
+    # Defaults to the CPUs split across WEB_CONCURRENCY workers, or 2 if that isn't set.
+    QR_RENDER_PROCESSES = int(
+        os.getenv("QR_RENDER_PROCESSES")
+        or (max((os.cpu_count() or 1) // int(os.environ["WEB_CONCURRENCY"]), 1) if os.getenv("WEB_CONCURRENCY") else 2)
+    )
+    
+    # ZIP export (GET /api/qrcodes/export.zip): images fetched at once per export, on the storage pool
+    QR_EXPORT_CONCURRENCY = int(os.getenv("QR_EXPORT_CONCURRENCY") or 4)
+    
+    # Compact base62 ids in the scan URLs of new QR codes (lower QR versions), see app/utils/helpers/short_ids.py
+    QR_SHORT_IDS = (os.getenv("QR_SHORT_IDS") or "false").lower() in ("true", "1", "yes")
+    QR_SHORT_ID_LENGTH = int(os.getenv("QR_SHORT_ID_LENGTH") or 10)
+    
+    # Printable sheets (GET /api/qrcodes/sheet), pages rasterized on the render process pool
+    QR_SHEET_MAX_CODES = int(os.getenv("QR_SHEET_MAX_CODES") or 1000)
 
 
 class DevelopmentConfig(Config):